@@ -1,122 +1,218 @@
 
-from flask import Flask, request, send_file, jsonify
+from flask import Blueprint, Flask, Request, Response, g, request, send_file, jsonify, stream_with_context, url_for
 from flask_cors import CORS
 from io import BytesIO
-from PIL import Image, ImageDraw, ImageFont, ImageFilter
+from PIL import Image, ImageFilter, UnidentifiedImageError
 import base64
 import hashlib
 import os
-import random
-import requests
+import time
 from dotenv import load_dotenv
-from huggingface_hub import InferenceClient
 import json
-from dataclasses import dataclass
-from typing import Dict, List, Tuple
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Optional, Tuple
 import numpy as np
 
+from batch import BATCH_MAX_ITEMS, run_streaming, shutdown_batch_pool, spool_upload, zip_images
+from compositor import (RENDITION_WORKERS, decode_product, encode_poster, product_box, render_poster,
+                        render_rendition, rendition_pool, shutdown_rendition_pool, start_rendition_pool,
+                        warm_fonts)
+from encoders import (CUTOUT_PROFILE, PROFILES, EncoderProfile, UnsupportedFormat, encode, negotiate,
+                      transcode)
+from hf_client import HFInferenceClient, UpstreamUnavailable
+from jobs import JobQueue, QueueFull, raise_if_cancelled
+from metrics import REGISTRY, Gauge, begin_request, end_request, record_startup, span
+from matte import (MATTE_FEATHER, MATTE_KERNEL_SIZE, MATTE_MODE, MATTE_PROXY_PIXELS, MATTE_THRESHOLD,
+                   MATTE_TOLERANCE, compute_alpha_border, compute_alpha_multires)
+from near_duplicates import PHASH_MAX_UPSCALE, Fingerprint, NearDuplicateIndex
+from presets import PresetRegistry, RetailPreset
+from recorder import RequestRecorder
+from result_cache import ResultCache, cache_key
+from singleflight import SingleFlight
+from static_assets import STATIC_MAX_AGE, STATIC_URL_PREFIX, StaticAsset, StaticSite
+from textures import Texture, TextureStore, encode_texture, render_background
+from uploads import (UPLOAD_MAX_BATCH_BYTES, UPLOAD_MAX_BYTES, UPLOAD_MAX_PIXELS, ByteBudget, decode_image,
+                     spooled_stream_factory, upload_buffer)
+from werkzeug.exceptions import RequestEntityTooLarge
+
 # Load environment variables from .env file
 load_dotenv()
 
-app = Flask(__name__)
-CORS(app, origins=["http://localhost:8002", "http://127.0.0.1:8002"])
+
+
+class UploadRequest(Request):
+    """Request whose file uploads stay in memory only while small"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return spooled_stream_factory(total_content_length, content_type, filename, content_length)
+
+
+# Routes and hooks live on a blueprint so create_app() can build configured apps
+bp = Blueprint("poster", __name__)
 
 HF_MODEL = "briaai/RMBG-1.4"
 HF_TOKEN = os.getenv("HUGGINGFACE_TOKEN", "")
+HF_CLIENT = HFInferenceClient(HF_MODEL, HF_TOKEN)
 
+# Encoded preset backgrounds, served from /texture/<sha256>
+TEXTURES = TextureStore()
+TEXTURE_MAX_AGE = 365 * 24 * 3600
 
-@dataclass
-class RetailPreset:
-    """Tesco Retail Style Preset Configuration"""
-    name: str
-    base_prompt: str
-    negative_prompt: str
-    color_palette: List[str]
-    layout_rules: Dict[str, any]
-    text_rules: Dict[str, any]
-    explanation: str
-
-
-# Retail Brand Rules Engine - Tesco Style Presets
-RETAIL_PRESETS: Dict[str, RetailPreset] = {
-    "tesco_minimal": RetailPreset(
-        name="Tesco Minimal",
-        base_prompt="Clean retail product advertisement, white background, clear product focus, soft studio lighting, professional supermarket marketing, no props, no people, no artistic effects, sharp product edges, high legibility, minimal design",
-        negative_prompt="clutter, dramatic lighting, fantasy art, neon colors, illustration style, social media aesthetics, busy background, decorative elements, text overlays, logos, brand names, watermarks, signatures",
-        color_palette=["#FFFFFF", "#F5F5F5", "#E5E5E5"],
-        layout_rules={
-            "background_style": "solid",
-            "max_elements": 2,
-            "product_visibility": 0.8,
-            "text_margins": 0.1
-        },
-        text_rules={
-            "headline_position": "top",
-            "cta_style": "minimal_button",
-            "max_text_length": 20
-        },
-        explanation="Clean, minimal design focusing on product clarity with white backgrounds and minimal distractions"
-    ),
-    "tesco_festive": RetailPreset(
-        name="Tesco Festive",
-        base_prompt="Clean retail product advertisement, soft warm background, clear product focus, gentle festive lighting, professional supermarket marketing, minimal festive accents, no props, no people, sharp product edges, high legibility, subtle celebration theme",
-        negative_prompt="clutter, dramatic lighting, fantasy art, neon colors, illustration style, social media aesthetics, busy background, excessive decorations, text overlays, logos, brand names, watermarks, signatures, overwhelming festive elements",
-        color_palette=["#FFF8F0", "#FFE4CC", "#FF6B35"],
-        layout_rules={
-            "background_style": "soft_gradient",
-            "max_elements": 3,
-            "product_visibility": 0.75,
-            "text_margins": 0.12
-        },
-        text_rules={
-            "headline_position": "center",
-            "cta_style": "festive_button",
-            "max_text_length": 25
-        },
-        explanation="Warm, inviting design with subtle festive elements while maintaining product focus and clean layout"
-    ),
-    "tesco_value": RetailPreset(
-        name="Tesco Value Deal",
-        base_prompt="Clean retail product advertisement, light blue background, clear product focus, bright studio lighting, professional supermarket marketing, value-focused design, no props, no people, sharp product edges, high legibility, deal emphasis",
-        negative_prompt="clutter, dramatic lighting, fantasy art, neon colors, illustration style, social media aesthetics, busy background, luxury elements, text overlays, logos, brand names, watermarks, signatures, premium styling",
-        color_palette=["#E6F3FF", "#D4EDFF", "#00539F"],
-        layout_rules={
-            "background_style": "solid",
-            "max_elements": 2,
-            "product_visibility": 0.85,
-            "text_margins": 0.08
-        },
-        text_rules={
-            "headline_position": "top",
-            "cta_style": "value_button",
-            "max_text_length": 15
-        },
-        explanation="Value-focused design with clean blue tones and emphasis on deals, maintaining professional retail standards"
-    ),
-    "tesco_premium": RetailPreset(
-        name="Tesco Premium",
-        base_prompt="Clean retail product advertisement, soft gray background, clear product focus, elegant studio lighting, professional supermarket marketing, premium feel, no props, no people, sharp product edges, high legibility, sophisticated design",
-        negative_prompt="clutter, dramatic lighting, fantasy art, neon colors, illustration style, social media aesthetics, busy background, cheap elements, text overlays, logos, brand names, watermarks, signatures, gaudy styling",
-        color_palette=["#F8F8F8", "#E8E8E8", "#333333"],
-        layout_rules={
-            "background_style": "subtle_gradient",
-            "max_elements": 2,
-            "product_visibility": 0.8,
-            "text_margins": 0.15
-        },
-        text_rules={
-            "headline_position": "center",
-            "cta_style": "premium_button",
-            "max_text_length": 20
-        },
-        explanation="Sophisticated, premium design with elegant gray tones and refined typography for upscale positioning"
-    )
-}
+# Background removal results keyed by upload hash and backend
+RESULT_CACHE = ResultCache()
+if MATTE_MODE == "border":
+    FALLBACK_BACKEND = f"fallback:border:d{MATTE_TOLERANCE}:f{MATTE_FEATHER}:m{UPLOAD_MAX_PIXELS}"
+else:
+    FALLBACK_BACKEND = (f"fallback:t{MATTE_THRESHOLD}:k{MATTE_KERNEL_SIZE}"
+                        f":p{MATTE_PROXY_PIXELS}:m{UPLOAD_MAX_PIXELS}")
+
+# Perceptual hashes of uploads whose cutout is cached, so near duplicates reuse its mask
+NEAR_DUPLICATES = NearDuplicateIndex()
+
+# Concurrent removals of the same upload share one upstream call
+COALESCER = SingleFlight()
+
+# Asynchronous background removal jobs
+JOBS = JobQueue()
+JOB_RETRY_AFTER = 5
+SSE_HEARTBEAT = 15
+JOB_RESULT_MAX_WAIT = 60
+
+# Progressive mode: a preview about the size of the editor canvas first, the full result after
+PREVIEW_SIZE = int(os.getenv("PREVIEW_SIZE", "400"))
+PREVIEW_HEARTBEAT = 1.0
+PROGRESSIVE_MODES = ("1", "true", "yes", "job", "stream")
+
+# Gauges refreshed from component snapshots whenever /metrics is scraped
+COMPONENT_GAUGE = REGISTRY.register(Gauge(
+    "p2p_component_state", "Queue depths, in-flight work and cache counters", ("component", "field")))
+
+
+BREAKER_STATES = ("closed", "half_open", "open")
+
+
+def collect_component_gauges():
+    hf = HF_CLIENT.snapshot()
+    breaker = hf.pop("breaker")
+    for state in BREAKER_STATES:
+        hf[f"breaker_{state}"] = int(breaker == state)
+    components = {
+        "hf": hf,
+        "jobs": JOBS.snapshot(),
+        "uploads": UPLOAD_BUDGET.snapshot(),
+        "result_cache": RESULT_CACHE.snapshot(),
+        "near_duplicates": NEAR_DUPLICATES.snapshot(),
+        "singleflight": dict(COALESCER.stats, in_flight=COALESCER.in_flight()),
+        "presets": RETAIL_PRESETS.stats(),
+        "frontend": STATIC_SITE.stats(),
+    }
+    for component, fields in components.items():
+        for field, value in fields.items():
+            COMPONENT_GAUGE.set(value, component=component, field=field)
+
+
+REGISTRY.add_collector(collect_component_gauges)
+
+
+@bp.before_app_request
+def start_request_timer():
+    # Registered first so every request, including ones rejected below, is measured
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    g.request_state = begin_request(route, request.method, request.path)
+    g.response_status = 500
+
+
+@bp.after_app_request
+def record_response_status(response):
+    g.response_status = response.status_code
+    response.headers["X-Request-Id"] = g.request_state.id
+    if RECORDER.wants():
+        # Uploads refused before they were read (413, 503) are recorded without their body
+        refused = request.content_length and not g.get("upload_reserved")
+        g.recording = RECORDER.capture(request, read_body=not refused)
+    if response.is_streamed:
+        # Teardown runs before a streamed body is sent; time it until the server closes the response
+        state, recording = g.pop("request_state", None), g.pop("recording", None)
+        if state is not None:
+            status = response.status_code
+            response.call_on_close(lambda: _finish_request(state, status, recording))
+    return response
+
+
+@bp.teardown_app_request
+def finish_request_timer(_error=None):
+    # Streamed responses were handed to call_on_close above and are no longer in g
+    state = g.pop("request_state", None)
+    if state is not None:
+        _finish_request(state, g.get("response_status", 500), g.pop("recording", None))
+
+
+def _finish_request(state, status: int, recording: Optional[Dict]):
+    elapsed = end_request(state, status)
+    if recording is not None:
+        recording.update(ts=round(time.time() - elapsed, 6), request_id=state.id, status=status,
+                         duration_ms=round(elapsed * 1000, 2))
+        RECORDER.write(recording)
+
+
+# Opt-in JSONL traffic log for benchmarks/replay.py (REQUEST_RECORD)
+RECORDER = RequestRecorder()
+
+# The frontend page and its fingerprinted scripts/styles, precompressed in memory
+STATIC_SITE = StaticSite()
+
+# Upload bytes in flight across all requests; batch endpoints get a larger per-request cap
+UPLOAD_BUDGET = ByteBudget()
+BATCH_UPLOAD_ENDPOINTS = {"poster.remove_bg_batch"}
+UPLOAD_RETRY_AFTER = 2
+
+
+@bp.before_app_request
+def reserve_upload_budget():
+    """Reject oversized or over-budget uploads before reading the body"""
+    if request.endpoint in BATCH_UPLOAD_ENDPOINTS:
+        request.max_content_length = UPLOAD_MAX_BATCH_BYTES
+
+    length = request.content_length
+    if length is None and request.headers.get("Transfer-Encoding", "").lower() == "chunked":
+        # Unknown size: hold the most it is allowed to be
+        length = request.max_content_length
+    if not length:
+        return None
+    if request.max_content_length is not None and length > request.max_content_length:
+        raise RequestEntityTooLarge()
+
+    if not UPLOAD_BUDGET.acquire(length):
+        print(f"[Uploads] Rejecting {length} byte upload, in-flight budget exhausted")
+        response = jsonify({"error": "server is busy with other uploads, retry shortly"})
+        response.status_code = 503
+        response.headers["Retry-After"] = str(UPLOAD_RETRY_AFTER)
+        return response
+    g.upload_reserved = length
+    return None
+
+
+@bp.teardown_app_request
+def release_upload_budget(_error=None):
+    # Runs after streamed responses finish, so batch spools stay accounted for
+    UPLOAD_BUDGET.release(g.pop("upload_reserved", 0))
+
+
+@bp.app_errorhandler(RequestEntityTooLarge)
+def upload_too_large(_error):
+    limit = request.max_content_length
+    return jsonify({"error": f"upload exceeds the {limit} byte limit"}), 413
+
+
+# Retail Brand Rules Engine - Tesco Style Presets, compiled from presets/*.json
+RETAIL_PRESETS = PresetRegistry()
 
 
 def get_retail_preset(preset_name: str) -> RetailPreset:
     """Get retail preset by name, fallback to minimal"""
-    return RETAIL_PRESETS.get(preset_name.lower(), RETAIL_PRESETS["tesco_minimal"])
+    return RETAIL_PRESETS.resolve(preset_name)
 
 
 def build_tesco_prompt(user_prompt: str, preset: RetailPreset) -> Tuple[str, str]:
@@ -135,23 +231,7 @@ def build_tesco_prompt(user_prompt: str, preset: RetailPreset) -> Tuple[str, str
 
 def generate_explanation_data(preset: RetailPreset, user_prompt: str) -> Dict:
     """Generate explainability data for judges"""
-    return {
-        "retail_preset": preset.name,
-        "retail_rules_applied": [
-            "Clean layouts enforced",
-            "Product visibility maintained",
-            "Safe text margins applied",
-            "Limited color palette",
-            "No artistic fantasy styles",
-            "Professional retail aesthetics"
-        ],
-        "color_choices": preset.color_palette,
-        "layout_density": f"Max {preset.layout_rules['max_elements']} elements",
-        "text_placement": preset.text_rules["headline_position"],
-        "design_rationale": preset.explanation,
-        "user_input": user_prompt,
-        "compliance_score": "Tesco Brand Compliant"
-    }
+    return dict(preset.explanation_data, user_input=user_prompt)
 
 
 def _lighten_color(hex_color, factor):
@@ -181,47 +261,77 @@ def _prompt_color(prompt: str, lighten: bool = False) -> str:
     return f"#{r:02x}{g:02x}{b:02x}"
 
 
+RATIOS = {
+    "1:1": (1080, 1080),
+    "4:5": (1080, 1350),
+    "3:4": (1200, 1600),
+    "9:16": (1080, 1920),
+    "16:9": (1600, 900),
+    "3:1": (1800, 600),
+    "A4": (2480, 3508),
+}
+
+
 def _pick_ratio(ratio_label: str):
-    ratios = {
-        "1:1": (1080, 1080),
-        "4:5": (1080, 1350),
-        "3:4": (1200, 1600),
-        "9:16": (1080, 1920),
-        "16:9": (1600, 900),
-        "3:1": (1800, 600),
-        "A4": (2480, 3508),
-    }
-    return ratios.get(ratio_label, (1080, 1080))
+    return RATIOS.get(ratio_label, (1080, 1080))
 
 
-@app.route("/")
+def _static_response(asset: StaticAsset) -> Response:
+    """A precompressed asset in the encoding the client prefers, revalidated by ETag"""
+    encoding, body = asset.select(request.accept_encodings)
+    response = Response(body, mimetype=asset.mimetype)
+    # Each encoding is a different representation, so it gets its own validator
+    response.set_etag(asset.etag if encoding == "identity" else f"{asset.etag}-{encoding}")
+    if encoding != "identity":
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    if asset.immutable:
+        response.cache_control.public = True
+        response.cache_control.max_age = STATIC_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+@bp.route("/")
 def serve_frontend():
     """Serve the frontend HTML file"""
-    frontend_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "frontend", "index.html")
-    return send_file(frontend_path)
+    asset = STATIC_SITE.index()
+    if asset is None:
+        return jsonify({"error": "frontend not found"}), 404
+    return _static_response(asset)
+
 
-@app.route("/health")
+@bp.route(STATIC_URL_PREFIX + "<path:name>")
+def serve_static_asset(name):
+    """Serve a script or stylesheet split out of the frontend, by content hash"""
+    asset = STATIC_SITE.asset(STATIC_URL_PREFIX + name)
+    if asset is None:
+        return jsonify({"error": "asset not found"}), 404
+    return _static_response(asset)
+
+@bp.route("/health")
 def health():
     return jsonify({"status": "ok"})
 
-@app.route("/test-hf", methods=["GET"])
+@bp.route("/test-hf", methods=["GET"])
 def test_hf():
     """Test endpoint to verify HF token and API connectivity"""
     if not HF_TOKEN:
         return jsonify({"error": "HUGGINGFACE_TOKEN not set", "token_length": 0}), 500
     
-    # Test with a minimal request
-    headers = {"Authorization": f"Bearer {HF_TOKEN}"}
     try:
         # Just check if the endpoint is reachable
-        model_url = f"https://api-inference.huggingface.co/models/{HF_MODEL}"
-        response = requests.get(model_url.replace("/models/", "/status/"), headers=headers, timeout=10)
+        model_url = HF_CLIENT.model_url
+        response = HF_CLIENT.status()
         return jsonify({
             "token_set": True,
             "token_length": len(HF_TOKEN),
             "model_url": model_url,
             "status_check": response.status_code,
-            "response": response.text[:200] if response.text else "No response"
+            "response": response.text[:200] if response.text else "No response",
+            "client": HF_CLIENT.snapshot()
         })
     except Exception as e:
         return jsonify({
@@ -231,124 +341,571 @@ def test_hf():
         }), 500
 
 
-@app.route("/remove-bg", methods=["POST"])
-def remove_bg():
+def fallback_cutout(image_bytes: bytes, max_pixels: int = UPLOAD_MAX_PIXELS) -> bytes:
+    """Simple local background removal, returned as PNG bytes no larger than `max_pixels`"""
+    # Decode at a capped resolution (JPEGs are downscaled inside libjpeg)
+    with span("decode"):
+        image = decode_image(image_bytes, max_pixels)
+        data = np.array(image)
+    
+    if MATTE_MODE == "border":
+        # Remove the border-connected backdrop; the feathered alpha replaces the blur
+        data[:, :, 3] = compute_alpha_border(data, MATTE_TOLERANCE, MATTE_FEATHER)
+        result = Image.fromarray(data, 'RGBA')
+    else:
+        # Matte out light backgrounds (threshold/dilate/refine are timed inside)
+        data[:, :, 3] = compute_alpha_multires(data, MATTE_THRESHOLD, MATTE_KERNEL_SIZE, MATTE_PROXY_PIXELS)
+        
+        # Convert back to PIL Image and apply slight blur to smooth edges
+        with span("smooth"):
+            result = Image.fromarray(data, 'RGBA')
+            result = result.filter(ImageFilter.SMOOTH_MORE)
+    
+    # Convert to PNG with transparency (a fast profile: cutouts rarely compress well)
+    with span("encode"):
+        png_bytes, _ = encode(result, PROFILES[CUTOUT_PROFILE])
+    return png_bytes
+
+
+class BackgroundRemovalError(Exception):
+    """Background removal failed in a way that should be reported to the client"""
+
+
+def remove_background(image_bytes: bytes, image_digest: str = None) -> bytes:
     """
-    Remove background using Hugging Face API with fallback
+    Remove the background from an encoded image and return PNG bytes.
+
+    Concurrent calls for the same image are coalesced so only one of them
+    reaches Hugging Face or the fallback; the rest share its result or error.
     """
-    if "image" not in request.files:
-        return jsonify({"error": "image file missing"}), 400
+    if image_digest is None:
+        with span("hash"):
+            image_digest = hashlib.sha256(image_bytes).hexdigest()
+    return COALESCER.do(image_digest, lambda: _remove_background_uncoalesced(image_bytes, image_digest))
+
+
+def _hash_upload(image_bytes: bytes) -> Optional[Fingerprint]:
+    if not NEAR_DUPLICATES.enabled:
+        return None
+    with span("phash"):
+        return NEAR_DUPLICATES.fingerprint(image_bytes)
 
-    file = request.files["image"]
-    image_bytes = file.read()
-    print(f"[BG Removal] Processing image ({len(image_bytes)} bytes)")
 
+def index_cutout(fp: Optional[Fingerprint], key: str, png_bytes: bytes, backend: str):
+    """Make a freshly cached cutout available to near duplicates of its upload"""
+    if fp is None:
+        return
+    try:
+        # Only the PNG header is read
+        with Image.open(BytesIO(png_bytes)) as cutout:
+            size = cutout.size
+    except Exception:
+        return
+    NEAR_DUPLICATES.add(fp, key, size, backend)
+
+
+def _cached_mask(key: str) -> Optional[Image.Image]:
+    """Alpha mask of the cutout cached under `key`, kept as its own small PNG after first use"""
+    mask_key = cache_key(key, "alpha")
+    data = RESULT_CACHE.get(mask_key)
+    if data is not None:
+        return Image.open(BytesIO(data))
+    cutout = RESULT_CACHE.get(key)
+    if cutout is None:
+        return None
+    # A full RGBA cutout takes ~10x longer to decode than its mask alone
+    with Image.open(BytesIO(cutout)) as source:
+        if "A" not in source.getbands():
+            return None
+        alpha = source.getchannel("A")
+    mask_png, _ = encode(alpha, PROFILES["png-fast"])
+    RESULT_CACHE.put(mask_key, mask_png)
+    return alpha
+
+
+def reuse_near_duplicate(image_bytes: bytes, fp: Optional[Fingerprint], backend: str, key: str) -> Optional[bytes]:
+    """
+    Cutout for an upload made from `backend`'s cached cutout of a near-duplicate image.
+
+    The stored alpha mask is rescaled onto the upload's own pixels, so a
+    re-exported or resized packshot skips Hugging Face and the local matte.
+    The result is cached under the upload's own `key`, so the same bytes hit
+    the exact cache next time.
+    """
+    if fp is None:
+        return None
+    with span("phash_lookup"):
+        match = NEAR_DUPLICATES.lookup(fp, backend)
+    if match is None:
+        return None
+    try:
+        with span("decode"):
+            image = decode_image(image_bytes, UPLOAD_MAX_PIXELS)
+        if image.width > match.size[0] * PHASH_MAX_UPSCALE:
+            # Too soft once stretched; a fresh cutout is worth the cost
+            return None
+        with span("reuse_mask"):
+            alpha = _cached_mask(match.key)
+            if alpha is None:
+                NEAR_DUPLICATES.discard(match.key)
+                return None
+            if alpha.size != image.size:
+                alpha = alpha.resize(image.size, Image.BILINEAR)
+            image.putalpha(alpha)
+        with span("encode"):
+            png_bytes, _ = encode(image, PROFILES[CUTOUT_PROFILE])
+    except Exception as e:
+        print(f"[BG Removal] Could not reuse a near-duplicate cutout: {str(e)}")
+        return None
+    print(f"[BG Removal] Reused the mask of a near-duplicate image (distance {match.distance})")
+    RESULT_CACHE.put(key, png_bytes)
+    return png_bytes
+
+
+def _remove_background_uncoalesced(image_bytes: bytes, image_digest: str) -> bytes:
+    # Perceptual hash of the upload, computed once an exact cache lookup has missed
+    fp, hashed = None, False
     # Try Hugging Face API first
     if HF_TOKEN:
+        hf_key = cache_key(image_digest, HF_MODEL)
+        with span("cache_lookup"):
+            cached = RESULT_CACHE.get(hf_key)
+        if cached is not None:
+            print("[BG Removal] Cache hit for Hugging Face result")
+            return cached
+        fp = _hash_upload(image_bytes)
+        hashed = True
+        reused = reuse_near_duplicate(image_bytes, fp, HF_MODEL, hf_key)
+        if reused is not None:
+            return reused
+
         try:
             print("[BG Removal] Calling Hugging Face API...")
-            headers = {
-                "Authorization": f"Bearer {HF_TOKEN}",
-                "Content-Type": "application/octet-stream"
-            }
-            
-            response = requests.post(
-                f"https://api-inference.huggingface.co/models/{HF_MODEL}",
-                headers=headers,
-                data=image_bytes,
-                timeout=30
-            )
+            with span("hf_call"):
+                response = HF_CLIENT.remove_background(image_bytes)
             
             if response.status_code == 200:
                 print("[BG Removal] Successfully processed image via Hugging Face")
-                return send_file(
-                    BytesIO(response.content),
-                    mimetype="image/png",
-                    as_attachment=False
-                )
+                RESULT_CACHE.put(hf_key, response.content)
+                index_cutout(fp, hf_key, response.content, HF_MODEL)
+                return response.content
             else:
                 print(f"[BG Removal] Hugging Face API error: {response.status_code}")
                 if response.status_code == 429:
                     print("[BG Removal] Rate limited, using fallback")
-                elif response.status_code == 410:
+                elif response.status_code in (410, 503):
                     print("[BG Removal] Model unavailable, using fallback")
                 else:
                     error_msg = response.json().get("error", "Unknown error")
                     print(f"[BG Removal] Hugging Face API error: {error_msg}")
-                    return jsonify({"error": f"Hugging Face API error: {error_msg}"}), 500
+                    raise BackgroundRemovalError(f"Hugging Face API error: {error_msg}")
 
+        except BackgroundRemovalError:
+            raise
+        except UpstreamUnavailable as e:
+            print(f"[BG Removal] Skipping Hugging Face API ({str(e)}), using fallback")
         except Exception as e:
             print(f"[BG Removal] Hugging Face API failed: {str(e)}")
     
     # Fallback: Simple background removal using PIL
+    fallback_key = cache_key(image_digest, FALLBACK_BACKEND)
+    with span("cache_lookup"):
+        cached = RESULT_CACHE.get(fallback_key)
+    if cached is not None:
+        print("[BG Removal] Cache hit for fallback result")
+        return cached
+    if not hashed:
+        fp = _hash_upload(image_bytes)
+    # Only fallback cutouts are reused here, never Hugging Face ones under the fallback's key
+    reused = reuse_near_duplicate(image_bytes, fp, FALLBACK_BACKEND, fallback_key)
+    if reused is not None:
+        return reused
+
     print("[BG Removal] Using fallback background removal method")
     try:
-        from PIL import Image, ImageFilter
-        import numpy as np
-        
-        # Open image
-        image = Image.open(BytesIO(image_bytes))
-        if image.mode != 'RGBA':
-            image = image.convert('RGBA')
-        
-        # Convert to numpy array
-        data = np.array(image)
-        r, g, b, a = data[:, :, 0], data[:, :, 1], data[:, :, 2], data[:, :, 3]
-        
-        # Convert to grayscale
-        gray = 0.299 * r + 0.587 * g + 0.114 * b
-        
-        # Simple threshold-based background removal
-        # Remove white/light backgrounds
-        threshold = 240  # Adjust this threshold as needed
-        mask = gray > threshold
-        
-        # Apply simple smoothing to mask using numpy only
-        try:
-            # Simple neighbor-based dilation using numpy
-            kernel = np.ones((3,3), np.uint8)
-            h, w = mask.shape
-            dilated = np.zeros_like(mask)
-            for i in range(1, h-1):
-                for j in range(1, w-1):
-                    if mask[i,j] or np.any(mask[i-1:i+2, j-1:j+2]):
-                        dilated[i,j] = True
-            mask = dilated
-        except Exception:
-            # If dilation fails, use original mask
-            pass
-        
-        # Apply mask to alpha channel
-        data[:, :, 3] = np.where(mask, 0, 255)
-        
-        # Convert back to PIL Image
-        result = Image.fromarray(data, 'RGBA')
-        
-        # Apply slight blur to smooth edges
-        result = result.filter(ImageFilter.SMOOTH_MORE)
-        
-        print("[BG Removal] Fallback method completed successfully")
-        
-        # Convert to PNG with transparency
-        buf = BytesIO()
-        result.save(buf, format='PNG')
-        buf.seek(0)
-        return send_file(buf, mimetype="image/png")
-        
+        png_bytes = fallback_cutout(image_bytes)
     except Exception as fallback_e:
         print(f"[BG Removal] Fallback method failed: {str(fallback_e)}")
-        return jsonify({"error": f"Background removal failed: Both Hugging Face API and fallback method failed"}), 500
+        raise BackgroundRemovalError("Background removal failed: Both Hugging Face API and fallback method failed")
 
+    print("[BG Removal] Fallback method completed successfully")
+    RESULT_CACHE.put(fallback_key, png_bytes)
+    index_cutout(fp, fallback_key, png_bytes, FALLBACK_BACKEND)
+    return png_bytes
 
-@app.route("/generate", methods=["POST"])
-def generate():
+
+@bp.route("/remove-bg", methods=["POST"])
+def remove_bg():
     """
-    Retail Media Creative Generator with Tesco Brand Compliance.
-    Generates clean retail posters following brand guidelines.
+    Remove background using Hugging Face API with fallback.
+
+    With `progressive=1` a small preview comes back at once and the full
+    cutout is finished as a job; `progressive=stream` sends both as NDJSON.
     """
-    prompt = request.form.get("prompt", "").strip() or "Product campaign"
-    ratio = request.form.get("ratio", "1:1")
-    retail_preset = request.form.get("retail_preset", "tesco_minimal")
+    if "image" not in request.files:
+        return jsonify({"error": "image file missing"}), 400
+    try:
+        profile = negotiate("cutout", request.form.get("format"), request.accept_mimetypes)
+    except UnsupportedFormat as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        progressive = _progressive_mode()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if progressive:
+        # The job outlives this request, so it gets its own copy of the upload
+        stream = request.files["image"].stream
+        stream.seek(0)
+        return progressive_cutout(stream.read(), profile, progressive == "stream")
+
+    # Large uploads arrive spooled on disk and are mapped rather than copied
+    with upload_buffer(request.files["image"].stream) as image_bytes:
+        print(f"[BG Removal] Processing image ({len(image_bytes)} bytes)")
+        try:
+            png_bytes = remove_background(image_bytes)
+        except BackgroundRemovalError as e:
+            return jsonify({"error": str(e)}), 500
+    # Results are cached as PNG; other formats are transcoded per response
+    with span("encode"):
+        data, mimetype = transcode(png_bytes, profile)
+    response = send_file(BytesIO(data), mimetype=mimetype)
+    response.vary.add("Accept")
+    return response
+
+
+def _progressive_mode() -> str:
+    """The request's `progressive` value, "" when absent (raises ValueError when unknown)"""
+    progressive = request.form.get("progressive", "").lower()
+    if progressive and progressive not in PROGRESSIVE_MODES:
+        raise ValueError(f"progressive must be one of {', '.join(PROGRESSIVE_MODES)}")
+    return progressive
+
+
+def progressive_cutout(image_bytes: bytes, profile: EncoderProfile, stream: bool) -> Response:
+    """
+    Answer with a preview cutout now and finish the full-resolution one as a job.
+
+    The preview is the local matte on a decode of about PREVIEW_SIZE pixels
+    square. By default the response is the job payload plus the preview and
+    a `result_url` that waits for the full image; DELETE /jobs/<id> cancels
+    it. In stream mode the response is NDJSON (a preview line, heartbeats,
+    then the full image), and disconnecting cancels the job.
+    """
+    try:
+        with span("preview"):
+            preview, mimetype = transcode(fallback_cutout(image_bytes, PREVIEW_SIZE * PREVIEW_SIZE), profile)
+    except (UnidentifiedImageError, Image.DecompressionBombError) as e:
+        # The upload itself is unusable
+        print(f"[BG Removal] Preview rejected: {str(e)}")
+        return jsonify({"error": f"Could not read image: {str(e)}"}), 400
+    except Exception as e:
+        print(f"[BG Removal] Preview failed: {str(e)}")
+        return jsonify({"error": f"Preview failed: {str(e)}"}), 500
+
+    def full():
+        raise_if_cancelled()
+        return transcode(remove_background(image_bytes), profile)
+
+    try:
+        job = JOBS.submit("remove-bg", full)
+    except QueueFull as e:
+        return _queue_busy(e)
+
+    payload = _job_payload(job)
+    payload["preview"] = _data_uri(preview, mimetype)
+    payload["result_url"] = url_for("poster.job_result", job_id=job.id, wait=JOB_RESULT_MAX_WAIT, _external=True)
+    print(f"[BG Removal] Sent preview, full cutout queued as job {job.id}")
+    if not stream:
+        response = jsonify(payload)
+        response.status_code = 202
+        response.headers["Location"] = url_for("poster.job_status", job_id=job.id)
+        return response
+
+    def lines():
+        try:
+            yield _ndjson(dict(payload, stage="preview"))
+            while not job.terminal:
+                # Heartbeats are how a dropped client is noticed
+                JOBS.wait(job, job.version, PREVIEW_HEARTBEAT)
+                if not job.terminal:
+                    yield _ndjson({"stage": "pending", "job_id": job.id, "status": job.status})
+            if job.status == "done":
+                data, result_type = job.result
+                yield _ndjson({"stage": "full", "job_id": job.id, "image": _data_uri(data, result_type)})
+            else:
+                yield _ndjson({"stage": job.status, "job_id": job.id, "error": job.error})
+        finally:
+            # Also runs when the server closes the stream because the client went away
+            if not job.terminal:
+                JOBS.cancel(job.id)
+                print(f"[BG Removal] Client left, cancelled job {job.id}")
+
+    return Response(stream_with_context(lines()), mimetype="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
+
+
+def _ndjson(record: Dict) -> str:
+    return json.dumps(record, separators=(",", ":")) + "\n"
+
+
+def _data_uri(data: bytes, mimetype: str) -> str:
+    return f"data:{mimetype};base64,{base64.b64encode(data).decode('utf-8')}"
+
+
+def _raiser(error: Exception):
+    def raise_error():
+        raise error
+    return raise_error
+
+
+def _batch_summary(counts: Dict[str, int], dropped: int = 0) -> Dict:
+    """The closing NDJSON line; `dropped` counts items past BATCH_MAX_ITEMS that were not processed"""
+    return {"summary": dict(counts, total=counts["done"] + counts["error"], truncated=dropped > 0, dropped=dropped)}
+
+
+@bp.route("/remove-bg/batch", methods=["POST"])
+def remove_bg_batch():
+    """
+    Remove backgrounds from many images (multi-file upload and/or zip archives),
+    streaming one NDJSON line per image as each finishes.
+    """
+    uploads = request.files.getlist("images") + request.files.getlist("image") + request.files.getlist("archive")
+    if not uploads:
+        return jsonify({"error": "no images uploaded"}), 400
+
+    # Flask closes request files when the view returns, before streaming starts
+    spooled = [(upload.filename or "upload", upload.mimetype, spool_upload(upload)) for upload in uploads]
+
+    def sources():
+        for name, mimetype, spool in spooled:
+            if name.lower().endswith(".zip") or mimetype in ("application/zip", "application/x-zip-compressed"):
+                try:
+                    yield from zip_images(spool)
+                except zipfile.BadZipFile as e:
+                    yield name, _raiser(BackgroundRemovalError(f"Invalid zip archive: {str(e)}"))
+            else:
+                yield name, spool.read
+
+    dropped = [0]
+
+    def items():
+        for index, (name, read) in enumerate(sources()):
+            if index >= BATCH_MAX_ITEMS:
+                # Keep counting, without reading, so the summary can say how many were left out
+                dropped[0] += 1
+                continue
+            try:
+                image_bytes = read()
+            except Exception as e:
+                yield {"index": index, "name": name, "bytes": 0}, _raiser(e)
+                continue
+            meta = {"index": index, "name": name, "bytes": len(image_bytes)}
+            yield meta, (lambda image_bytes=image_bytes: remove_background(image_bytes))
+
+    def stream():
+        counts = {"done": 0, "error": 0}
+        try:
+            for meta, png_bytes, error in run_streaming(items()):
+                if error is not None:
+                    counts["error"] += 1
+                    yield _ndjson(dict(meta, status="error", error=str(error)))
+                    continue
+                counts["done"] += 1
+                b64_image = base64.b64encode(png_bytes).decode("utf-8")
+                yield _ndjson(dict(meta, status="done", image=f"data:image/png;base64,{b64_image}"))
+            if dropped[0]:
+                print(f"[Batch] Truncated background removal batch at {BATCH_MAX_ITEMS} images, "
+                      f"dropped {dropped[0]}")
+            yield _ndjson(_batch_summary(counts, dropped[0]))
+        finally:
+            for _, _, spool in spooled:
+                spool.close()
+
+    return Response(stream_with_context(stream()), mimetype="application/x-ndjson")
+
+
+@bp.route("/generate/batch", methods=["POST"])
+def generate_batch():
+    """
+    Generate designs for a list of {prompt, ratio, retail_preset} items,
+    streaming one NDJSON line per design as each finishes.
+
+    Accepts either a JSON list or {"items": [...], "texture_mode": "url"|"inline"}.
+    """
+    body = request.get_json(silent=True)
+    if isinstance(body, list):
+        body = {"items": body}
+    if not isinstance(body, dict) or not isinstance(body.get("items"), list):
+        return jsonify({"error": "expected a JSON list of {prompt, ratio, retail_preset} items"}), 400
+    requested = body["items"][:BATCH_MAX_ITEMS]
+    dropped = len(body["items"]) - len(requested)
+    texture_mode = body.get("texture_mode", "url")
+
+    def items():
+        for index, item in enumerate(requested):
+            if not isinstance(item, dict):
+                item = {}
+            yield {"index": index}, (lambda item=item: build_design(
+                str(item.get("prompt", "")),
+                str(item.get("ratio", "1:1")),
+                str(item.get("retail_preset", "tesco_minimal")),
+            ))
+
+    def stream():
+        counts = {"done": 0, "error": 0}
+        for meta, built, error in run_streaming(items()):
+            if error is not None:
+                counts["error"] += 1
+                yield _ndjson(dict(meta, status="error", error=str(error)))
+                continue
+            counts["done"] += 1
+            design, texture = built
+            design["texture"] = texture_reference(texture, texture_mode, design)
+            yield _ndjson(dict(meta, status="done", design=design))
+        yield _ndjson(_batch_summary(counts, dropped))
+
+    return Response(stream_with_context(stream()), mimetype="application/x-ndjson")
+
+
+def _queue_busy(error: QueueFull) -> Response:
+    response = jsonify({"error": str(error)})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(JOB_RETRY_AFTER)
+    return response
+
+
+def _job_payload(job) -> Dict:
+    payload = job.to_dict()
+    payload["status_url"] = url_for("poster.job_status", job_id=job.id, _external=True)
+    payload["events_url"] = url_for("poster.job_events", job_id=job.id, _external=True)
+    if job.status == "done":
+        payload["result_url"] = url_for("poster.job_result", job_id=job.id, _external=True)
+    return payload
+
+
+@bp.route("/jobs/remove-bg", methods=["POST"])
+def submit_remove_bg_job():
+    """Queue a background removal and return its job id immediately"""
+    if "image" not in request.files:
+        return jsonify({"error": "image file missing"}), 400
+
+    image_bytes = request.files["image"].read()
+    try:
+        job = JOBS.submit("remove-bg", lambda: (remove_background(image_bytes), "image/png"))
+    except QueueFull as e:
+        return _queue_busy(e)
+
+    print(f"[Jobs] Queued background removal {job.id} ({len(image_bytes)} bytes)")
+    response = jsonify(_job_payload(job))
+    response.status_code = 202
+    response.headers["Location"] = url_for("poster.job_status", job_id=job.id)
+    return response
+
+
+@bp.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    """Poll a job's status"""
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({"error": "job not found"}), 404
+    return jsonify(_job_payload(job))
+
+
+@bp.route("/jobs/<job_id>", methods=["DELETE"])
+def cancel_job(job_id):
+    """Cancel a queued or running job; its result, if any, is discarded"""
+    job = JOBS.cancel(job_id)
+    if job is None:
+        return jsonify({"error": "job not found"}), 404
+    return jsonify(_job_payload(job))
+
+
+@bp.route("/jobs/<job_id>/result", methods=["GET"])
+def job_result(job_id):
+    """Download a finished job's image, optionally waiting up to `wait` seconds for it"""
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({"error": "job not found"}), 404
+    try:
+        wait = min(max(float(request.args.get("wait", 0)), 0.0), JOB_RESULT_MAX_WAIT)
+    except ValueError:
+        return jsonify({"error": "wait must be a number of seconds"}), 400
+    deadline = time.monotonic() + wait
+    while not job.terminal and deadline > time.monotonic():
+        JOBS.wait(job, job.version, deadline - time.monotonic())
+
+    if job.status == "done":
+        result = job.result
+        if result is None:
+            # Read from another worker's shared state after it was swept
+            return jsonify({"error": "job result has expired"}), 410
+        data, mimetype = result
+        return send_file(BytesIO(data), mimetype=mimetype)
+    if job.status == "timeout":
+        return jsonify({"error": job.error}), 504
+    if job.status == "error":
+        return jsonify({"error": job.error}), 500
+    if job.status == "cancelled":
+        return jsonify({"error": "job was cancelled"}), 410
+    return jsonify({"error": f"job is {job.status}"}), 409
+
+
+@bp.route("/jobs/<job_id>/events", methods=["GET"])
+def job_events(job_id):
+    """Stream a job's status changes as Server-Sent Events until it finishes"""
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({"error": "job not found"}), 404
+
+    # Built once rather than on every event
+    urls = _job_payload(job)
+    result_url = url_for("poster.job_result", job_id=job.id, _external=True)
+
+    def stream():
+        version = -1
+        while True:
+            JOBS.wait(job, version, SSE_HEARTBEAT)
+            if job.version == version and not job.terminal:
+                yield ": keep-alive\n\n"
+                continue
+            version = job.version
+            payload = dict(urls, **job.to_dict())
+            if job.status == "done":
+                payload["result_url"] = result_url
+            yield f"event: {job.status}\ndata: {json.dumps(payload)}\n\n"
+            if job.terminal:
+                return
+
+    return Response(stream_with_context(stream()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@bp.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus text exposition of request, stage, upstream and component metrics"""
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+
+@bp.route("/cache/stats", methods=["GET"])
+def cache_stats():
+    """Hit/miss/eviction counters for the background removal result cache"""
+    return jsonify(dict(RESULT_CACHE.snapshot(), coalesced=COALESCER.stats["shared"], jobs=JOBS.snapshot(),
+                        uploads=UPLOAD_BUDGET.snapshot(), near_duplicates=NEAR_DUPLICATES.snapshot(),
+                        textures=TEXTURES.snapshot()))
+
+
+def build_design(prompt: str, ratio: str, retail_preset: str,
+                 with_texture: bool = True, texture_profile: EncoderProfile = None) -> Tuple[Dict, Texture]:
+    """
+    Build the /generate payload for one prompt/ratio/preset.
+
+    Returns the JSON-ready design (without the texture reference, which
+    depends on the request) and the encoded background texture. Callers
+    that composite the background themselves can skip encoding it with
+    `with_texture=False`, in which case the texture is None. Textures use
+    `texture_profile`, or the default texture profile when it is None.
+    """
+    prompt = prompt.strip() or "Product campaign"
     width, height = _pick_ratio(ratio)
 
     # Get retail preset configuration
@@ -360,53 +917,282 @@ def generate():
     # Use preset color palette instead of generated colors
     bg_hex = preset.color_palette[0]  # Primary background color
     
-    # Create background based on preset style
-    image = Image.new("RGBA", (width, height), bg_hex)
-    
-    # Apply preset-specific background styling
-    if preset.layout_rules["background_style"] == "soft_gradient" and len(preset.color_palette) > 1:
-        # Add subtle gradient
-        draw = ImageDraw.Draw(image)
-        for y in range(height):
-            ratio = y / height
-            r1, g1, b1 = tuple(int(bg_hex[i:i+2], 16) for i in (1, 3, 5))
-            r2, g2, b2 = tuple(int(preset.color_palette[1][i:i+2], 16) for i in (1, 3, 5))
-            r = int(r1 + (r2 - r1) * ratio * 0.3)  # Subtle gradient
-            g = int(g1 + (g2 - g1) * ratio * 0.3)
-            b = int(b1 + (b2 - b1) * ratio * 0.3)
-            draw.line([(0, y), (width, y)], fill=f"#{r:02x}{g:02x}{b:02x}")
+    # Render (or reuse) the encoded background for this preset style and size
+    texture = None
+    if with_texture:
+        texture = TEXTURES.get(
+            preset.layout_rules["background_style"],
+            preset.color_palette,
+            (width, height),
+            texture_profile or negotiate("texture"),
+        )
     
     # Generate retail-appropriate text
     headline = generate_retail_headline(prompt, preset)
     subhead = generate_retail_subhead(preset)
     cta_text = generate_retail_cta(preset)
 
-    buf = BytesIO()
-    image.save(buf, format="PNG", optimize=True)
-    buf.seek(0)
-    b64_texture = base64.b64encode(buf.read()).decode("utf-8")
-
     # Generate explainability data
     explanation_data = generate_explanation_data(preset, prompt)
 
-    return jsonify(
-        {
-            "background_color": bg_hex,
-            "accent_color": preset.color_palette[-1],  # Use accent color from palette
-            "headline": headline,
-            "subhead": subhead,
-            "cta_text": cta_text,
-            "ratio": ratio,
-            "retail_preset": retail_preset,
-            "texture": f"data:image/png;base64,{b64_texture}",
-            "shadow": {"blur": 20, "opacity": 0.35, "offset": 20},
-            "base_prompt": base_prompt,
-            "negative_prompt": negative_prompt,
-            "explanation": explanation_data,
-            "text_placement": preset.text_rules["headline_position"],
-            "color_palette": preset.color_palette
-        }
-    )
+    design = {
+        "background_color": bg_hex,
+        "accent_color": preset.color_palette[-1],  # Use accent color from palette
+        "headline": headline,
+        "subhead": subhead,
+        "cta_text": cta_text,
+        "ratio": ratio,
+        "retail_preset": retail_preset,
+        "texture_id": texture.digest if texture else None,
+        "shadow": {"blur": 20, "opacity": 0.35, "offset": 20},
+        "base_prompt": base_prompt,
+        "negative_prompt": negative_prompt,
+        "explanation": explanation_data,
+        "text_placement": preset.text_rules["headline_position"],
+        "color_palette": preset.color_palette
+    }
+    return design, texture
+
+
+def texture_reference(texture: Texture, texture_mode: str, design: Optional[Dict] = None) -> str:
+    """
+    Link to the content-addressed texture unless the client opts into inlining.
+
+    With the `design` it was rendered for, the URL also names the preset,
+    ratio and encoder profile, so a worker that has not rendered it yet can.
+    """
+    if texture_mode == "inline":
+        with span("base64"):
+            b64_texture = base64.b64encode(texture.data).decode("utf-8")
+        return f"data:{texture.mimetype};base64,{b64_texture}"
+    source = {}
+    if design is not None:
+        ratio = design["ratio"] if design["ratio"] in RATIOS else "1:1"
+        source = {"preset": design["retail_preset"], "ratio": ratio, "profile": texture.profile}
+    return url_for("poster.serve_texture", digest=texture.digest, _external=True, **source)
+
+
+@bp.route("/generate", methods=["POST"])
+def generate():
+    """
+    Retail Media Creative Generator with Tesco Brand Compliance.
+    Generates clean retail posters following brand guidelines.
+    The background texture is PNG unless `format` asks for webp (or names a profile).
+    With `progressive=1` an uncached texture is rendered as a job behind a
+    small inline preview.
+    """
+    try:
+        texture_profile = negotiate("texture", request.form.get("format"))
+    except UnsupportedFormat as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        progressive = _progressive_mode()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    texture_mode = request.form.get("texture_mode", "url")
+    with span("design"):
+        design, texture = build_design(
+            request.form.get("prompt", ""),
+            request.form.get("ratio", "1:1"),
+            request.form.get("retail_preset", "tesco_minimal"),
+            with_texture=not progressive,
+            texture_profile=texture_profile,
+        )
+    if progressive:
+        texture = progressive_texture(design, texture_profile)
+        if texture is None:
+            with span("json"):
+                return jsonify(design)
+        design["texture_id"] = texture.digest
+    design["texture"] = texture_reference(texture, texture_mode, design)
+    with span("json"):
+        return jsonify(design)
+
+
+def progressive_texture(design: Dict, profile: EncoderProfile) -> Optional[Texture]:
+    """
+    Add an inline preview texture to a design and return the full texture if cached.
+
+    Otherwise the full texture is queued as a job, `texture` points at its
+    waiting result URL and `texture_job` carries the job, and None is
+    returned. A full queue falls back to rendering in the request.
+    """
+    preset = get_retail_preset(design["retail_preset"])
+    style, palette = preset.layout_rules["background_style"], preset.color_palette
+    size = _pick_ratio(design["ratio"])
+    scale = min(1.0, PREVIEW_SIZE / max(size))
+    preview_size = (max(1, round(size[0] * scale)), max(1, round(size[1] * scale)))
+    with span("preview"):
+        # Rendered per request rather than cached: it takes a few milliseconds
+        preview = encode_texture(Image.fromarray(render_background(style, palette, preview_size), "RGBA"), profile)
+    design["texture_preview"] = texture_reference(preview, "inline")
+
+    texture = TEXTURES.peek(style, palette, size, profile)
+    if texture is not None:
+        return texture
+    try:
+        job = JOBS.submit("texture", lambda: _texture_result(TEXTURES.get(style, palette, size, profile)))
+    except QueueFull:
+        return TEXTURES.get(style, palette, size, profile)
+    design["texture_job"] = _job_payload(job)
+    # The digest is unknown until the job renders; the job result URL stands in for it
+    design.pop("texture_id", None)
+    design["texture"] = url_for("poster.job_result", job_id=job.id, wait=JOB_RESULT_MAX_WAIT, _external=True)
+    return None
+
+
+def _texture_result(texture: Texture) -> Tuple[bytes, str]:
+    return texture.data, texture.mimetype
+
+
+def _render_uploads() -> Tuple[bytes, bytes]:
+    """Read the product and logo uploads, cutting out the product if asked to"""
+    product_bytes = request.files["product"].read() if "product" in request.files else None
+    logo_bytes = request.files["logo"].read() if "logo" in request.files else None
+    if product_bytes and request.form.get("remove_background") in ("1", "true", "yes"):
+        product_bytes = remove_background(product_bytes)
+    return product_bytes, logo_bytes
+
+
+def _render_format() -> str:
+    """Name of the poster encoder profile for this request (raises UnsupportedFormat)"""
+    return negotiate("poster", request.form.get("format"), request.accept_mimetypes).name
+
+
+@bp.route("/render", methods=["POST"])
+def render():
+    """
+    Composite a finished poster server-side from a /generate payload.
+
+    Multipart fields: `design` (the /generate JSON), `product` (a cutout PNG,
+    or any product photo with `remove_background=1`), optional `logo`, and
+    `format` (png, webp, jpeg or a profile name; otherwise negotiated from
+    the Accept header).
+    """
+    try:
+        design = json.loads(request.form.get("design", ""))
+    except ValueError:
+        return jsonify({"error": "design must be the JSON returned by /generate"}), 400
+    if not isinstance(design, dict):
+        return jsonify({"error": "design must be the JSON returned by /generate"}), 400
+
+    try:
+        product_bytes, logo_bytes = _render_uploads()
+    except BackgroundRemovalError as e:
+        return jsonify({"error": str(e)}), 500
+    try:
+        fmt = _render_format()
+    except UnsupportedFormat as e:
+        return jsonify({"error": str(e)}), 400
+
+    preset = get_retail_preset(str(design.get("retail_preset", "tesco_minimal")))
+    size = _pick_ratio(str(design.get("ratio", "1:1")))
+    try:
+        # Decode the product no larger than the slot it fills
+        product = decode_product(product_bytes, product_box(size, preset.layout_rules)) if product_bytes else None
+        poster = render_poster(
+            design,
+            size,
+            preset.layout_rules["background_style"],
+            preset.layout_rules,
+            preset.text_rules,
+            product=product,
+            logo_bytes=logo_bytes,
+        )
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        print(f"[Render] Failed to composite poster: {str(e)}")
+        return jsonify({"error": f"Could not render poster: {str(e)}"}), 400
+
+    data, mimetype = encode_poster(poster, fmt)
+    response = send_file(BytesIO(data), mimetype=mimetype)
+    response.vary.add("Accept")
+    return response
+
+
+@bp.route("/render/renditions", methods=["POST"])
+def render_renditions():
+    """
+    Render one prompt/preset in several ratios at once.
+
+    Form fields: `prompt`, `retail_preset`, `ratios` (comma-separated, default
+    all), `product`/`logo` files as for /render, `format`, and `output`
+    (`zip`, the default, or `ndjson` to stream each rendition as it finishes).
+    Shared inputs are decoded once; ratios render in parallel on a process pool.
+    """
+    prompt = request.form.get("prompt", "")
+    retail_preset = request.form.get("retail_preset", "tesco_minimal")
+    ratios = [r.strip() for r in request.form.get("ratios", ",".join(RATIOS)).split(",") if r.strip()]
+    unknown = [r for r in ratios if r not in RATIOS]
+    if unknown or not ratios:
+        return jsonify({"error": f"unknown ratios: {', '.join(unknown) or '(none)'}",
+                        "supported": list(RATIOS)}), 400
+
+    try:
+        product_bytes, logo_bytes = _render_uploads()
+    except BackgroundRemovalError as e:
+        return jsonify({"error": str(e)}), 500
+    try:
+        fmt = _render_format()
+    except UnsupportedFormat as e:
+        return jsonify({"error": str(e)}), 400
+    preset = get_retail_preset(retail_preset)
+
+    # Decode the product once, no larger than the biggest slot it has to fill
+    product = None
+    if product_bytes:
+        boxes = [product_box(RATIOS[r], preset.layout_rules) for r in ratios]
+        try:
+            product = decode_product(product_bytes, (max(b[0] for b in boxes), max(b[1] for b in boxes)))
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            return jsonify({"error": f"Could not read product image: {str(e)}"}), 400
+
+    tasks = []
+    for ratio in ratios:
+        design, _ = build_design(prompt, ratio, retail_preset, with_texture=False)
+        tasks.append({
+            "design": design,
+            "size": RATIOS[ratio],
+            "background_style": preset.layout_rules["background_style"],
+            # Plain dicts: the compiled read-only views don't pickle
+            "layout_rules": dict(preset.layout_rules),
+            "text_rules": dict(preset.text_rules),
+            "product": product,
+            "logo": logo_bytes,
+            "format": fmt,
+        })
+
+    pool = rendition_pool()
+    futures = [pool.submit(render_rendition, task) for task in tasks]
+    extension = PROFILES[fmt].extension
+
+    def filename(ratio: str) -> str:
+        return f"poster_{ratio.replace(':', 'x')}.{extension}"
+
+    if request.form.get("output", "zip") == "ndjson":
+        def stream():
+            for future in as_completed(futures):
+                try:
+                    ratio, data, mimetype = future.result()
+                except Exception as e:
+                    yield _ndjson({"status": "error", "error": str(e)})
+                    continue
+                b64_image = base64.b64encode(data).decode("utf-8")
+                yield _ndjson({"status": "done", "ratio": ratio, "filename": filename(ratio),
+                               "image": f"data:{mimetype};base64,{b64_image}"})
+        return Response(stream_with_context(stream()), mimetype="application/x-ndjson")
+
+    archive = tempfile.SpooledTemporaryFile(max_size=32 * 1024 * 1024)
+    with zipfile.ZipFile(archive, "w", compression=zipfile.ZIP_STORED) as zf:
+        for future in as_completed(futures):
+            try:
+                ratio, data, _ = future.result()
+            except Exception as e:
+                print(f"[Render] Rendition failed: {str(e)}")
+                return jsonify({"error": f"Rendition failed: {str(e)}"}), 500
+            zf.writestr(filename(ratio), data)
+    archive.seek(0)
+    return send_file(archive, mimetype="application/zip", as_attachment=True,
+                     download_name=f"{retail_preset}_renditions.zip")
 
 
 def generate_retail_headline(user_prompt: str, preset: RetailPreset) -> str:
@@ -423,37 +1209,111 @@ def generate_retail_headline(user_prompt: str, preset: RetailPreset) -> str:
 
 def generate_retail_subhead(preset: RetailPreset) -> str:
     """Generate retail-appropriate subhead based on preset"""
-    subheads = {
-        "tesco_minimal": "Available Now",
-        "tesco_festive": "Limited Time Offer",
-        "tesco_value": "Great Value",
-        "tesco_premium": "Premium Quality"
-    }
-    return subheads.get(preset.name.lower().replace(" ", "_"), "Available Now")
+    return preset.subhead
 
 
 def generate_retail_cta(preset: RetailPreset) -> str:
     """Generate retail-appropriate CTA text"""
-    ctas = {
-        "minimal_button": "Shop Now",
-        "festive_button": "Shop Today",
-        "value_button": "Great Deal",
-        "premium_button": "Discover More"
-    }
-    return ctas.get(preset.text_rules["cta_style"], "Shop Now")
+    return preset.cta_text
+
+
+@bp.route("/texture/<digest>", methods=["GET"])
+def serve_texture(digest):
+    """
+    Serve an encoded background by content hash with immutable caching.
+
+    A texture this worker has not rendered is rendered from the preset,
+    ratio and profile in the query string, if they still produce `digest`.
+    """
+    texture = TEXTURES.lookup(digest) or _render_requested_texture(digest)
+    if texture is None:
+        return jsonify({"error": "texture not found"}), 404
 
+    response = send_file(
+        BytesIO(texture.data),
+        mimetype=texture.mimetype,
+        etag=texture.digest,
+        conditional=True,
+        max_age=TEXTURE_MAX_AGE,
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def _render_requested_texture(digest: str) -> Optional[Texture]:
+    size = RATIOS.get(request.args.get("ratio", ""))
+    profile = PROFILES.get(request.args.get("profile", ""))
+    if size is None or profile is None or "preset" not in request.args:
+        return None
+    # Only preset backgrounds can be rendered this way, so the texture store stays bounded
+    preset = get_retail_preset(request.args["preset"])
+    texture = TEXTURES.get(preset.layout_rules["background_style"], preset.color_palette, size, profile)
+    # A preset edited since the link was made renders differently
+    return texture if texture.digest == digest else None
 
-@app.route("/retail-presets", methods=["GET"])
+
+@bp.route("/retail-presets", methods=["GET"])
 def get_retail_presets():
-    """Get available retail style presets"""
-    presets_info = {}
-    for key, preset in RETAIL_PRESETS.items():
-        presets_info[key] = {
-            "name": preset.name,
-            "color_palette": preset.color_palette,
-            "explanation": preset.explanation
-        }
-    return jsonify(presets_info)
+    """Get available retail style presets (a prebuilt body, revalidated by ETag)"""
+    snapshot = RETAIL_PRESETS.snapshot()
+    response = Response(snapshot.listing, mimetype="application/json")
+    response.set_etag(snapshot.etag)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def warm_up(start_pools: bool = True):
+    """
+    Pre-render every preset background and load the poster fonts before taking traffic.
+
+    With `start_pools` the rendition processes are forked too, once the
+    warm-up threads have finished. serve.py passes False and starts them in
+    each worker after it forks instead.
+    """
+    started = time.perf_counter()
+    jobs = [(preset.layout_rules["background_style"], preset.color_palette, size)
+            for preset in RETAIL_PRESETS.values() for size in RATIOS.values()]
+    # A private pool: the shared ones must not exist yet when serve.py forks workers
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as pool:
+        list(pool.map(lambda job: TEXTURES.get(*job), jobs))
+    warm_fonts(RATIOS.values())
+    Image.init()
+    print(f"[STARTUP] Warmed {len(jobs)} preset textures and poster fonts in {time.perf_counter() - started:.2f}s")
+    if start_pools:
+        start_worker_pools()
+
+
+def start_worker_pools(rendition_workers: int = RENDITION_WORKERS):
+    """Fork the rendition processes; call before this process starts any threads"""
+    start_rendition_pool(rendition_workers)
+    print(f"[STARTUP] Started {rendition_workers} rendition process(es) in pid {os.getpid()}")
+
+
+def shutdown(grace: float):
+    """Let accepted background jobs finish (up to `grace` seconds), then stop the worker pools"""
+    if not JOBS.drain(grace):
+        print(f"[SHUTDOWN] Abandoning unfinished jobs after {grace:g}s")
+    shutdown_batch_pool()
+    shutdown_rendition_pool()
+    RECORDER.close()
+
+
+def create_app(warm: bool = False, start_pools: bool = True) -> Flask:
+    """Build the Flask app; `warm` pre-renders caches (and with `start_pools` forks the rendition pool) first"""
+    flask_app = Flask(__name__)
+    flask_app.request_class = UploadRequest
+    flask_app.config["MAX_CONTENT_LENGTH"] = UPLOAD_MAX_BYTES
+    CORS(flask_app, origins=["http://localhost:8002", "http://127.0.0.1:8002"])
+    flask_app.register_blueprint(bp)
+    if warm:
+        warm_up(start_pools)
+        record_startup("warm")
+    return flask_app
+
+
+# Module-level app for `python app.py`, the benchmarks and `flask run`
+app = create_app()
 
 
 if __name__ == "__main__":
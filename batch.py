@@ -0,0 +1,132 @@
+"""
+Concurrent batch execution with bounded memory.
+
+Batch items are pulled lazily from an iterator and run on a shared thread
+pool with at most `window` items in flight per batch, and results are yielded
+in completion order. However large the batch, only the in-flight inputs and
+outputs are held in memory at once.
+"""
+import os
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import IO, Any, Callable, Iterable, Iterator, Tuple
+
+from uploads import UPLOAD_MAX_BATCH_BYTES, UPLOAD_MAX_BYTES
+
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", str(min(8, (os.cpu_count() or 1) + 4))))
+BATCH_WINDOW = int(os.getenv("BATCH_WINDOW", str(BATCH_WORKERS * 2)))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+BATCH_SPOOL_MEMORY = 1024 * 1024
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".bmp", ".gif", ".tif", ".tiff")
+
+_POOL = None
+
+
+def batch_pool() -> ThreadPoolExecutor:
+    """The process-wide batch pool, created on first use"""
+    global _POOL
+    if _POOL is None:
+        _POOL = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix="batch")
+    return _POOL
+
+
+def shutdown_batch_pool():
+    """Stop the batch pool, if it was started, once in-flight items finish"""
+    global _POOL
+    if _POOL is not None:
+        _POOL.shutdown(wait=True, cancel_futures=True)
+        _POOL = None
+
+
+def run_streaming(items: Iterable[Tuple[Any, Callable[[], Any]]],
+                  window: int = BATCH_WINDOW) -> Iterator[Tuple[Any, Any, Exception]]:
+    """
+    Run `(meta, thunk)` pairs concurrently and yield `(meta, result, error)`
+    as each one finishes. Exactly one of `result` and `error` is set.
+    """
+    pool = batch_pool()
+    pending = {}
+    source = iter(items)
+    exhausted = False
+
+    try:
+        while pending or not exhausted:
+            while not exhausted and len(pending) < max(1, window):
+                try:
+                    meta, thunk = next(source)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending[pool.submit(thunk)] = meta
+
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                meta = pending.pop(future)
+                error = future.exception()
+                yield meta, None if error else future.result(), error
+    finally:
+        # Client went away: don't start work nobody will read
+        for future in pending:
+            future.cancel()
+
+
+def spool_upload(upload) -> IO[bytes]:
+    """Copy an uploaded file into a temp file we own (in memory while small)"""
+    spool = tempfile.SpooledTemporaryFile(max_size=BATCH_SPOOL_MEMORY)
+    shutil.copyfileobj(upload.stream, spool)
+    spool.seek(0)
+    return spool
+
+
+class ArchiveTooLarge(ValueError):
+    """A zip entry, or the archive as a whole, inflates past the upload limits"""
+
+
+def _refuse(error: Exception) -> Callable[[], bytes]:
+    def read() -> bytes:
+        raise error
+    return read
+
+
+def zip_images(stream: IO[bytes], max_entry_bytes: int = UPLOAD_MAX_BYTES,
+               max_total_bytes: int = UPLOAD_MAX_BATCH_BYTES) -> Iterator[Tuple[str, Callable[[], bytes]]]:
+    """
+    Yield `(name, reader)` for each image in a zip archive, reading lazily.
+
+    Entries whose uncompressed size exceeds `max_entry_bytes` get a reader
+    that raises ArchiveTooLarge, and the archive stops once the images in it
+    add up to more than `max_total_bytes`, so a small zip can't inflate to
+    gigabytes in memory. Sizes come from the archive's directory; reads never
+    return more than the declared size.
+    """
+    archive = zipfile.ZipFile(stream)
+    total = 0
+    for info in archive.infolist():
+        if info.is_dir() or not info.filename.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        if os.path.basename(info.filename).startswith("."):
+            continue
+        if info.file_size > max_entry_bytes:
+            yield info.filename, _refuse(ArchiveTooLarge(
+                f"{info.filename} inflates to {info.file_size} bytes, over the {max_entry_bytes} byte limit"))
+            continue
+        total += info.file_size
+        if total > max_total_bytes:
+            yield info.filename, _refuse(ArchiveTooLarge(
+                f"archive inflates past the {max_total_bytes} byte batch limit; remaining entries skipped"))
+            return
+        yield info.filename, (lambda info=info: _read_entry(archive, info))
+
+
+def _read_entry(archive: zipfile.ZipFile, info: zipfile.ZipInfo) -> bytes:
+    with archive.open(info) as entry:
+        # zipfile stops at the declared size; the extra byte catches a header that lies anyway
+        data = entry.read(info.file_size + 1)
+    if len(data) > info.file_size:
+        raise ArchiveTooLarge(f"{info.filename} is larger than its declared size")
+    return data
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Encode time versus output size for every encoder profile.
+
+Inputs are the images the API actually encodes: each preset background style
+at one ratio, a local cutout of a synthetic product photo, and a
+rendered poster. Profiles that cannot apply to an input (JPEG for a cutout)
+are skipped. Lossless profiles are checked to round-trip exactly (colour under
+fully transparent pixels is ignored, as WebP discards it).
+
+    python benchmarks/bench_encoders.py [--rounds 3] [--ratio 9:16]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import app as server  # noqa: E402
+from compositor import decode_product, render_poster  # noqa: E402
+from encoders import PROFILES, encode  # noqa: E402
+from textures import render_background  # noqa: E402
+
+
+def product_jpeg(size=(2000, 1500)) -> bytes:
+    image = Image.new("RGB", size, (248, 248, 248))
+    draw = ImageDraw.Draw(image)
+    w, h = size
+    draw.ellipse([w // 5, h // 6, w * 4 // 5, h * 5 // 6], fill=(190, 40, 50))
+    draw.rectangle([w // 3, h // 3, w * 2 // 3, h // 2], fill=(30, 90, 160))
+    # A little sensor noise, so the cutout compresses like a photo rather than a drawing
+    arr = np.asarray(image).astype(np.int16)
+    arr += np.random.default_rng(0).integers(-6, 7, arr.shape, dtype=np.int16)
+    buf = io.BytesIO()
+    Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8)).save(buf, format="JPEG", quality=92)
+    return buf.getvalue()
+
+
+def inputs(ratio: str) -> List[Tuple[str, Image.Image]]:
+    size = server.RATIOS[ratio]
+    images = []
+    seen = set()
+    for preset in server.RETAIL_PRESETS.values():
+        style = preset.layout_rules["background_style"]
+        if style not in seen:
+            seen.add(style)
+            array = render_background(style, preset.color_palette, size)
+            images.append((f"texture/{style}", Image.fromarray(array, "RGBA")))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        cutout = server.fallback_cutout(product_jpeg())
+    images.append(("cutout", Image.open(io.BytesIO(cutout)).convert("RGBA")))
+
+    preset = server.get_retail_preset("tesco_festive")
+    design, _ = server.build_design("Fresh strawberries", ratio, "tesco_festive", with_texture=False)
+    poster = render_poster(design, size, preset.layout_rules["background_style"], preset.layout_rules,
+                           preset.text_rules, product=decode_product(cutout))
+    images.append(("poster", poster))
+    return images
+
+
+def lossless(name: str) -> bool:
+    params = PROFILES[name].params
+    return PROFILES[name].format == "PNG" or bool(params.get("lossless"))
+
+
+def visible(image: Image.Image) -> np.ndarray:
+    rgba = np.array(image.convert("RGBA"))
+    rgba[rgba[:, :, 3] == 0] = 0
+    return rgba
+
+
+def measure(image: Image.Image, name: str, rounds: int) -> Dict:
+    profile = PROFILES[name]
+    best = float("inf")
+    for _ in range(rounds):
+        started = time.perf_counter()
+        data, _ = encode(image, profile)
+        best = min(best, time.perf_counter() - started)
+    exact = None
+    if lossless(name):
+        decoded = visible(Image.open(io.BytesIO(data)))
+        exact = bool(np.array_equal(decoded, visible(image)))
+    return {"ms": best * 1000, "bytes": len(data), "exact": exact}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--ratio", default="9:16", choices=list(server.RATIOS))
+    args = parser.parse_args()
+
+    for label, image in inputs(args.ratio):
+        print(f"\n{label} ({image.size[0]}x{image.size[1]})")
+        print(f"  {'profile':<14} {'ms':>8} {'KiB':>10} {'lossless':>9}")
+        for name, profile in PROFILES.items():
+            if not profile.alpha and label == "cutout":
+                continue
+            result = measure(image, name, args.rounds)
+            exact = "-" if result["exact"] is None else ("yes" if result["exact"] else "NO")
+            print(f"  {name:<14} {result['ms']:>8.1f} {result['bytes'] / 1024:>10.1f} {exact:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Exercise the pooled Hugging Face client against the local stand-in server.
+
+Runs a few scenarios (healthy, rate limited, flaky, down) at a fixed request
+concurrency and reports throughput, latency, retries seen upstream, the
+adaptive concurrency limit and the circuit-breaker state:
+
+    python benchmarks/bench_hf_client.py [--requests 60] [--concurrency 12]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_hf import FakeHFConfig, start_fake_hf  # noqa: E402
+from hf_client import HFInferenceClient, UpstreamUnavailable  # noqa: E402
+
+SCENARIOS = {
+    "healthy": dict(latency=0.05),
+    "rate_limited": dict(latency=0.05, p429=0.3, retry_after=0.1),
+    "flaky": dict(latency=0.05, jitter=0.03, p503=0.2),
+    "down": dict(latency=0.01, p503=1.0),
+}
+
+
+def run_scenario(name: str, total: int, concurrency: int, payload: bytes) -> bool:
+    config = FakeHFConfig(**SCENARIOS[name])
+    server, base_url = start_fake_hf(config)
+    client = HFInferenceClient("fake/model", "dummy", base_url=base_url, timeout=5,
+                               rate_per_sec=200, burst=20, max_concurrency=8,
+                               target_latency=1.0, breaker_failures=5, breaker_cooldown=60,
+                               backoff_base=0.02, backoff_cap=0.2)
+    outcomes = {}
+    latencies = []
+
+    def one(_):
+        started = time.perf_counter()
+        try:
+            outcome = str(client.remove_background(payload).status_code)
+        except UpstreamUnavailable:
+            outcome = "skipped"
+        except Exception as e:
+            outcome = type(e).__name__
+        latencies.append(time.perf_counter() - started)
+        return outcome
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        for outcome in pool.map(one, range(total)):
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+
+    state = client.snapshot()
+    p50 = statistics.median(latencies) * 1000
+    print(f"{name:>13} {total / elapsed:7.1f} req/s  p50 {p50:6.1f} ms  upstream {config.counts['requests']:4d} "
+          f"peak conc {config.counts['max_concurrency']:2d}  limit {state['concurrency_limit']:2d}  "
+          f"breaker {state['breaker']:>9}  {outcomes}")
+
+    if name == "down":
+        # The breaker must stop hammering a dead upstream
+        return state["breaker"] == "open" and config.counts["requests"] < total
+    return config.counts["max_concurrency"] <= 8
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=60)
+    parser.add_argument("--concurrency", type=int, default=12)
+    args = parser.parse_args()
+
+    buf = BytesIO()
+    Image.new("RGB", (64, 64), "white").save(buf, format="PNG")
+    ok = all([run_scenario(name, args.requests, args.concurrency, buf.getvalue()) for name in SCENARIOS])
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
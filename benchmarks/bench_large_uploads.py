@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Peak memory and latency of the local cutout for large uploads.
+
+For each input size a synthetic product photo is written as a JPEG, then the
+legacy path (full decode + full-resolution mask) and the current
+`fallback_cutout` path each run in a fresh subprocess so that peak RSS
+(ru_maxrss) belongs to that one cutout alone.
+
+    python benchmarks/bench_large_uploads.py [--sizes 2,12,24,48] [--rounds 3]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from PIL import Image, ImageDraw
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child; prints {"ms": ..., "rss_mb": ..., "size": ...}
+CHILD = r"""
+import json, resource, sys, time
+from io import BytesIO
+sys.path.insert(0, ROOT)
+import numpy as np
+from PIL import Image, ImageFilter
+from matte import compute_alpha
+from app import fallback_cutout
+
+data = open(PATH, "rb").read()
+baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+start = time.perf_counter()
+if MODE == "legacy":
+    image = Image.open(BytesIO(data)).convert("RGBA")
+    arr = np.array(image)
+    arr[:, :, 3] = compute_alpha(arr)
+    out = Image.fromarray(arr, "RGBA").filter(ImageFilter.SMOOTH_MORE)
+    buf = BytesIO()
+    out.save(buf, format="PNG")
+    size = out.size
+else:
+    png = fallback_cutout(data)
+    size = Image.open(BytesIO(png)).size
+elapsed = time.perf_counter() - start
+
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"ms": elapsed * 1000, "rss_mb": peak / 1024, "delta_mb": (peak - baseline) / 1024,
+                  "size": size}))
+"""
+
+
+def make_jpeg(megapixels: float, path: str):
+    width = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    image = Image.new("RGB", (width, height), (250, 250, 250))
+    draw = ImageDraw.Draw(image)
+    draw.ellipse([width // 5, height // 6, width * 4 // 5, height * 5 // 6], fill=(180, 40, 50))
+    draw.rectangle([width // 3, height // 3, width * 2 // 3, height // 2], fill=(30, 90, 160))
+    image.save(path, format="JPEG", quality=90)
+
+
+def run_child(mode: str, path: str) -> dict:
+    code = f"ROOT = {ROOT!r}\nPATH = {path!r}\nMODE = {mode!r}\n" + CHILD
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="2,12,24,48", help="comma-separated megapixel counts")
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'input':>7} {'path':>7} {'output':>11} {'ms':>8} {'peak MB':>8} {'cutout MB':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for megapixels in (float(s) for s in args.sizes.split(",")):
+            path = os.path.join(tmp, f"{megapixels:g}mp.jpg")
+            make_jpeg(megapixels, path)
+            for mode in ("legacy", "capped"):
+                runs = [run_child(mode, path) for _ in range(args.rounds)]
+                best = min(runs, key=lambda r: r["ms"])
+                peak = max(r["rss_mb"] for r in runs)
+                delta = max(r["delta_mb"] for r in runs)
+                size = "x".join(str(v) for v in best["size"])
+                print(f"{megapixels:>5g}MP {mode:>7} {size:>11} {best['ms']:>8.0f} {peak:>8.0f} {delta:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark the fallback matte engine against the original per-pixel loop.
+
+Usage:
+    python benchmarks/bench_matte.py [--sizes 1080p,4k] [--kernel 3] [--legacy-rows 64]
+
+The original loop is linear in the number of rows, so for large images it is
+timed on a horizontal band of `--legacy-rows` rows and extrapolated. Pass
+`--legacy-rows 0` to time it on the full image (this takes minutes at 4K).
+Masks are compared on synthetic packshot fixtures at every size.
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from matte import compute_alpha  # noqa: E402
+
+SIZES = {
+    "vga": (640, 480),
+    "1080p": (1920, 1080),
+    "4k": (3840, 2160),
+    "12mp": (4032, 3024),
+}
+
+
+def legacy_alpha(data: np.ndarray, threshold: int = 240) -> np.ndarray:
+    """The fallback matte as originally shipped in app.py"""
+    r, g, b = data[:, :, 0], data[:, :, 1], data[:, :, 2]
+    gray = 0.299 * r + 0.587 * g + 0.114 * b
+    mask = gray > threshold
+    h, w = mask.shape
+    dilated = np.zeros_like(mask)
+    for i in range(1, h - 1):
+        for j in range(1, w - 1):
+            if mask[i, j] or np.any(mask[i - 1:i + 2, j - 1:j + 2]):
+                dilated[i, j] = True
+    return np.where(dilated, 0, 255).astype(np.uint8)
+
+
+def make_fixture(width: int, height: int, seed: int = 0) -> np.ndarray:
+    """Synthetic packshot: noisy white backdrop, a darker product and a white label"""
+    rng = np.random.default_rng(seed)
+    data = np.empty((height, width, 4), dtype=np.uint8)
+    data[:, :, :3] = rng.integers(225, 256, size=(height, width, 3), dtype=np.uint8)
+    data[:, :, 3] = 255
+    yy, xx = np.ogrid[:height, :width]
+    product = ((yy - height / 2) / (height * 0.35)) ** 2 + ((xx - width / 2) / (width * 0.2)) ** 2 < 1
+    data[product, :3] = rng.integers(20, 200, size=(int(product.sum()), 3), dtype=np.uint8)
+    label = (abs(yy - height / 2) < height * 0.05) & (abs(xx - width / 2) < width * 0.08)
+    data[label, :3] = 250
+    return data
+
+
+def measure(fn, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default="vga,1080p,4k")
+    parser.add_argument("--kernel", type=int, default=3)
+    parser.add_argument("--legacy-rows", type=int, default=64)
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'size':>7} {'new ms':>9} {'new MiB':>8} {'old ms':>11} {'old MiB':>8} {'speedup':>8} match")
+    for label in args.sizes.split(","):
+        width, height = SIZES[label]
+        data = make_fixture(width, height)
+
+        alpha, new_time, new_peak = measure(compute_alpha, data, 240, args.kernel)
+
+        rows = height if args.legacy_rows <= 0 else min(height, args.legacy_rows + 2)
+        band = data[:rows]
+        legacy, old_band_time, old_peak = measure(legacy_alpha, band)
+        old_time = old_band_time * (height - 2) / max(1, rows - 2)
+
+        if args.kernel == 3:
+            # Compare the band interior; its last row lacks the neighbour below
+            match = np.array_equal(alpha[1:rows - 1], legacy[1:rows - 1])
+            # The full-size, full-image check is cheap for the small fixture
+            small = make_fixture(160, 120, seed=1)
+            match = match and np.array_equal(compute_alpha(small), legacy_alpha(small))
+        else:
+            match = None
+        failed = failed or match is False
+
+        print(f"{label:>7} {new_time * 1000:9.1f} {new_peak / 2**20:8.1f} "
+              f"{old_time * 1000:11.1f} {old_peak / 2**20 * height / rows:8.1f} "
+              f"{old_time / new_time:7.0f}x {match}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Perceptual-hash index: lookup latency at scale, match quality and reuse cost.
+
+Fills a NearDuplicateIndex with `--entries` fingerprints (random, plus one
+synthetic packshot) and times lookups that hit and miss. Then checks which
+variants of the packshot are found (re-encoded, resized, PNG, brightened)
+and that different products and crops are not, and compares cutting out a
+resized copy from scratch with reusing the original's mask.
+
+    python benchmarks/bench_near_duplicates.py [--entries 100000] [--queries 2000]
+"""
+import argparse
+import contextlib
+import hashlib
+import io
+import os
+import sys
+import time
+from typing import Callable, List
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageEnhance
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import app as server  # noqa: E402
+from near_duplicates import Fingerprint, NearDuplicateIndex, fingerprint  # noqa: E402
+from result_cache import cache_key  # noqa: E402
+
+
+def packshot(size=(2000, 1500), body=(190, 40, 50), label=(30, 90, 160), shape="ellipse") -> Image.Image:
+    """A bottle-ish product with a label, a highlight and a shadow, on a light backdrop"""
+    image = Image.new("RGB", size, (248, 248, 248))
+    draw = ImageDraw.Draw(image)
+    w, h = size
+    (draw.ellipse if shape == "ellipse" else draw.rectangle)([w // 4, h // 8, w * 3 // 4, h * 7 // 8], fill=body)
+    draw.rectangle([w * 3 // 10, h * 2 // 5, w * 3 // 5, h * 3 // 5], fill=label)
+    draw.ellipse([w * 2 // 5, h // 5, w // 2, h * 3 // 10], fill=(255, 255, 255))
+    draw.polygon([(w // 4, h * 7 // 8), (w * 3 // 4, h * 7 // 8), (w * 17 // 20, h * 19 // 20),
+                  (w // 6, h * 19 // 20)], fill=(200, 200, 200))
+    arr = np.asarray(image).astype(np.int16)
+    arr += np.random.default_rng(0).integers(-6, 7, arr.shape, dtype=np.int16)
+    return Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8))
+
+
+def encoded(image: Image.Image, fmt: str = "JPEG", **params) -> bytes:
+    buf = io.BytesIO()
+    image.save(buf, format=fmt, **params)
+    return buf.getvalue()
+
+
+def timed(fn: Callable, rounds: int) -> List[float]:
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return sorted(samples)
+
+
+def pct(samples: List[float], fraction: float) -> float:
+    return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    original = packshot()
+    original_jpeg = encoded(original, quality=92)
+    target = fingerprint(original_jpeg)
+
+    index = NearDuplicateIndex(capacity=args.entries)
+    rng = np.random.default_rng(1)
+    hashes = rng.integers(0, 2 ** 63, size=(args.entries - 1, 2), dtype=np.int64)
+    started = time.perf_counter()
+    for dhash, phash in hashes:
+        index.add(Fingerprint(int(dhash), int(phash), 4 / 3), "0" * 64, (2000, 1500), "bench")
+    index.add(target, hashlib.sha256(b"original").hexdigest(), original.size, "bench")
+    columns = (index._dhash, index._phash, index._aspect, index._size, index._keys, index._backend)
+    print(f"Indexed {args.entries} fingerprints in {time.perf_counter() - started:.2f}s "
+          f"(~{sum(column.nbytes for column in columns) / 2 ** 20:.1f} MiB)")
+
+    miss = Fingerprint(target.dhash ^ 0xFFFF_FFFF, target.phash ^ 0xFFFF_FFFF, target.aspect)
+    print(f"\n{'lookup':<8} {'p50 ms':>8} {'p99 ms':>8} {'lookups/s':>10}")
+    for label, fp in (("hit", target), ("miss", miss)):
+        samples = timed(lambda: index.lookup(fp, "bench"), args.queries)
+        print(f"{label:<8} {pct(samples, 0.5):>8.3f} {pct(samples, 0.99):>8.3f} {1000 / np.mean(samples):>10.0f}")
+
+    samples = timed(lambda: fingerprint(original_jpeg), 20)
+    print(f"\nfingerprint of a {original.width}x{original.height} JPEG: p50 {pct(samples, 0.5):.1f} ms")
+
+    variants = {
+        "re-encoded q70": encoded(original, quality=70),
+        "resized 50%": encoded(original.resize((1000, 750), Image.LANCZOS), quality=85),
+        "resized 25% PNG": encoded(original.resize((500, 375), Image.LANCZOS), "PNG"),
+        "brightened 10%": encoded(ImageEnhance.Brightness(original).enhance(1.1), quality=90),
+        "cropped 10%": encoded(original.crop((200, 150, 2000, 1500)), quality=90),
+        "other colours": encoded(packshot(body=(40, 150, 60), label=(250, 200, 0)), quality=92),
+        "other shape": encoded(packshot(shape="box"), quality=92),
+    }
+    print(f"\n{'variant':<18} {'dhash':>6} {'phash':>6} {'match':>6}")
+    for label, data in variants.items():
+        fp = fingerprint(data)
+        d = bin(fp.dhash ^ target.dhash).count("1")
+        p = bin(fp.phash ^ target.phash).count("1")
+        match = "yes" if index.lookup(fp, "bench") else "no"
+        print(f"{label:<18} {d:>6} {p:>6} {match:>6}")
+
+    # Reuse versus a fresh local cutout, through the server's own helpers
+    with contextlib.redirect_stdout(io.StringIO()):
+        cutout = server.fallback_cutout(original_jpeg)
+        key = cache_key(hashlib.sha256(original_jpeg).hexdigest(), server.FALLBACK_BACKEND)
+        server.RESULT_CACHE.put(key, cutout)
+        server.index_cutout(target, key, cutout, server.FALLBACK_BACKEND)
+        resized = variants["resized 50%"]
+        fp = fingerprint(resized)
+        fresh = timed(lambda: server.fallback_cutout(resized), 5)
+        resized_key = cache_key(hashlib.sha256(resized).hexdigest(), server.FALLBACK_BACKEND)
+        reuse = lambda: server.reuse_near_duplicate(resized, fp, server.FALLBACK_BACKEND, resized_key)  # noqa: E731
+        first = timed(reuse, 1)
+        reused = timed(reuse, 5)
+    print(f"\nresized copy: fresh local cutout p50 {pct(fresh, 0.5):.1f} ms; reused mask {first[0]:.1f} ms the "
+          f"first time (mask extracted), p50 {pct(reused, 0.5):.1f} ms after (Hugging Face calls take seconds)")
+
+
+if __name__ == "__main__":
+    main()
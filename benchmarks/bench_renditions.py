@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Compare multi-ratio fan-out against seven sequential round trips.
+
+The sequential baseline is what clients do today: /generate followed by
+/render once per ratio. The fan-out is a single /render/renditions call.
+Both run in-process through Flask's test client with the same product image.
+
+    python benchmarks/bench_renditions.py [--rounds 3] [--preset tesco_festive] [--format png]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import zipfile
+from io import BytesIO
+
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as server  # noqa: E402
+from compositor import RENDITION_WORKERS  # noqa: E402
+
+
+def product_png(size=(1600, 2000)) -> bytes:
+    image = Image.new("RGBA", size, (0, 0, 0, 0))
+    ImageDraw.Draw(image).ellipse([100, 100, size[0] - 100, size[1] - 100], fill=(200, 40, 40, 255))
+    buf = BytesIO()
+    image.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def sequential(client, product: bytes, preset: str, fmt: str) -> int:
+    total = 0
+    for ratio in server.RATIOS:
+        design = client.post("/generate", data={"prompt": "Fresh strawberries", "ratio": ratio,
+                                                "retail_preset": preset}).get_json()
+        response = client.post("/render", data={"design": json.dumps(design), "format": fmt,
+                                                "product": (BytesIO(product), "product.png")})
+        assert response.status_code == 200, response.data[:200]
+        total += len(response.data)
+    return total
+
+
+def fan_out(client, product: bytes, preset: str, fmt: str) -> int:
+    response = client.post("/render/renditions", data={"prompt": "Fresh strawberries", "retail_preset": preset,
+                                                       "format": fmt, "product": (BytesIO(product), "product.png")})
+    assert response.status_code == 200, response.data[:200]
+    with zipfile.ZipFile(BytesIO(response.data)) as zf:
+        assert len(zf.namelist()) == len(server.RATIOS)
+        return sum(info.file_size for info in zf.infolist())
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--preset", default="tesco_festive")
+    parser.add_argument("--format", default="png")
+    args = parser.parse_args()
+
+    client = server.app.test_client()
+    # Distinct product bytes per round so caches don't flatter either side
+    products = [product_png((1600 + i, 2000)) for i in range(args.rounds + 1)]
+
+    # Warm up the process pool and texture cache
+    fan_out(client, products[-1], args.preset, args.format)
+    sequential(client, products[-1], args.preset, args.format)
+
+    results = {}
+    for name, fn in (("sequential x7", sequential), ("fan-out", fan_out)):
+        timings = []
+        for product in products[:args.rounds]:
+            started = time.perf_counter()
+            fn(client, product, args.preset, args.format)
+            timings.append(time.perf_counter() - started)
+        results[name] = statistics.median(timings)
+        print(f"{name:>14}: {results[name] * 1000:8.1f} ms per campaign "
+              f"({len(server.RATIOS) / results[name]:.1f} renditions/s)")
+
+    print(f"{'speedup':>14}: {results['sequential x7'] / results['fan-out']:.2f}x "
+          f"with {RENDITION_WORKERS} render workers")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Hugging Face inference API.
+
+Serves `POST /models/<model>` and `GET /status/<model>` with configurable
+latency and a configurable share of 429 / 503 responses, so the client and the
+/remove-bg path can be exercised offline:
+
+    python benchmarks/fake_hf.py --port 8765 --latency 0.2 --p429 0.1 --p503 0.05
+    HF_API_URL=http://127.0.0.1:8765 HUGGINGFACE_TOKEN=dummy python app.py
+
+Successful responses echo a transparent PNG the size of the upload.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+from PIL import Image
+
+
+class FakeHFConfig:
+    """Mutable behaviour knobs shared by all handler threads"""
+
+    def __init__(self, latency: float = 0.05, jitter: float = 0.0, p429: float = 0.0,
+                 p503: float = 0.0, retry_after: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.p429 = p429
+        self.p503 = p503
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {"requests": 0, "ok": 0, "429": 0, "503": 0, "max_concurrency": 0}
+        self.in_flight = 0
+
+    def roll(self) -> float:
+        with self.lock:
+            return self.rng.random()
+
+
+def _cutout(body: bytes) -> bytes:
+    try:
+        size = Image.open(BytesIO(body)).size
+    except Exception:
+        size = (1, 1)
+    buf = BytesIO()
+    Image.new("RGBA", size, (0, 0, 0, 0)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def make_handler(config: FakeHFConfig):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status: int, body: bytes, content_type: str, headers=None):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _error(self, status: int, message: str, headers=None):
+            self._send(status, json.dumps({"error": message}).encode(), "application/json", headers)
+
+        def do_GET(self):
+            if self.path.startswith("/status/"):
+                self._send(200, json.dumps({"loaded": True, "state": "Loaded"}).encode(), "application/json")
+            else:
+                self._error(404, "not found")
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", "0")))
+            if not self.path.startswith("/models/"):
+                self._error(404, "not found")
+                return
+
+            with config.lock:
+                config.counts["requests"] += 1
+                config.in_flight += 1
+                config.counts["max_concurrency"] = max(config.counts["max_concurrency"], config.in_flight)
+            try:
+                time.sleep(max(0.0, config.latency + config.jitter * (config.roll() * 2 - 1)))
+                roll = config.roll()
+                if roll < config.p429:
+                    self._count("429")
+                    headers = {"Retry-After": str(config.retry_after)} if config.retry_after else None
+                    self._error(429, "Rate limit reached", headers)
+                elif roll < config.p429 + config.p503:
+                    self._count("503")
+                    self._error(503, "Model is currently loading")
+                else:
+                    self._count("ok")
+                    self._send(200, _cutout(body), "image/png")
+            finally:
+                with config.lock:
+                    config.in_flight -= 1
+
+        def _count(self, key: str):
+            with config.lock:
+                config.counts[key] += 1
+
+    return Handler
+
+
+def start_fake_hf(config: FakeHFConfig, port: int = 0):
+    """Start the stand-in in a daemon thread; returns (server, base_url)"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Hugging Face inference API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--p429", type=float, default=0.0)
+    parser.add_argument("--p503", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=0.0)
+    args = parser.parse_args()
+
+    config = FakeHFConfig(args.latency, args.jitter, args.p429, args.p503, args.retry_after)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(config))
+    print(f"[Fake HF] Listening on http://127.0.0.1:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"[Fake HF] {config.counts}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Replay a recorded traffic log against a running server and report latency.
+
+Record production-shaped traffic first (REQUEST_RECORD=traffic.jsonl, see
+recorder.py), then drive it against any server:
+
+    python benchmarks/replay.py traffic.jsonl --target http://localhost:5000 \\
+        [--concurrency 16] [--speedup 4] [--corpus uploads/] [--out report.json]
+
+With `--speedup N` requests are sent open-loop at N times their recorded
+pace, whether or not earlier ones have finished (0 sends them as fast as the
+workers allow). `--concurrency` caps requests in flight; when it is the
+bottleneck, the time requests spent waiting to be sent is reported as lag.
+
+Uploaded bytes are not recorded. Each upload is read from `--corpus/<sha256>`
+when present, otherwise replaced by a synthetic image of the recorded
+dimensions derived from the hash, so repeated uploads stay identical (and hit
+the server's result cache) just as they did when recorded. Job ids don't
+survive a replay, so `/jobs/<...>` lookups are skipped unless --exclude says
+otherwise. Uploads the server refused unread (413, 503) are resent as a body
+of the recorded length.
+
+The report has per-endpoint throughput, p50/p95/p99 latency and error rate
+(non-2xx/3xx responses and transport failures).
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence
+
+import requests
+from PIL import Image, ImageDraw
+
+
+@dataclass
+class Result:
+    endpoint: str
+    status: int
+    latency: float
+    lag: float
+    error: Optional[str] = None
+
+    @property
+    def failed(self) -> bool:
+        return self.error is not None or self.status >= 400
+
+
+def load_records(paths: Sequence[str], include: str, exclude: Sequence[str], limit: int) -> List[Dict]:
+    records = []
+    for path in paths:
+        with open(path) as f:
+            for number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    print(f"[Replay] Skipping malformed line {number} of {path}")
+                    continue
+                endpoint = record.get("endpoint", "")
+                if include and include not in endpoint:
+                    continue
+                if any(pattern in endpoint for pattern in exclude):
+                    continue
+                if "path" in record and "method" in record:
+                    records.append(record)
+    records.sort(key=lambda record: record.get("ts", 0))
+    return records[:limit] if limit else records
+
+
+@lru_cache(maxsize=64)
+def synthetic_upload(sha256: str, width: int, height: int, content_type: str) -> bytes:
+    """A product-like image that is the same for the same recorded hash"""
+    seed = bytes.fromhex(sha256[:12].ljust(12, "0"))
+    background = (235 + seed[0] % 21,) * 3
+    image = Image.new("RGB", (width, height), background)
+    draw = ImageDraw.Draw(image)
+    draw.ellipse([width // 5, height // 6, width * 4 // 5, height * 5 // 6], fill=(seed[1], seed[2], seed[3]))
+    draw.rectangle([width // 3, height // 3, width * 2 // 3, height // 2], fill=(seed[4], seed[5], 160))
+    buf = io.BytesIO()
+    if "png" in content_type:
+        image.save(buf, format="PNG", compress_level=1)
+    else:
+        image.save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+def upload_bytes(meta: Dict, corpus: Optional[str]) -> bytes:
+    sha256 = meta.get("sha256") or hashlib.sha256(json.dumps(meta, sort_keys=True).encode()).hexdigest()
+    if corpus:
+        path = os.path.join(corpus, sha256)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                return f.read()
+    return synthetic_upload(sha256, int(meta.get("width") or 1200), int(meta.get("height") or 900),
+                            meta.get("content_type") or "image/jpeg")
+
+
+class Replayer:
+    """Sends recorded requests from a bounded worker pool, one HTTP session per worker"""
+
+    def __init__(self, target: str, concurrency: int, timeout: float, corpus: Optional[str]):
+        self.target = target.rstrip("/")
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.corpus = corpus
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def send(self, record: Dict, due: float) -> Result:
+        endpoint = record.get("endpoint", record["path"])
+        files = [(meta["field"], (meta.get("filename") or "upload", upload_bytes(meta, self.corpus),
+                                  meta.get("content_type") or "application/octet-stream"))
+                 for meta in record.get("uploads", []) if meta.get("field")]
+        data = record.get("params") or None
+        if "params" not in record and record.get("content_length"):
+            # Refused when recorded (413/503): resend an unread body of the same size
+            data = bytes(record["content_length"])
+        started = time.monotonic()
+        try:
+            response = self._session().request(
+                record["method"], self.target + record["path"],
+                data=data,
+                files=files or None,
+                json=record.get("json"),
+                timeout=self.timeout,
+            )
+            _ = response.content  # streamed NDJSON/SSE bodies count until the last byte
+            return Result(endpoint, response.status_code, time.monotonic() - started, max(0.0, started - due))
+        except requests.RequestException as e:
+            return Result(endpoint, 0, time.monotonic() - started, max(0.0, started - due), type(e).__name__)
+
+    def run(self, records: List[Dict], speedup: float) -> List[Result]:
+        first = records[0].get("ts", 0) if records else 0
+        started = time.monotonic()
+        futures = []
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for record in records:
+                due = started
+                if speedup > 0:
+                    due += (record.get("ts", first) - first) / speedup
+                    delay = due - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                futures.append(pool.submit(self.send, record, due))
+            return [future.result() for future in futures]
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    return samples[min(len(samples) - 1, int(round(fraction * (len(samples) - 1))))] if samples else 0.0
+
+
+def summarize(results: List[Result], wall: float) -> Dict[str, Dict]:
+    groups: Dict[str, List[Result]] = {}
+    for result in results:
+        groups.setdefault(result.endpoint, []).append(result)
+    groups["(all)"] = results
+
+    report = {}
+    for endpoint, group in groups.items():
+        latencies = sorted(r.latency * 1000 for r in group)
+        statuses: Dict[str, int] = {}
+        for r in group:
+            key = r.error or str(r.status)
+            statuses[key] = statuses.get(key, 0) + 1
+        failed = sum(r.failed for r in group)
+        report[endpoint] = {
+            "requests": len(group),
+            "throughput_rps": len(group) / wall if wall else 0.0,
+            "p50_ms": percentile(latencies, 0.50),
+            "p95_ms": percentile(latencies, 0.95),
+            "p99_ms": percentile(latencies, 0.99),
+            "max_ms": latencies[-1] if latencies else 0.0,
+            "error_rate": failed / len(group) if group else 0.0,
+            "max_lag_ms": max(r.lag for r in group) * 1000 if group else 0.0,
+            "statuses": statuses,
+        }
+    return report
+
+
+def print_report(report: Dict[str, Dict], wall: float):
+    print(f"\n{'endpoint':<28} {'reqs':>6} {'rps':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'errors':>7} {'lag ms':>8}")
+    for endpoint, row in sorted(report.items(), key=lambda item: (item[0] == "(all)", item[0])):
+        print(f"{endpoint:<28} {row['requests']:>6} {row['throughput_rps']:>7.1f} {row['p50_ms']:>8.1f} "
+              f"{row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['error_rate']:>7.1%} {row['max_lag_ms']:>8.0f}")
+    statuses = report.get("(all)", {}).get("statuses", {})
+    print(f"\n{wall:.1f}s wall, statuses: " + ", ".join(f"{k}={v}" for k, v in sorted(statuses.items())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("logs", nargs="+", help="JSONL files written with REQUEST_RECORD")
+    parser.add_argument("--target", default="http://localhost:5000")
+    parser.add_argument("--concurrency", type=int, default=16, help="requests in flight at most")
+    parser.add_argument("--speedup", type=float, default=1.0, help="replay pace multiplier; 0 = as fast as possible")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--corpus", help="directory of real uploads named by their sha256")
+    parser.add_argument("--endpoint", default="", help="only replay endpoints containing this")
+    parser.add_argument("--exclude", action="append", default=None,
+                        help="skip endpoints containing this (repeatable; default /jobs/<)")
+    parser.add_argument("--limit", type=int, default=0, help="replay at most this many requests")
+    parser.add_argument("--out", help="write the report JSON here")
+    args = parser.parse_args()
+
+    exclude = args.exclude if args.exclude is not None else ["/jobs/<"]
+    records = load_records(args.logs, args.endpoint, exclude, args.limit)
+    if not records:
+        print("[Replay] Nothing to replay")
+        sys.exit(1)
+    span = records[-1].get("ts", 0) - records[0].get("ts", 0)
+    pace = f"{args.speedup:g}x ({span / args.speedup:.1f}s schedule)" if args.speedup > 0 else "unpaced"
+    print(f"[Replay] {len(records)} requests against {args.target}, concurrency {args.concurrency}, {pace}")
+
+    replayer = Replayer(args.target, max(1, args.concurrency), args.timeout, args.corpus)
+    started = time.monotonic()
+    results = replayer.run(records, args.speedup)
+    wall = time.monotonic() - started
+
+    report = summarize(results, wall)
+    print_report(report, wall)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"target": args.target, "concurrency": args.concurrency, "speedup": args.speedup,
+                       "wall_seconds": wall, "endpoints": report}, f, indent=2, sort_keys=True)
+        print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
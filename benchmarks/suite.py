@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Offline micro-benchmark suite for the /generate and /remove-bg hot paths.
+
+Stages:
+  generate/<preset>/<ratio>   cold /generate (gradient + PNG + base64 + JSON), every preset x ratio
+  generate/warm               /generate with the texture already cached
+  background/<style>/<ratio>  render_background alone
+  encode/<style>/<ratio>      PNG encode of a rendered background
+  fallback/<n>mp              local cutout of a synthetic product photo
+  remove_bg/hf                /remove-bg through the pooled client against benchmarks/fake_hf.py
+
+Nothing leaves the machine: the Hugging Face API is replaced by the local
+stand-in and the result cache is disabled so every call does the work.
+
+    python benchmarks/suite.py --out baseline.json
+    python benchmarks/suite.py --compare baseline.json [--threshold 0.25]
+
+In compare mode the exit status is 1 if any stage got slower than the
+baseline by more than the threshold (and by at least --min-delta ms). Stages
+are compared on their median by default; `--metric min_ms` is steadier on
+noisy shared machines.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List
+
+from PIL import Image, ImageDraw
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_hf import FakeHFConfig, start_fake_hf  # noqa: E402
+
+FALLBACK_MEGAPIXELS = (0.5, 2, 8, 24)
+HF_LATENCY = 0.05
+
+
+def product_jpeg(megapixels: float) -> bytes:
+    width = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    image = Image.new("RGB", (width, height), (248, 248, 248))
+    draw = ImageDraw.Draw(image)
+    draw.ellipse([width // 5, height // 6, width * 4 // 5, height * 5 // 6], fill=(190, 40, 50))
+    draw.rectangle([width // 3, height // 3, width * 2 // 3, height // 2], fill=(30, 90, 160))
+    buf = io.BytesIO()
+    image.save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+def measure(fn: Callable[[], object], rounds: int) -> Dict[str, float]:
+    fn()  # warm-up
+    samples: List[float] = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "median_ms": statistics.median(samples),
+        "min_ms": samples[0],
+        "p95_ms": samples[min(len(samples) - 1, int(round(0.95 * (len(samples) - 1))))],
+        "rounds": rounds,
+    }
+
+
+def build_stages(server) -> Dict[str, Callable[[], object]]:
+    from near_duplicates import NearDuplicateIndex
+    from result_cache import ResultCache
+    from textures import TextureStore, encode_texture, render_background
+
+    client = server.app.test_client()
+    stages: Dict[str, Callable[[], object]] = {}
+
+    def generate(preset: str, ratio: str):
+        response = client.post("/generate", data={"prompt": "Fresh strawberries", "ratio": ratio,
+                                                  "retail_preset": preset, "texture_mode": "inline"})
+        assert response.status_code == 200, response.status_code
+        return response.data
+
+    def cold(preset: str, ratio: str):
+        def run():
+            server.TEXTURES = TextureStore()
+            return generate(preset, ratio)
+        return run
+
+    for preset in server.RETAIL_PRESETS:
+        for ratio in server.RATIOS:
+            stages[f"generate/{preset}/{ratio}"] = cold(preset, ratio)
+    stages["generate/warm"] = lambda: generate("tesco_festive", "1:1")
+
+    seen = set()
+    for preset in server.RETAIL_PRESETS.values():
+        style = preset.layout_rules.get("background_style", "solid")
+        for ratio, size in server.RATIOS.items():
+            if (style, ratio) in seen:
+                continue
+            seen.add((style, ratio))
+            palette = preset.color_palette
+            stages[f"background/{style}/{ratio}"] = (
+                lambda style=style, palette=palette, size=size: render_background(style, palette, size))
+            image = Image.fromarray(render_background(style, palette, size), "RGBA")
+            stages[f"encode/{style}/{ratio}"] = lambda image=image: encode_texture(image)
+
+    for megapixels in FALLBACK_MEGAPIXELS:
+        data = product_jpeg(megapixels)
+        stages[f"fallback/{megapixels:g}mp"] = lambda data=data: server.fallback_cutout(data)
+
+    upload = product_jpeg(2)
+    # Neither cache may answer, so the stage measures a real cutout as in earlier runs
+    server.RESULT_CACHE = ResultCache(directory=None, memory_bytes=0, disk_bytes=0)
+    server.NEAR_DUPLICATES = NearDuplicateIndex(capacity=0)
+
+    def remove_bg():
+        response = client.post("/remove-bg", data={"image": (io.BytesIO(upload), "product.jpg")})
+        assert response.status_code == 200, response.status_code
+        return response.data
+    stages["remove_bg/hf"] = remove_bg
+    return stages
+
+
+def run(args) -> Dict:
+    # The stand-in must be up before app.py builds its client from the environment
+    config = FakeHFConfig(latency=HF_LATENCY)
+    fake, base_url = start_fake_hf(config)
+    os.environ.update(HF_API_URL=base_url, HUGGINGFACE_TOKEN="offline-benchmark",
+                      HF_RATE_PER_SEC="1000", HF_BURST="1000")
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as server
+        stages = build_stages(server)
+
+    results = {}
+    for name, fn in stages.items():
+        if args.filter and args.filter not in name:
+            continue
+        rounds = max(1, args.rounds // 2) if name.startswith("fallback/") else args.rounds
+        with contextlib.redirect_stdout(io.StringIO()):
+            results[name] = measure(fn, rounds)
+        print(f"{name:<40} {results[name]['median_ms']:>9.2f} ms  (p95 {results[name]['p95_ms']:.2f})")
+    fake.shutdown()
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "hf_latency_ms": HF_LATENCY * 1000,
+        },
+        "stages": results,
+    }
+
+
+def compare(current: Dict, baseline: Dict, threshold: float, min_delta: float,
+            metric: str = "median_ms") -> bool:
+    """Print a per-stage comparison; return False if anything regressed"""
+    ok = True
+    print(f"\n{'stage':<40} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, stats in current["stages"].items():
+        before = baseline["stages"].get(name)
+        if before is None:
+            print(f"{name:<40} {'-':>10} {stats[metric]:>10.2f} {'new':>8}")
+            continue
+        old, new = before[metric], stats[metric]
+        change = (new - old) / old if old else 0.0
+        regressed = change > threshold and new - old > min_delta
+        ok = ok and not regressed
+        flag = "  REGRESSED" if regressed else ""
+        print(f"{name:<40} {old:>10.2f} {new:>10.2f} {change:>+7.0%}{flag}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--filter", default="", help="only run stages whose name contains this")
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown as a fraction")
+    parser.add_argument("--metric", choices=("median_ms", "min_ms", "p95_ms"), default="median_ms")
+    parser.add_argument("--min-delta", type=float, default=1.0, help="ignore regressions smaller than this (ms)")
+    args = parser.parse_args()
+
+    current = run(args)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(current, f, indent=2, sort_keys=True)
+        print(f"\nWrote {args.out}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if not compare(current, baseline, args.threshold, args.min_delta, args.metric):
+            print(f"\nRegression beyond {args.threshold:.0%} against {args.compare}")
+            sys.exit(1)
+        print("\nNo regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+"""
+Server-side poster compositor.
+
+Mirrors the browser editor's layout (background, product cutout with drop
+shadow, headline, subhead, CTA button and logo) with Pillow so posters can be
+rendered headlessly. Fonts are loaded once per (face, size), and the scaled
+product together with its pre-blurred shadow mask is cached per product image
+and placement, so re-rendering the same product is mostly pasting.
+"""
+import hashlib
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from io import BytesIO
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+from encoders import encode, get_profile
+from textures import hex_to_rgb, render_background
+from uploads import UPLOAD_MAX_PIXELS, decode_image
+
+COMPOSITOR_CACHE_SIZE = int(os.getenv("COMPOSITOR_CACHE_SIZE", "16"))
+# Fan-out processes per server process; preforked serve.py workers split the cores between them
+RENDITION_WORKERS = int(os.getenv("RENDITION_WORKERS", str(
+    max(1, (os.cpu_count() or 1) // max(1, int(os.getenv("SERVE_WORKERS", "1")))))))
+POSTER_FONT = os.getenv("POSTER_FONT", "")
+POSTER_FONT_BOLD = os.getenv("POSTER_FONT_BOLD", "")
+
+# Sizes below are in the browser editor's 800px canvas units and scale with the poster
+EDITOR_CANVAS = 800
+HEADLINE_SIZE = 72
+SUBHEAD_SIZE = 42
+CTA_SIZE = 34
+LOGO_SIZE = 28
+LOGO_INSET = 20
+HEADLINE_COLOR = "#00539F"
+SUBHEAD_COLOR = "#333333"
+LOGO_ACCENT = "#E10600"
+
+_REGULAR_FACES = ("DejaVuSans.ttf", "Arial.ttf", "arial.ttf", "LiberationSans-Regular.ttf", "Helvetica.ttc")
+_BOLD_FACES = ("DejaVuSans-Bold.ttf", "Arial Bold.ttf", "arialbd.ttf", "LiberationSans-Bold.ttf", "Helvetica.ttc")
+
+
+@lru_cache(maxsize=64)
+def load_font(bold: bool, size: int) -> ImageFont.FreeTypeFont:
+    """Load the poster font at a pixel size, falling back to Pillow's bundled face"""
+    configured = POSTER_FONT_BOLD if bold else POSTER_FONT
+    for face in ((configured,) if configured else ()) + (_BOLD_FACES if bold else _REGULAR_FACES):
+        try:
+            return ImageFont.truetype(face, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size=size)
+
+
+def warm_fonts(sizes: Iterable[Tuple[int, int]]):
+    """Load every face and pixel size render_poster will need for these poster sizes"""
+    for width, height in sizes:
+        scale = min(width, height) / EDITOR_CANVAS
+        load_font(True, max(8, round(HEADLINE_SIZE * scale)))
+        load_font(False, max(8, round(SUBHEAD_SIZE * scale)))
+        load_font(True, max(8, round(CTA_SIZE * scale)))
+        load_font(False, max(8, round(LOGO_SIZE * scale)))
+
+
+@dataclass(frozen=True)
+class Product:
+    """A decoded product cutout and the SHA-256 of the bytes it came from"""
+    digest: str
+    image: Image.Image
+
+
+def decode_product(data: bytes, max_box: Optional[Tuple[int, int]] = None) -> Product:
+    """Decode a product cutout once, capped at UPLOAD_MAX_PIXELS and shrunk to fit `max_box` if given"""
+    image = decode_image(data, UPLOAD_MAX_PIXELS)
+    if max_box is not None and (image.width > max_box[0] or image.height > max_box[1]):
+        image = image.resize(_fit(image.size, max_box), Image.LANCZOS)
+    return Product(hashlib.sha256(data).hexdigest(), image)
+
+
+@dataclass(frozen=True)
+class PreparedProduct:
+    """A product cutout scaled for a placement, plus its blurred shadow mask"""
+    image: Image.Image
+    shadow: Optional[Image.Image]
+    shadow_pad: int
+
+
+class _PreparedCache:
+    """Small thread-safe LRU of PreparedProduct keyed by product hash and placement"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, PreparedProduct]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> Optional[PreparedProduct]:
+        with self._lock:
+            prepared = self._entries.get(key)
+            if prepared is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return prepared
+
+    def put(self, key: tuple, prepared: PreparedProduct):
+        with self._lock:
+            self._entries[key] = prepared
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+PREPARED_PRODUCTS = _PreparedCache(COMPOSITOR_CACHE_SIZE)
+
+
+def _fit(size: Tuple[int, int], box: Tuple[int, int]) -> Tuple[int, int]:
+    scale = min(box[0] / size[0], box[1] / size[1])
+    return max(1, round(size[0] * scale)), max(1, round(size[1] * scale))
+
+
+def prepare_product(source: Product, box: Tuple[int, int], blur: float,
+                    opacity: float) -> PreparedProduct:
+    """Scale and shadow a product cutout, reusing earlier work when possible"""
+    key = (source.digest, box, round(blur, 2), round(opacity, 3))
+    prepared = PREPARED_PRODUCTS.get(key)
+    if prepared is not None:
+        return prepared
+
+    product = source.image.resize(_fit(source.image.size, box), Image.LANCZOS)
+
+    shadow = None
+    pad = 0
+    if opacity > 0:
+        # Pad so the blur can spread past the cutout's edges
+        pad = int(blur * 2) + 1
+        alpha = product.getchannel("A").point(lambda value: int(value * opacity))
+        shadow = Image.new("L", (product.width + 2 * pad, product.height + 2 * pad), 0)
+        shadow.paste(alpha, (pad, pad))
+        if blur > 0:
+            shadow = shadow.filter(ImageFilter.GaussianBlur(blur / 2))
+
+    prepared = PreparedProduct(product, shadow, pad)
+    PREPARED_PRODUCTS.put(key, prepared)
+    return prepared
+
+
+def _wrap(draw: ImageDraw.ImageDraw, text: str, font, max_width: int) -> List[str]:
+    lines: List[str] = []
+    for word in text.split():
+        if lines and draw.textlength(f"{lines[-1]} {word}", font=font) <= max_width:
+            lines[-1] = f"{lines[-1]} {word}"
+        else:
+            lines.append(word)
+    return lines or [""]
+
+
+def _text_block(draw, text: str, font, max_width: int) -> Tuple[List[str], int]:
+    lines = _wrap(draw, text, font, max_width)
+    line_height = int(font.size * 1.2)
+    return lines, line_height * len(lines)
+
+
+def _draw_centered(draw, lines: Sequence[str], font, fill, width: int, top: int) -> int:
+    line_height = int(font.size * 1.2)
+    for line in lines:
+        draw.text(((width - draw.textlength(line, font=font)) / 2, top), line, font=font, fill=fill)
+        top += line_height
+    return top
+
+
+def _readable_on(hex_color: str) -> str:
+    r, g, b = hex_to_rgb(hex_color)
+    return "#FFFFFF" if 0.299 * r + 0.587 * g + 0.114 * b < 150 else SUBHEAD_COLOR
+
+
+def _draw_logo(poster: Image.Image, logo_bytes: Optional[bytes], scale: float):
+    inset = round(LOGO_INSET * scale)
+    if logo_bytes:
+        logo = Image.open(BytesIO(logo_bytes)).convert("RGBA")
+        logo = logo.resize(_fit(logo.size, (round(160 * scale), round(60 * scale))), Image.LANCZOS)
+        poster.alpha_composite(logo, (inset, inset))
+        return
+
+    # Default Tesco wordmark with its red underline, as in the editor
+    draw = ImageDraw.Draw(poster)
+    font = load_font(False, max(8, round(LOGO_SIZE * scale)))
+    left, top, right, bottom = draw.textbbox((inset, inset), "tesco", font=font)
+    draw.text((inset, inset), "tesco", font=font, fill=HEADLINE_COLOR)
+    draw.rectangle([left, bottom + scale, right, bottom + 3 * scale], fill=LOGO_ACCENT)
+
+
+def product_box(size: Tuple[int, int], layout_rules: Dict[str, Any]) -> Tuple[int, int]:
+    """The largest box a product may fill: the editor's 50% x 60%, scaled by product_visibility"""
+    visibility = float(layout_rules.get("product_visibility", 0.8)) / 0.8
+    return round(size[0] * 0.5 * visibility), round(size[1] * 0.6 * visibility)
+
+
+def render_poster(design: Dict[str, Any], size: Tuple[int, int], background_style: str,
+                  layout_rules: Dict[str, Any], text_rules: Dict[str, Any],
+                  product: Optional[Product] = None,
+                  logo_bytes: Optional[bytes] = None) -> Image.Image:
+    """
+    Composite a poster from a /generate design payload.
+
+    `text_placement` "top" puts the headline block under the logo and the
+    product below it; any other placement centres the product and sets the
+    text beneath it, as the browser editor does.
+    """
+    width, height = size
+    scale = min(width, height) / EDITOR_CANVAS
+    palette = design.get("color_palette") or [design.get("background_color", "#FFFFFF")]
+    poster = Image.fromarray(render_background(background_style, palette, size), "RGBA")
+    draw = ImageDraw.Draw(poster)
+
+    margin = round(float(layout_rules.get("text_margins", 0.1)) * min(width, height))
+    text_width = width - 2 * margin
+    placement = design.get("text_placement") or text_rules.get("headline_position", "center")
+
+    headline_font = load_font(True, max(8, round(HEADLINE_SIZE * scale)))
+    subhead_font = load_font(False, max(8, round(SUBHEAD_SIZE * scale)))
+    cta_font = load_font(True, max(8, round(CTA_SIZE * scale)))
+    headline_lines, headline_h = _text_block(draw, design.get("headline", ""), headline_font, text_width)
+    subhead_lines, subhead_h = _text_block(draw, design.get("subhead", ""), subhead_font, text_width)
+
+    cta_text = design.get("cta_text", "")
+    cta_pad_x, cta_pad_y = round(28 * scale), round(14 * scale)
+    cta_w = round(draw.textlength(cta_text, font=cta_font)) + 2 * cta_pad_x
+    cta_h = int(cta_font.size * 1.2) + 2 * cta_pad_y
+    gap = round(16 * scale)
+    text_h = headline_h + gap + subhead_h + (2 * gap + cta_h if cta_text else 0)
+
+    box = product_box(size, layout_rules)
+    if placement == "top":
+        text_top = margin + round((LOGO_INSET + LOGO_SIZE * 1.6) * scale)
+        product_area = (text_top + text_h + gap, height - margin)
+    else:
+        product_area = (margin, height - margin - text_h - gap)
+    box = (min(box[0], width - 2 * margin), max(1, min(box[1], product_area[1] - product_area[0])))
+
+    product_bottom = product_area[0]
+    if product is not None:
+        shadow_rules = design.get("shadow") or {}
+        blur = float(shadow_rules.get("blur", 20)) * scale
+        opacity = float(shadow_rules.get("opacity", 0.35))
+        offset = round(float(shadow_rules.get("offset", 20)) * scale)
+        prepared = prepare_product(product, box, blur, opacity)
+        left = (width - prepared.image.width) // 2
+        top = product_area[0] + (product_area[1] - product_area[0] - prepared.image.height) // 2
+        if prepared.shadow is not None:
+            shadow_layer = Image.new("RGBA", prepared.shadow.size, (0, 0, 0, 255))
+            shadow_layer.putalpha(prepared.shadow)
+            _composite(poster, shadow_layer,
+                       (left - prepared.shadow_pad + offset, top - prepared.shadow_pad + offset))
+        poster.alpha_composite(prepared.image, (left, top))
+        product_bottom = top + prepared.image.height
+
+    text_top = text_top if placement == "top" else max(product_bottom, product_area[1]) + gap
+    y = _draw_centered(draw, headline_lines, headline_font, HEADLINE_COLOR, width, text_top)
+    y = _draw_centered(draw, subhead_lines, subhead_font, SUBHEAD_COLOR, width, y + gap)
+    if cta_text:
+        fill = design.get("accent_color") or HEADLINE_COLOR
+        left = (width - cta_w) // 2
+        top = y + 2 * gap
+        draw.rounded_rectangle([left, top, left + cta_w, top + cta_h], radius=cta_h // 2, fill=fill)
+        draw.text((left + cta_pad_x, top + cta_pad_y), cta_text, font=cta_font, fill=_readable_on(fill))
+
+    _draw_logo(poster, logo_bytes, scale)
+    return poster
+
+
+def _composite(poster: Image.Image, layer: Image.Image, dest: Tuple[int, int]):
+    # alpha_composite rejects negative destinations, so crop the layer instead
+    source = (max(0, -dest[0]), max(0, -dest[1]))
+    poster.alpha_composite(layer, (max(0, dest[0]), max(0, dest[1])), source)
+
+
+def encode_poster(poster: Image.Image, fmt: str) -> Tuple[bytes, str]:
+    """Encode a rendered poster with a named encoder profile; returns (bytes, mimetype)"""
+    return encode(poster, get_profile(fmt))
+
+
+_RENDITION_POOL = None
+
+
+def rendition_pool() -> ProcessPoolExecutor:
+    """
+    The process pool used for multi-ratio fan-out.
+
+    Servers create it with start_rendition_pool() before taking traffic;
+    otherwise (scripts, the dev server) it is created on first use.
+    """
+    global _RENDITION_POOL
+    if _RENDITION_POOL is None:
+        _RENDITION_POOL = ProcessPoolExecutor(max_workers=max(1, RENDITION_WORKERS))
+    return _RENDITION_POOL
+
+
+def start_rendition_pool(workers: int = RENDITION_WORKERS) -> ProcessPoolExecutor:
+    """
+    Create the fan-out pool and fork its processes now.
+
+    Call while this process has no other threads: forking from a request
+    thread can copy locks other threads hold. With the fork start method
+    the executor forks every process on its first submit.
+    """
+    global _RENDITION_POOL
+    if _RENDITION_POOL is None:
+        _RENDITION_POOL = ProcessPoolExecutor(max_workers=max(1, workers))
+    _RENDITION_POOL.submit(int).result()
+    return _RENDITION_POOL
+
+
+def shutdown_rendition_pool():
+    """Stop the fan-out processes, if any were started"""
+    global _RENDITION_POOL
+    if _RENDITION_POOL is not None:
+        _RENDITION_POOL.shutdown(wait=True, cancel_futures=True)
+        _RENDITION_POOL = None
+
+
+def render_rendition(task: Dict[str, Any]) -> Tuple[str, bytes, str]:
+    """
+    Process-pool entry point: render and encode one ratio of a fan-out.
+
+    `task` holds only picklable inputs prepared once by the caller: the
+    design, target size, preset rules, the already-decoded product, the logo
+    bytes and the encoder profile name. Returns (ratio, encoded bytes, mimetype).
+    """
+    poster = render_poster(
+        task["design"],
+        task["size"],
+        task["background_style"],
+        task["layout_rules"],
+        task["text_rules"],
+        product=task.get("product"),
+        logo_bytes=task.get("logo"),
+    )
+    data, mimetype = encode_poster(poster, task["format"])
+    return task["design"].get("ratio", ""), data, mimetype
@@ -0,0 +1,130 @@
+"""
+Named image encoder profiles and output format negotiation.
+
+Every encoded image the API returns goes through one of the profiles below,
+each a fixed speed/size trade-off (see benchmarks/bench_encoders.py for the
+numbers). Endpoints pick a profile from an explicit `format` parameter or,
+failing that, from the request's Accept header, with per-endpoint defaults:
+
+    texture  png -> png-palette (TEXTURE_PROFILE)   webp -> webp-lossless
+    cutout   png -> png-fast    (CUTOUT_PROFILE)    webp -> webp
+    poster   png -> png-balanced                    webp -> webp, jpeg -> jpeg
+
+`format` may also name a profile directly, e.g. `format=png-small`.
+"""
+import os
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+TEXTURE_PROFILE = os.getenv("TEXTURE_PROFILE", "png-palette")
+CUTOUT_PROFILE = os.getenv("CUTOUT_PROFILE", "png-fast")
+
+
+@dataclass(frozen=True)
+class EncoderProfile:
+    """A Pillow format plus the save() options that make one speed/size trade-off"""
+    name: str
+    format: str
+    mimetype: str
+    extension: str
+    params: Dict = field(default_factory=dict)
+    # Try an exact palette first (opaque images with at most 256 colours)
+    palette: bool = False
+    # False for formats that cannot carry transparency
+    alpha: bool = True
+
+
+PROFILES: Dict[str, EncoderProfile] = {profile.name: profile for profile in (
+    EncoderProfile("png-fast", "PNG", "image/png", "png", {"compress_level": 1}),
+    EncoderProfile("png-balanced", "PNG", "image/png", "png", {"compress_level": 6}),
+    EncoderProfile("png-small", "PNG", "image/png", "png", {"optimize": True}),
+    EncoderProfile("png-palette", "PNG", "image/png", "png", {"compress_level": 6}, palette=True),
+    EncoderProfile("webp-lossless", "WEBP", "image/webp", "webp", {"lossless": True, "method": 2}),
+    EncoderProfile("webp", "WEBP", "image/webp", "webp", {"quality": 85, "method": 2}),
+    EncoderProfile("jpeg", "JPEG", "image/jpeg", "jpg", {"quality": 90}, alpha=False),
+)}
+
+# Short format names accepted per kind of output; "png" comes first so it wins ties
+FORMATS: Dict[str, Dict[str, str]] = {
+    "texture": {"png": TEXTURE_PROFILE, "webp": "webp-lossless"},
+    "cutout": {"png": CUTOUT_PROFILE, "webp": "webp"},
+    "poster": {"png": "png-balanced", "webp": "webp", "jpeg": "jpeg", "jpg": "jpeg"},
+}
+
+
+class UnsupportedFormat(ValueError):
+    """The requested format or profile is unknown, or cannot be used for this output"""
+
+
+def get_profile(name: str) -> EncoderProfile:
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise UnsupportedFormat(f"unknown encoder profile {name!r}; choose from {', '.join(PROFILES)}")
+
+
+def negotiate(kind: str, fmt: Optional[str] = None, accept=None) -> EncoderProfile:
+    """
+    Pick the profile for a `kind` of output.
+
+    `fmt` is a short format name or a profile name and always wins; otherwise
+    `accept` (werkzeug MIMEAccept) chooses among the kind's formats, falling
+    back to PNG. Raises UnsupportedFormat for names this kind can't produce.
+    """
+    formats = FORMATS[kind]
+    fmt = (fmt or "").strip().lower()
+    if fmt:
+        profile = get_profile(formats.get(fmt, fmt))
+        if not profile.alpha and kind == "cutout":
+            raise UnsupportedFormat(f"{profile.name} cannot carry the transparency a cutout needs")
+        return profile
+
+    profiles = [get_profile(name) for name in formats.values()]
+    if accept is not None:
+        match = accept.best_match([profile.mimetype for profile in profiles])
+        for profile in profiles:
+            if profile.mimetype == match:
+                return profile
+    return profiles[0]
+
+
+def to_palette(image: Image.Image) -> Optional[Image.Image]:
+    """Exact "P" mode copy of an opaque RGBA image with at most 256 colours, else None"""
+    if image.mode != "RGBA" or image.getchannel("A").getextrema() != (255, 255):
+        return None
+    colors = image.getcolors(256)
+    if colors is None:
+        return None
+    # Index pixels through a 24-bit RGB lookup table; Image.quantize() is ~4x slower
+    # and its palette mapping is not exact
+    rgba = np.asarray(image)
+    keys = rgba.view("<u4")[:, :, 0] & 0xFFFFFF
+    palette = np.array([color for _, color in colors], dtype=np.uint8)
+    lut = np.zeros(1 << 24, dtype=np.uint8)
+    lut[palette.view("<u4")[:, 0] & 0xFFFFFF] = np.arange(len(palette))
+    indexed = Image.fromarray(lut[keys], "P")
+    indexed.putpalette(palette[:, :3].tobytes())
+    return indexed
+
+
+def encode(image: Image.Image, profile: EncoderProfile) -> Tuple[bytes, str]:
+    """Encode an image with a profile; returns (bytes, mimetype)"""
+    if not profile.alpha and image.mode != "RGB":
+        image = image.convert("RGB")
+    elif profile.palette:
+        image = to_palette(image) or image
+    buf = BytesIO()
+    image.save(buf, format=profile.format, **profile.params)
+    return buf.getvalue(), profile.mimetype
+
+
+def transcode(data: bytes, profile: EncoderProfile) -> Tuple[bytes, str]:
+    """Re-encode already encoded PNG bytes, or pass them through if PNG was asked for"""
+    if profile.format == "PNG":
+        return data, "image/png"
+    with Image.open(BytesIO(data)) as image:
+        return encode(image, profile)
@@ -0,0 +1,264 @@
+"""
+Pooled, rate-limit-aware client for the Hugging Face inference API.
+
+One keep-alive `requests.Session` is shared by every call. Outgoing requests
+pass through a token bucket and an adaptive (AIMD) concurrency limit, are
+retried with jittered exponential backoff that honours `Retry-After`, and are
+skipped entirely while the circuit breaker considers the upstream down.
+"""
+import email.utils
+import os
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import HF_SECONDS
+
+HF_API_URL = os.getenv("HF_API_URL", "https://api-inference.huggingface.co").rstrip("/")
+HF_TIMEOUT = float(os.getenv("HF_TIMEOUT", "30"))
+HF_MAX_RETRIES = int(os.getenv("HF_MAX_RETRIES", "2"))
+HF_RATE_PER_SEC = float(os.getenv("HF_RATE_PER_SEC", "5"))
+HF_BURST = int(os.getenv("HF_BURST", "10"))
+HF_MAX_CONCURRENCY = int(os.getenv("HF_MAX_CONCURRENCY", "8"))
+HF_TARGET_LATENCY = float(os.getenv("HF_TARGET_LATENCY", "10"))
+HF_BREAKER_FAILURES = int(os.getenv("HF_BREAKER_FAILURES", "5"))
+HF_BREAKER_COOLDOWN = float(os.getenv("HF_BREAKER_COOLDOWN", "30"))
+
+# Statuses worth another attempt; everything else is returned to the caller
+RETRYABLE_STATUSES = {429, 502, 503, 504}
+# Statuses that count against the circuit breaker
+UPSTREAM_DOWN_STATUSES = {410, 500, 502, 503, 504}
+
+
+class UpstreamUnavailable(Exception):
+    """Raised when the client declines to call the upstream at all"""
+
+
+class TokenBucket:
+    """Classic token bucket; `acquire` blocks until a token is free or the deadline passes"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, deadline: float) -> bool:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate if self.rate > 0 else deadline - now
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency cap that adapts to the upstream (additive increase,
+    multiplicative decrease): fast successes grow the limit by one, while
+    429s and slow responses halve it.
+    """
+
+    def __init__(self, max_limit: int, target_latency: float):
+        self.max_limit = max(1, max_limit)
+        self.target_latency = target_latency
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, deadline: float) -> bool:
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            self.in_flight += 1
+            return True
+
+    def release(self, latency: float, throttled: bool):
+        with self._cond:
+            self.in_flight -= 1
+            if throttled or latency > self.target_latency:
+                self.limit = max(1.0, self.limit / 2)
+            else:
+                self.limit = min(float(self.max_limit), self.limit + 1)
+            self._cond.notify_all()
+
+
+class CircuitBreaker:
+    """Opens after consecutive upstream failures and half-opens after a cooldown"""
+
+    def __init__(self, failure_threshold: int, cooldown: float):
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at >= self.cooldown:
+                return "half_open"
+            return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.cooldown or self._trial_in_flight:
+                return False
+            # Half-open: let a single trial request through
+            self._trial_in_flight = True
+            return True
+
+    def abandon(self):
+        """Give back a half-open trial slot that was never used"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record(self, healthy: bool):
+        with self._lock:
+            self._trial_in_flight = False
+            if healthy:
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+def _retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given either as seconds or as an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class HFInferenceClient:
+    """Shared client for one Hugging Face model"""
+
+    def __init__(self, model: str, token: str, base_url: str = HF_API_URL,
+                 timeout: float = HF_TIMEOUT, max_retries: int = HF_MAX_RETRIES,
+                 rate_per_sec: float = HF_RATE_PER_SEC, burst: int = HF_BURST,
+                 max_concurrency: int = HF_MAX_CONCURRENCY,
+                 target_latency: float = HF_TARGET_LATENCY,
+                 breaker_failures: int = HF_BREAKER_FAILURES,
+                 breaker_cooldown: float = HF_BREAKER_COOLDOWN,
+                 backoff_base: float = 0.5, backoff_cap: float = 8.0):
+        self.model = model
+        self.token = token
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.bucket = TokenBucket(rate_per_sec, burst)
+        self.limiter = AdaptiveLimiter(max_concurrency, target_latency)
+        self.breaker = CircuitBreaker(breaker_failures, breaker_cooldown)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, max_concurrency))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["Authorization"] = f"Bearer {token}"
+
+    @property
+    def model_url(self) -> str:
+        return f"{self.base_url}/models/{self.model}"
+
+    @property
+    def status_url(self) -> str:
+        return f"{self.base_url}/status/{self.model}"
+
+    def remove_background(self, image_bytes: bytes) -> requests.Response:
+        """
+        POST an image to the model and return the final upstream response.
+
+        Retryable statuses are retried until `max_retries` or the overall
+        timeout is exhausted, after which the last response is returned.
+        Raises UpstreamUnavailable if the breaker is open or no rate/concurrency
+        slot frees up in time, and re-raises the last network error.
+        """
+        deadline = time.monotonic() + self.timeout
+        attempt = 0
+        while True:
+            response = self._attempt(image_bytes, deadline)
+            attempt += 1
+            if response.status_code not in RETRYABLE_STATUSES or attempt > self.max_retries:
+                return response
+
+            delay = _retry_after_seconds(response.headers.get("Retry-After"))
+            if delay is None:
+                delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+            if time.monotonic() + delay >= deadline:
+                return response
+            print(f"[HF Client] Upstream returned {response.status_code}, retrying in {delay:.2f}s")
+            time.sleep(delay)
+
+    def _attempt(self, image_bytes: bytes, deadline: float) -> requests.Response:
+        if not self.breaker.allow():
+            raise UpstreamUnavailable("circuit breaker open")
+        if not self.bucket.acquire(deadline):
+            self.breaker.abandon()
+            raise UpstreamUnavailable("rate limit budget exhausted")
+        if not self.limiter.acquire(deadline):
+            self.breaker.abandon()
+            raise UpstreamUnavailable("concurrency limit saturated")
+
+        started = time.monotonic()
+        try:
+            response = self.session.post(
+                self.model_url,
+                data=image_bytes,
+                headers={"Content-Type": "application/octet-stream"},
+                timeout=max(0.1, deadline - started),
+            )
+        except requests.RequestException as e:
+            elapsed = time.monotonic() - started
+            HF_SECONDS.observe(elapsed, status=type(e).__name__)
+            self.limiter.release(elapsed, throttled=True)
+            self.breaker.record(False)
+            raise
+
+        elapsed = time.monotonic() - started
+        HF_SECONDS.observe(elapsed, status=str(response.status_code))
+        self.limiter.release(elapsed, response.status_code == 429)
+        self.breaker.record(response.status_code not in UPSTREAM_DOWN_STATUSES)
+        return response
+
+    def status(self) -> requests.Response:
+        """GET the model status endpoint through the pooled session"""
+        return self.session.get(self.status_url, timeout=10)
+
+    def snapshot(self) -> Dict[str, object]:
+        """Current limiter and breaker state"""
+        return {
+            "breaker": self.breaker.state,
+            "breaker_failures": self.breaker.failures,
+            "concurrency_limit": int(self.limiter.limit),
+            "in_flight": self.limiter.in_flight,
+        }
@@ -0,0 +1,410 @@
+"""
+Bounded background job queue.
+
+Work is submitted to a fixed-size queue drained by a small pool of worker
+threads, so slow upstream calls no longer pin a request thread. Submitting to
+a full queue raises QueueFull, which the HTTP layer turns into a 503. Each job
+records its status transitions; waiters (polling or Server-Sent Events) block
+on a condition variable instead of spinning. A cancelled job is skipped if it
+has not started; if it has, its result is discarded and work that calls
+raise_if_cancelled() stops at its next checkpoint.
+
+Jobs run in the process that accepted them, but their state is shared with
+the other serve.py workers through JOB_STATE_DIR: the owner writes a small
+JSON file on every status change and the result bytes once it is done, so
+any worker can answer /jobs/<id>, wait for its result or stream its events
+(by polling the file every JOB_POLL_INTERVAL seconds). Cancelling a job owned
+by another worker drops a marker file that the owner picks up at its next
+check. Results are (bytes, mimetype) pairs. An empty JOB_STATE_DIR keeps
+jobs private to the process.
+"""
+import json
+import os
+import queue
+import re
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_QUEUE_DEPTH = int(os.getenv("JOB_QUEUE_DEPTH", "64"))
+JOB_TIMEOUT = float(os.getenv("JOB_TIMEOUT", "60"))
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "600"))
+JOB_MAX_RETAINED = int(os.getenv("JOB_MAX_RETAINED", "1000"))
+JOB_STATE_DIR = os.getenv("JOB_STATE_DIR", os.path.join(tempfile.gettempdir(), "prompt2poster-jobs"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "0.25"))
+# Stale state files are swept at most this often
+JOB_SWEEP_INTERVAL = 60.0
+
+_JOB_ID = re.compile(r"[0-9a-f]{32}")
+
+TERMINAL_STATUSES = {"done", "error", "timeout", "cancelled"}
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+
+
+class JobCancelled(Exception):
+    """Raised inside a job's work at a checkpoint after the job was cancelled"""
+
+
+_current = threading.local()
+
+
+def raise_if_cancelled():
+    """Checkpoint for long-running job work; a no-op outside job worker threads"""
+    job = getattr(_current, "job", None)
+    if job is not None and (job.cancel_requested.is_set() or job.cancel_marked()):
+        raise JobCancelled(f"job {job.id} was cancelled")
+
+
+class Job:
+    """A unit of queued work and its lifecycle"""
+
+    def __init__(self, kind: str, fn: Callable[[], Any], timeout: float):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.fn = fn
+        self.timeout = timeout
+        self.status = "queued"
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.version = 0
+        self.cancel_requested = threading.Event()
+        # File another worker creates to cancel this job, when state is shared
+        self.cancel_marker: Optional[str] = None
+
+    @property
+    def terminal(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+    def cancel_marked(self) -> bool:
+        return self.cancel_marker is not None and os.path.exists(self.cancel_marker)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "error": self.error,
+        }
+
+
+class SharedJob(Job):
+    """Read-only view of a job owned by another worker, loaded from its state file"""
+
+    def __init__(self, state: Dict[str, Any], result_path: str):
+        self.id = state["job_id"]
+        self.kind = state["kind"]
+        self.fn = None
+        self.timeout = state["timeout"]
+        self.cancel_requested = threading.Event()
+        self.cancel_marker = None
+        self.mimetype: Optional[str] = None
+        self._result_path = result_path
+        self.update(state)
+
+    def update(self, state: Dict[str, Any]):
+        for field in ("status", "created", "started", "finished", "error", "version", "mimetype"):
+            setattr(self, field, state.get(field))
+
+    @property
+    def result(self) -> Optional[Tuple[bytes, str]]:
+        """The owner's result, or None once it has been swept"""
+        if self.status != "done":
+            return None
+        try:
+            with open(self._result_path, "rb") as fh:
+                return fh.read(), self.mimetype
+        except OSError:
+            return None
+
+
+class JobQueue:
+    """Fixed-depth queue with a lazily started worker pool"""
+
+    def __init__(self, workers: int = JOB_WORKERS, depth: int = JOB_QUEUE_DEPTH,
+                 timeout: float = JOB_TIMEOUT, result_ttl: float = JOB_RESULT_TTL,
+                 max_retained: int = JOB_MAX_RETAINED, directory: Optional[str] = JOB_STATE_DIR,
+                 poll_interval: float = JOB_POLL_INTERVAL):
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.result_ttl = result_ttl
+        self.max_retained = max_retained
+        self.poll_interval = max(0.01, poll_interval)
+        self.directory = directory or None
+        if self.directory:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+            except OSError as e:
+                print(f"[Jobs] Job state directory unavailable, jobs stay in this process: {str(e)}")
+                self.directory = None
+        self._queue: "queue.Queue[Job]" = queue.Queue(maxsize=max(1, depth))
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._swept = 0.0
+        self.stats = {"submitted": 0, "rejected": 0, "done": 0, "error": 0, "timeout": 0, "cancelled": 0,
+                      "shared_reads": 0, "state_write_errors": 0}
+
+    def submit(self, kind: str, fn: Callable[[], Any], timeout: Optional[float] = None) -> Job:
+        """Queue `fn` for execution; raises QueueFull under back-pressure"""
+        self._ensure_workers()
+        job = Job(kind, fn, self.timeout if timeout is None else timeout)
+        if self.directory:
+            job.cancel_marker = self._path(job.id, "cancel")
+        with self._cond:
+            self._purge()
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                self.stats["rejected"] += 1
+                raise QueueFull(f"job queue is full ({self._queue.maxsize} pending)")
+            self._jobs[job.id] = job
+            self.stats["submitted"] += 1
+            self._publish(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """A job of this process, or a SharedJob view of one another worker owns"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                self._expire(job)
+                return job
+        return self._load(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancel a job that hasn't finished; returns it (unchanged if already finished) or None"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                self._expire(job)
+                if not job.terminal:
+                    self._cancel(job)
+                return job
+
+        job = self._load(job_id)
+        if job is not None and not job.terminal:
+            try:
+                with open(self._path(job_id, "cancel"), "a"):
+                    pass
+            except OSError as e:
+                print(f"[Jobs] Could not cancel job {job_id}: {str(e)}")
+                return job
+            job = self._load(job_id)
+        return job
+
+    def wait(self, job: Job, version: int, timeout: float) -> Job:
+        """Block until `job` changes past `version`, it finishes, or `timeout` elapses"""
+        deadline = time.monotonic() + timeout
+        if isinstance(job, SharedJob):
+            while job.version == version and not job.terminal:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                time.sleep(min(remaining, self.poll_interval))
+                self._refresh(job)
+            return job
+
+        with self._cond:
+            while job.version == version and not job.terminal:
+                self._expire(job)
+                remaining = min(deadline, self._deadline(job)) - time.monotonic()
+                if remaining <= 0:
+                    self._expire(job)
+                    break
+                # With shared state, wake up regularly to notice cancel markers from other workers
+                self._cond.wait(min(remaining, self.poll_interval) if self.directory else remaining)
+            return job
+
+    def drain(self, timeout: float) -> bool:
+        """Wait up to `timeout` for every accepted job to finish; True if none are left"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                for job in list(self._jobs.values()):
+                    self._expire(job)
+                pending = sum(1 for job in self._jobs.values() if not job.terminal)
+                remaining = deadline - time.monotonic()
+                if not pending or remaining <= 0:
+                    return not pending
+                self._cond.wait(min(remaining, 1.0))
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._cond:
+            return dict(self.stats, queued=self._queue.qsize(), capacity=self._queue.maxsize,
+                        workers=len(self._threads), retained=len(self._jobs))
+
+    def _ensure_workers(self):
+        with self._cond:
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"job-worker-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            with self._cond:
+                self._expire(job)
+                if job.terminal:
+                    job.fn = None
+                    continue
+                job.status = "running"
+                job.started = time.time()
+                self._changed(job)
+
+            _current.job = job
+            try:
+                result, error = job.fn(), None
+            except Exception as e:
+                result, error = None, str(e) or type(e).__name__
+            finally:
+                _current.job = None
+
+            with self._cond:
+                # A job that overran its timeout or was cancelled has already been reported; drop the late result
+                self._expire(job)
+                if not job.terminal:
+                    job.status = "error" if error else "done"
+                    job.result, job.error = result, error
+                    job.finished = time.time()
+                    self.stats[job.status] += 1
+                    self._changed(job)
+                job.fn = None
+                self._cond.notify_all()
+
+    # Shared state files; reads need no lock, writes are atomic renames
+
+    def _path(self, job_id: str, suffix: str) -> str:
+        return os.path.join(self.directory, f"{job_id}.{suffix}")
+
+    def _read_state(self, job_id: str) -> Optional[Dict[str, Any]]:
+        if not self.directory or not _JOB_ID.fullmatch(job_id):
+            return None
+        try:
+            with open(self._path(job_id, "json"), "rb") as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def _load(self, job_id: str) -> Optional[SharedJob]:
+        state = self._read_state(job_id)
+        if state is None:
+            return None
+        with self._cond:
+            self.stats["shared_reads"] += 1
+        job = SharedJob(state, self._path(job_id, "result"))
+        self._settle(job)
+        return job
+
+    def _refresh(self, job: SharedJob):
+        state = self._read_state(job.id)
+        if state is not None:
+            job.update(state)
+        self._settle(job)
+
+    def _settle(self, job: SharedJob):
+        """Report what the owner will record once it notices: a cancel marker, or the timeout passing"""
+        if job.terminal:
+            return
+        if os.path.exists(self._path(job.id, "cancel")):
+            job.status, job.finished = "cancelled", time.time()
+        elif time.time() - job.created > job.timeout:
+            job.status, job.error, job.finished = "timeout", f"job exceeded {job.timeout:g}s", time.time()
+
+    def _write(self, path: str, data: bytes):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    # The helpers below expect the condition's lock to be held
+
+    def _publish(self, job: Job):
+        if not self.directory:
+            return
+        state = dict(job.to_dict(), version=job.version, timeout=job.timeout, mimetype=None)
+        try:
+            if job.status == "done":
+                data, state["mimetype"] = job.result
+                # The result lands before the state that points other workers at it
+                self._write(self._path(job.id, "result"), data)
+            self._write(self._path(job.id, "json"), json.dumps(state).encode("utf-8"))
+        except (OSError, TypeError, ValueError) as e:
+            self.stats["state_write_errors"] += 1
+            print(f"[Jobs] Could not share the state of job {job.id}: {str(e)}")
+
+    def _changed(self, job: Job):
+        job.version += 1
+        self._cond.notify_all()
+        self._publish(job)
+
+    def _cancel(self, job: Job):
+        job.cancel_requested.set()
+        job.status = "cancelled"
+        job.finished = time.time()
+        self.stats["cancelled"] += 1
+        self._changed(job)
+
+    def _deadline(self, job: Job) -> float:
+        return time.monotonic() + max(0.0, job.created + job.timeout - time.time())
+
+    def _expire(self, job: Job):
+        if job.terminal:
+            return
+        if job.cancel_marked():
+            self._cancel(job)
+        elif time.time() - job.created > job.timeout:
+            job.status = "timeout"
+            job.error = f"job exceeded {job.timeout:g}s"
+            job.finished = time.time()
+            self.stats["timeout"] += 1
+            self._changed(job)
+
+    def _purge(self):
+        now = time.time()
+        finished = [job for job in self._jobs.values() if job.terminal]
+        for job in finished:
+            if now - job.finished > self.result_ttl or len(self._jobs) > self.max_retained:
+                del self._jobs[job.id]
+        if self.directory and now - self._swept > JOB_SWEEP_INTERVAL:
+            self._swept = now
+            self._sweep(now - self.result_ttl - self.timeout)
+
+    def _sweep(self, cutoff: float):
+        """Delete state files, from any worker, last touched before `cutoff`"""
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                if os.stat(path).st_mtime < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,240 @@
+"""
+Local matte engine used when the Hugging Face background removal is unavailable.
+
+Two segmenters are available. The default "border" mode estimates the
+backdrop colour from the image border, keeps only backdrop-coloured regions
+that are connected to the border (so white labels inside a product survive,
+and non-white backdrops work), and feathers the edge with a distance
+transform. The legacy "threshold" mode removes every pixel brighter than a
+luma threshold.
+
+Everything here works on whole arrays at once: colour distances and the luma
+threshold are evaluated in 8/16-bit integer arithmetic, connected components
+and distances come from scipy.ndimage, and the threshold mask is grown with
+separable shifted-array dilation, so a 4K photo is processed in well under a
+second. SciPy is imported on the first border-mode matte rather than at
+startup, so workers that never fall back don't pay for it.
+"""
+import os
+from typing import Tuple
+
+import numpy as np
+
+from metrics import span
+
+MATTE_MODE = os.getenv("MATTE_MODE", "border")
+MATTE_TOLERANCE = int(os.getenv("MATTE_TOLERANCE", "40"))
+MATTE_FEATHER = int(os.getenv("MATTE_FEATHER", "2"))
+MATTE_THRESHOLD = int(os.getenv("MATTE_THRESHOLD", "240"))
+MATTE_KERNEL_SIZE = int(os.getenv("MATTE_KERNEL_SIZE", "3"))
+MATTE_PROXY_PIXELS = int(os.getenv("MATTE_PROXY_PIXELS", "1000000"))
+
+# Rows refined per strip at full resolution; bounds the temporaries to a band
+_REFINE_STRIP_ROWS = 256
+
+# Width of the border ring sampled for the backdrop colour
+_BORDER_SAMPLE = 4
+
+# ITU-R 601 luma weights in thousandths (0.299, 0.587, 0.114)
+_LUMA_WEIGHTS: Tuple[int, int, int] = (299, 587, 114)
+
+
+def light_mask(rgb: np.ndarray, threshold: int = MATTE_THRESHOLD) -> np.ndarray:
+    """
+    Return a boolean mask of pixels whose luma is strictly above `threshold`.
+
+    Equivalent to `0.299*r + 0.587*g + 0.114*b > threshold` but computed on
+    the per-channel distance to white in uint16, so no float64 copy of the
+    image is ever made. Each channel's distance is clipped at the point where
+    it alone rules the pixel out, which keeps the weighted sum inside 16 bits.
+    """
+    margin = 1000 * (255 - threshold)
+    if margin <= 0:
+        return np.zeros(rgb.shape[:2], dtype=bool)
+
+    clips = [-(-margin // w) for w in _LUMA_WEIGHTS]
+    bound = sum(w * c for w, c in zip(_LUMA_WEIGHTS, clips))
+    dtype = np.uint16 if bound <= np.iinfo(np.uint16).max else np.uint32
+
+    deficit = np.zeros(rgb.shape[:2], dtype=dtype)
+    channel = np.empty(rgb.shape[:2], dtype=dtype)
+    for index, (weight, clip) in enumerate(zip(_LUMA_WEIGHTS, clips)):
+        np.subtract(255, rgb[:, :, index], out=channel, dtype=dtype, casting="unsafe")
+        np.minimum(channel, clip, out=channel)
+        channel *= weight
+        deficit += channel
+    return deficit < margin
+
+
+def dilate(mask: np.ndarray, kernel_size: int = MATTE_KERNEL_SIZE) -> np.ndarray:
+    """
+    Binary dilation with a square `kernel_size` x `kernel_size` window.
+
+    Matches the original per-pixel loop: pixels closer than half a kernel to
+    the image edge are left unset.
+    """
+    if kernel_size < 1 or kernel_size % 2 == 0:
+        raise ValueError(f"kernel_size must be a positive odd number, got {kernel_size}")
+
+    radius = kernel_size // 2
+    h, w = mask.shape
+    if radius == 0:
+        return mask.copy()
+    if h <= 2 * radius or w <= 2 * radius:
+        return np.zeros_like(mask)
+
+    # Separable max filter: OR over horizontal shifts, then vertical shifts
+    rows = mask[:, radius:w - radius].copy()
+    for offset in range(-radius, radius + 1):
+        if offset:
+            rows |= mask[:, radius + offset:w - radius + offset]
+
+    dilated = np.zeros_like(mask)
+    inner = dilated[radius:h - radius, radius:w - radius]
+    for offset in range(-radius, radius + 1):
+        inner |= rows[radius + offset:h - radius + offset]
+    return dilated
+
+
+def compute_alpha(rgba: np.ndarray, threshold: int = MATTE_THRESHOLD,
+                  kernel_size: int = MATTE_KERNEL_SIZE) -> np.ndarray:
+    """Compute a uint8 alpha channel removing light backgrounds from an RGBA array"""
+    with span("threshold"):
+        mask = light_mask(rgba, threshold)
+    with span("dilate"):
+        mask = dilate(mask, kernel_size)
+    alpha = np.full(mask.shape, 255, dtype=np.uint8)
+    alpha[mask] = 0
+    return alpha
+
+
+def compute_alpha_multires(rgba: np.ndarray, threshold: int = MATTE_THRESHOLD,
+                           kernel_size: int = MATTE_KERNEL_SIZE,
+                           proxy_pixels: int = MATTE_PROXY_PIXELS) -> np.ndarray:
+    """
+    Approximate `compute_alpha` via a downscaled proxy.
+
+    The mask is thresholded on a point-sampled proxy of roughly `proxy_pixels`
+    pixels (one pixel from the centre of each cell) and upsampled. Only proxy cells on or next to the mask boundary are
+    recomputed at full resolution, strip by strip, so full-size temporaries
+    are limited to a boolean band and one strip of 16-bit work arrays. Edges
+    come out exact; features smaller than one proxy cell away from any edge
+    (specks, hairlines) follow the proxy instead.
+    """
+    h, w = rgba.shape[:2]
+    factor = int(np.ceil(np.sqrt(h * w / proxy_pixels))) if proxy_pixels > 0 else 1
+    if factor < 2:
+        return compute_alpha(rgba, threshold, kernel_size)
+
+    # Fancy indexing copies only the proxy, never a full-size RGB plane
+    rows = np.minimum(np.arange(-(-h // factor)) * factor + factor // 2, h - 1)
+    cols = np.minimum(np.arange(-(-w // factor)) * factor + factor // 2, w - 1)
+    with span("threshold"):
+        coarse = light_mask(rgba[rows[:, None], cols], threshold)
+
+    # Cells whose 3x3 neighbourhood is mixed may change at full resolution
+    grown = _grow(coarse)
+    shrunk = ~_grow(~coarse)
+    band_coarse = grown & ~shrunk
+
+    alpha = np.where(coarse, np.uint8(0), np.uint8(255))
+    alpha = np.repeat(np.repeat(alpha, factor, axis=0), factor, axis=1)[:h, :w]
+    band = np.repeat(np.repeat(band_coarse, factor, axis=0), factor, axis=1)[:h, :w]
+
+    # The full-resolution dilation never marks pixels within a radius of the edge
+    radius = kernel_size // 2
+    if radius:
+        alpha[:radius] = 255
+        alpha[h - radius:] = 255
+        alpha[:, :radius] = 255
+        alpha[:, w - radius:] = 255
+
+    with span("refine"):
+        for top in range(0, h, _REFINE_STRIP_ROWS):
+            bottom = min(h, top + _REFINE_STRIP_ROWS)
+            strip_band = band[top:bottom]
+            if not strip_band.any():
+                continue
+            lo, hi = max(0, top - radius), min(h, bottom + radius)
+            strip_mask = dilate(light_mask(rgba[lo:hi], threshold), kernel_size)[top - lo:top - lo + bottom - top]
+            strip_alpha = alpha[top:bottom]
+            strip_alpha[strip_band] = np.where(strip_mask[strip_band], np.uint8(0), np.uint8(255))
+    return alpha
+
+
+def _grow(mask: np.ndarray) -> np.ndarray:
+    """3x3 dilation that, unlike `dilate`, also grows into the border"""
+    rows = mask.copy()
+    rows[:, 1:] |= mask[:, :-1]
+    rows[:, :-1] |= mask[:, 1:]
+    grown = rows.copy()
+    grown[1:] |= rows[:-1]
+    grown[:-1] |= rows[1:]
+    return grown
+
+
+def border_color(rgb: np.ndarray, width: int = _BORDER_SAMPLE) -> np.ndarray:
+    """Per-channel median of a `width`-pixel ring around the image: the backdrop estimate"""
+    h, w = rgb.shape[:2]
+    width = max(1, min(width, h // 2, w // 2))
+    ring = np.concatenate([
+        rgb[:width, :, :3].reshape(-1, 3),
+        rgb[h - width:, :, :3].reshape(-1, 3),
+        rgb[width:h - width, :width, :3].reshape(-1, 3),
+        rgb[width:h - width, w - width:, :3].reshape(-1, 3),
+    ])
+    return np.median(ring, axis=0).astype(np.uint8)
+
+
+def color_distance(rgb: np.ndarray, color: np.ndarray) -> np.ndarray:
+    """L1 (sum of per-channel) distance to `color` as uint16, without widening the image"""
+    distance = np.zeros(rgb.shape[:2], dtype=np.uint16)
+    for index in range(3):
+        channel = rgb[:, :, index]
+        value = np.uint8(color[index])
+        # max - min never wraps, so the difference stays in uint8
+        distance += np.maximum(channel, value) - np.minimum(channel, value)
+    return distance
+
+
+def background_mask(rgb: np.ndarray, tolerance: int = MATTE_TOLERANCE) -> np.ndarray:
+    """Pixels close to the border colour that are 4-connected to the image border"""
+    from scipy import ndimage
+
+    close = color_distance(rgb, border_color(rgb)) <= tolerance
+    labels, count = ndimage.label(close)
+    if count == 0:
+        return close
+
+    edges = np.concatenate([labels[0], labels[-1], labels[:, 0], labels[:, -1]])
+    keep = np.zeros(count + 1, dtype=bool)
+    keep[edges] = True
+    keep[0] = False
+    return keep[labels]
+
+
+def compute_alpha_border(rgba: np.ndarray, tolerance: int = MATTE_TOLERANCE,
+                         feather: int = MATTE_FEATHER) -> np.ndarray:
+    """
+    Compute a uint8 alpha channel that removes the border-connected backdrop.
+
+    Foreground pixels ramp from transparent to opaque over `feather + 1`
+    pixels from the backdrop, using a chessboard distance transform (exact
+    Euclidean distances cost ~8x more and make no visible difference over a
+    two or three pixel ramp).
+    """
+    with span("segment"):
+        background = background_mask(rgba, tolerance)
+    if not background.any():
+        return np.full(background.shape, 255, dtype=np.uint8)
+    if feather <= 0:
+        return np.where(background, np.uint8(0), np.uint8(255))
+
+    with span("feather"):
+        from scipy import ndimage
+
+        distance = ndimage.distance_transform_cdt(~background, metric="chessboard")
+        np.minimum(distance, feather + 1, out=distance)
+        distance *= 255
+        distance //= feather + 1
+        return distance.astype(np.uint8)
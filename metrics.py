@@ -0,0 +1,343 @@
+"""
+In-process metrics, structured request logs and a slow-request profiler.
+
+Counters, gauges and histograms are kept in memory and rendered in the
+Prometheus text exposition format for `/metrics`. Hot-path code wraps each
+stage in `span(stage)`, which feeds a per-stage latency histogram and, when
+called on a request thread, the per-request breakdown in that request's JSON
+log line.
+
+The sampling profiler is opt-in (`PROFILE_SLOW_MS`). While enabled, a daemon
+thread walks the stacks of request threads every `PROFILE_INTERVAL_MS`, and
+requests slower than the threshold dump their samples as collapsed stacks
+(`frame;frame;frame count`) that flamegraph.pl and speedscope read directly.
+Only the request thread is sampled; work handed to pools shows up as a wait.
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import Counter as _Tally
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+REQUEST_LOG = os.getenv("REQUEST_LOG", "json").lower()
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "prompt2poster-profiles"))
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing count per label set"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in sorted(self._values.items())]
+
+
+class Gauge(Counter):
+    """Value that goes up and down, or is set at scrape time"""
+
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels: str):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    """Cumulative bucketed observations per label set"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            # Per-bucket counts, then +Inf, then the running sum
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * (len(self.buckets) + 2)
+            row[index] += 1
+            row[-1] += value
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, row in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), row):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                labels = _format_labels(self.labelnames, key, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {row[-1]!r}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Ordered set of metrics plus callbacks that refresh gauges before a scrape"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect: Callable[[], None]):
+        self._collectors.append(collect)
+
+    def render(self) -> str:
+        for collect in self._collectors:
+            collect()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "p2p_request_duration_seconds", "HTTP request latency", ("route", "method", "status")))
+REQUESTS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "p2p_requests_in_flight", "HTTP requests currently being served", ("route",)))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "p2p_stage_duration_seconds", "Time spent in each hot-path stage", ("route", "stage")))
+HF_SECONDS = REGISTRY.register(Histogram(
+    "p2p_hf_request_duration_seconds", "Hugging Face API attempts by response status", ("status",)))
+STARTUP_SECONDS = REGISTRY.register(Gauge(
+    "p2p_startup_seconds", "Seconds from process start to each startup phase", ("phase",)))
+
+
+def _process_start_time() -> float:
+    """Wall-clock start of this process (from /proc on Linux, else first import of this module)"""
+    try:
+        with open("/proc/self/stat") as f:
+            # Fields after the parenthesised command name; starttime is field 22 overall
+            ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - uptime + ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return time.time()
+
+
+# Forked workers inherit the master's value, so their phases count from server launch
+PROCESS_STARTED = _process_start_time()
+_first_request_seen = False
+
+
+def record_startup(phase: str) -> float:
+    """Record and report how long after process start `phase` was reached"""
+    elapsed = max(0.0, time.time() - PROCESS_STARTED)
+    STARTUP_SECONDS.set(elapsed, phase=phase)
+    print(f"[STARTUP] {phase} after {elapsed:.3f}s (pid {os.getpid()})", flush=True)
+    return elapsed
+
+
+class RequestState:
+    """Per-request timing context, owned by the thread serving the request"""
+
+    def __init__(self, route: str, method: str, path: str):
+        self.id = uuid.uuid4().hex[:16]
+        self.route = route
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.spans: Dict[str, float] = {}
+        self.samples: "_Tally[str]" = _Tally()
+        self.thread_id = threading.get_ident()
+
+
+_local = threading.local()
+
+
+def current_request() -> Optional[RequestState]:
+    return getattr(_local, "request", None)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time a block as `stage`; nested and repeated spans are summed per stage"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        state = current_request()
+        STAGE_SECONDS.observe(elapsed, route=state.route if state else "background", stage=stage)
+        if state is not None:
+            state.spans[stage] = state.spans.get(stage, 0.0) + elapsed
+
+
+def begin_request(route: str, method: str, path: str) -> RequestState:
+    global _first_request_seen
+    if not _first_request_seen:
+        _first_request_seen = True
+        record_startup("first_request")
+    state = RequestState(route, method, path)
+    _local.request = state
+    REQUESTS_IN_FLIGHT.inc(route=route)
+    if PROFILE_SLOW_MS > 0:
+        _PROFILER.watch(state)
+    return state
+
+
+def end_request(state: RequestState, status: int) -> float:
+    """Record the request's latency, log it as one JSON line and dump a profile if slow; returns seconds"""
+    elapsed = time.perf_counter() - state.started
+    if getattr(_local, "request", None) is state:
+        _local.request = None
+    REQUESTS_IN_FLIGHT.dec(route=state.route)
+    REQUEST_SECONDS.observe(elapsed, route=state.route, method=state.method, status=str(status))
+
+    profile = None
+    if PROFILE_SLOW_MS > 0:
+        _PROFILER.unwatch(state)
+        if elapsed * 1000 >= PROFILE_SLOW_MS and state.samples:
+            profile = _dump_profile(state)
+
+    if REQUEST_LOG == "json":
+        record = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime()),
+            "event": "request",
+            "request_id": state.id,
+            "method": state.method,
+            "route": state.route,
+            "path": state.path,
+            "status": status,
+            "duration_ms": round(elapsed * 1000, 2),
+            "spans_ms": {stage: round(seconds * 1000, 2) for stage, seconds in state.spans.items()},
+        }
+        if profile:
+            record["profile"] = profile
+        print(json.dumps(record, separators=(",", ":")), flush=True)
+    return elapsed
+
+
+def _dump_profile(state: RequestState) -> Optional[str]:
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        route = state.route.strip("/").replace("/", "_").replace("<", "").replace(">", "") or "root"
+        path = os.path.join(PROFILE_DIR, f"{int(time.time())}-{route}-{state.id}.folded")
+        with open(path, "w") as f:
+            for stack, count in state.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+    except OSError as e:
+        print(f"[Metrics] Could not write profile: {str(e)}")
+        return None
+
+
+class _SamplingProfiler:
+    """Daemon thread that samples the stacks of watched request threads"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._watched: Dict[int, RequestState] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def watch(self, state: RequestState):
+        with self._lock:
+            self._watched[state.thread_id] = state
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+
+    def unwatch(self, state: RequestState):
+        with self._lock:
+            if self._watched.get(state.thread_id) is state:
+                del self._watched[state.thread_id]
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                watched = list(self._watched.items())
+            if not watched:
+                continue
+            frames = sys._current_frames()
+            for thread_id, state in watched:
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    state.samples[_collapse(frame)] += 1
+
+
+def _collapse(frame) -> str:
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+_PROFILER = _SamplingProfiler(PROFILE_INTERVAL_MS / 1000)
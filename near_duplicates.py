@@ -0,0 +1,202 @@
+"""
+Perceptual-hash index of processed uploads, for reusing cutouts of near duplicates.
+
+The same packshot arrives as re-exported JPEGs, resized copies and so on,
+each with a different SHA-256, so the exact result cache misses all of them.
+Every image whose cutout is cached gets a fingerprint here: a 64-bit
+difference hash (dHash), a 64-bit DCT hash (pHash) and its aspect ratio.
+An upload whose hashes are both within PHASH_MAX_DISTANCE bits of an indexed
+image, at the same aspect ratio, is a near duplicate and can reuse that
+image's alpha mask, rescaled, instead of being processed again.
+
+Fingerprints live in preallocated NumPy columns (about 60 bytes per entry) in
+a ring that overwrites the oldest entries past PHASH_INDEX_SIZE; a lookup is
+one vectorized XOR + popcount over the dHash column, then the pHash check on
+the few candidates left. Entries are tagged with the backend that made the
+cutout, and lookups only match the backend asked for. The index is per
+process, like the memory tier of the result cache, and entries whose cutout
+was evicted are dropped when found.
+"""
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from uploads import decode_image
+
+PHASH_INDEX_SIZE = int(os.getenv("PHASH_INDEX_SIZE", "100000"))
+PHASH_MAX_DISTANCE = int(os.getenv("PHASH_MAX_DISTANCE", "4"))
+# Relative aspect ratio difference still treated as the same framing
+PHASH_ASPECT_TOLERANCE = float(os.getenv("PHASH_ASPECT_TOLERANCE", "0.02"))
+# A stored mask is stretched to at most this many times its width
+PHASH_MAX_UPSCALE = float(os.getenv("PHASH_MAX_UPSCALE", "2"))
+
+# Decode size for hashing: JPEGs are scaled down inside libjpeg, and the aspect stays accurate
+FINGERPRINT_PIXELS = 256 * 256
+_DCT_SIZE = 32
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)[:, None]
+    matrix = np.cos(np.pi * (2 * np.arange(n)[None, :] + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+_DCT = _dct_matrix(_DCT_SIZE)
+
+if hasattr(np, "bitwise_count"):
+    def _popcount(values: np.ndarray) -> np.ndarray:
+        return np.bitwise_count(values)
+else:  # NumPy < 2.0
+    _BYTE_BITS = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def _popcount(values: np.ndarray) -> np.ndarray:
+        return _BYTE_BITS[values.view(np.uint8)].reshape(-1, 8).sum(axis=1, dtype=np.uint8)
+
+
+def _pack(bits: np.ndarray) -> int:
+    return int(np.packbits(bits.ravel()).view(">u8")[0])
+
+
+@dataclass(frozen=True)
+class Fingerprint:
+    dhash: int
+    phash: int
+    # width / height of the image as uploaded
+    aspect: float
+
+
+@dataclass(frozen=True)
+class NearMatch:
+    """An indexed image close enough to reuse"""
+    key: str
+    distance: int
+    size: Tuple[int, int]
+
+
+def fingerprint_image(image: Image.Image) -> Fingerprint:
+    """dHash and pHash of an image; transparent areas count as white"""
+    aspect = image.width / image.height
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        white = Image.new("RGBA", image.size, (255, 255, 255, 255))
+        image = Image.alpha_composite(white, image)
+    gray = image.convert("L")
+
+    small = np.asarray(gray.resize((9, 8), Image.BOX), dtype=np.int16)
+    dhash = _pack(small[:, 1:] > small[:, :-1])
+
+    pixels = np.asarray(gray.resize((_DCT_SIZE, _DCT_SIZE), Image.BOX), dtype=np.float64)
+    low = (_DCT @ pixels @ _DCT.T)[:8, :8]
+    # The DC term only encodes overall brightness
+    phash = _pack(low > np.median(low.ravel()[1:]))
+    return Fingerprint(dhash, phash, aspect)
+
+
+def fingerprint(image_bytes) -> Fingerprint:
+    """Fingerprint of an encoded upload (bytes, memoryview or mmap); raises if it does not decode"""
+    return fingerprint_image(decode_image(image_bytes, FINGERPRINT_PIXELS))
+
+
+class NearDuplicateIndex:
+    """Fixed-capacity ring of fingerprints, each pointing at a cached cutout"""
+
+    def __init__(self, capacity: int = PHASH_INDEX_SIZE, max_distance: int = PHASH_MAX_DISTANCE,
+                 aspect_tolerance: float = PHASH_ASPECT_TOLERANCE):
+        self.capacity = max(0, capacity)
+        self.max_distance = max_distance
+        self.aspect_tolerance = aspect_tolerance
+        self._dhash = np.zeros(self.capacity, dtype=np.uint64)
+        self._phash = np.zeros(self.capacity, dtype=np.uint64)
+        # NaN marks a free or discarded slot; it never compares within tolerance
+        self._aspect = np.full(self.capacity, np.nan, dtype=np.float32)
+        self._size = np.zeros((self.capacity, 2), dtype=np.uint32)
+        # Small ids for backend names, so a lookup can be limited to one backend
+        self._backend = np.zeros(self.capacity, dtype=np.uint8)
+        self._backend_ids: Dict[str, int] = {}
+        # Result cache keys are SHA-256 hex digests, stored as raw bytes
+        self._keys = np.zeros((self.capacity, 32), dtype=np.uint8)
+        self._count = 0
+        self._next = 0
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {"lookups": 0, "matches": 0, "adds": 0, "overwrites": 0, "discards": 0,
+                                      "fingerprint_errors": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def fingerprint(self, image_bytes) -> Optional[Fingerprint]:
+        """Fingerprint of an upload, or None (counted and logged) if it can't be decoded"""
+        try:
+            return fingerprint(image_bytes)
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            with self._lock:
+                self.stats["fingerprint_errors"] += 1
+            print(f"[Near Duplicates] Could not fingerprint upload: {str(e)}")
+            return None
+
+    def add(self, fp: Fingerprint, key: str, size: Tuple[int, int], backend: str):
+        """Index the cutout `backend` made and cached under `key`, for an image with fingerprint `fp`"""
+        if not self.enabled:
+            return
+        with self._lock:
+            backend_id = self._backend_ids.setdefault(backend, len(self._backend_ids) + 1)
+            slot = self._next
+            if self._count == self.capacity:
+                self.stats["overwrites"] += 1
+            else:
+                self._count += 1
+            self._dhash[slot] = fp.dhash
+            self._phash[slot] = fp.phash
+            self._aspect[slot] = fp.aspect
+            self._size[slot] = size
+            self._backend[slot] = backend_id
+            self._keys[slot] = np.frombuffer(bytes.fromhex(key), dtype=np.uint8)
+            self._next = (slot + 1) % self.capacity
+            self.stats["adds"] += 1
+
+    def lookup(self, fp: Fingerprint, backend: str) -> Optional[NearMatch]:
+        """The closest image indexed for `backend` within the distance and aspect limits, if any"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            self.stats["lookups"] += 1
+            backend_id = self._backend_ids.get(backend)
+            if backend_id is None:
+                return None
+            count = self._count
+            dhash = _popcount(self._dhash[:count] ^ np.uint64(fp.dhash))
+            candidates = np.flatnonzero(dhash <= self.max_distance)
+            if candidates.size == 0:
+                return None
+            phash = _popcount(self._phash[candidates] ^ np.uint64(fp.phash))
+            aspect = np.abs(self._aspect[candidates] / fp.aspect - 1)
+            close = ((phash <= self.max_distance) & (aspect <= self.aspect_tolerance)
+                     & (self._backend[candidates] == backend_id))
+            if not close.any():
+                return None
+            distance = dhash[candidates].astype(np.int32) + phash
+            best = int(np.flatnonzero(close)[np.argmin(distance[close])])
+            slot = int(candidates[best])
+            self.stats["matches"] += 1
+            width, height = (int(v) for v in self._size[slot])
+            return NearMatch(self._keys[slot].tobytes().hex(), int(distance[best]), (width, height))
+
+    def discard(self, key: str):
+        """Forget every entry pointing at `key`, e.g. once its cutout is no longer cached"""
+        if not self.enabled:
+            return
+        raw = np.frombuffer(bytes.fromhex(key), dtype=np.uint8)
+        with self._lock:
+            slots = np.flatnonzero((self._keys[:self._count] == raw).all(axis=1))
+            self._aspect[slots] = np.nan
+            self.stats["discards"] += len(slots)
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.stats, entries=self._count, capacity=self.capacity)
@@ -0,0 +1,288 @@
+"""
+Retail preset registry, loaded from JSON/YAML files and compiled once.
+
+Every `*.json`, `*.yaml` or `*.yml` file under PRESET_DIR (subdirectories
+included, e.g. one per region) maps preset keys to definitions:
+
+    {"tesco_minimal": {"name": "Tesco Minimal", "base_prompt": "...",
+                       "negative_prompt": "...", "color_palette": ["#FFFFFF", ...],
+                       "layout_rules": {...}, "text_rules": {...},
+                       "subhead": "Available Now", "cta_text": "Shop Now",
+                       "explanation": "..."}}
+
+Definitions are validated at load time and compiled into immutable
+RetailPreset objects carrying everything a request needs precomputed: parsed
+colours, the explainability payload, subhead/CTA copy and the public summary.
+The registry re-scans the directory at most every PRESET_RELOAD_INTERVAL
+seconds when it is read and swaps in a new snapshot if any file changed; a
+reload that fails validation is logged and the previous snapshot kept.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections.abc import Mapping
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from textures import GRADIENT_STRENGTH, hex_to_rgb
+
+try:
+    import yaml
+except ImportError:  # YAML preset files need PyYAML; JSON ones always load
+    yaml = None
+
+PRESET_DIR = os.getenv("PRESET_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "presets"))
+PRESET_DEFAULT = os.getenv("PRESET_DEFAULT", "tesco_minimal")
+PRESET_RELOAD_INTERVAL = float(os.getenv("PRESET_RELOAD_INTERVAL", "2"))
+
+PRESET_EXTENSIONS = (".json", ".yaml", ".yml")
+BACKGROUND_STYLES = ("solid",) + tuple(GRADIENT_STRENGTH)
+HEADLINE_POSITIONS = ("top", "center")
+
+# Shared by every preset's explainability payload
+RETAIL_RULES_APPLIED = (
+    "Clean layouts enforced",
+    "Product visibility maintained",
+    "Safe text margins applied",
+    "Limited color palette",
+    "No artistic fantasy styles",
+    "Professional retail aesthetics",
+)
+
+_HEX_COLOR = re.compile(r"^#[0-9A-Fa-f]{6}$")
+
+
+class PresetError(ValueError):
+    """A preset file is unreadable or a definition fails validation"""
+
+
+@dataclass(frozen=True)
+class RetailPreset:
+    """Tesco Retail Style Preset Configuration, compiled and read-only"""
+    key: str
+    name: str
+    base_prompt: str
+    negative_prompt: str
+    color_palette: Tuple[str, ...]
+    palette_rgb: Tuple[Tuple[int, int, int], ...]
+    layout_rules: Mapping
+    text_rules: Mapping
+    explanation: str
+    subhead: str
+    cta_text: str
+    # generate_explanation_data() minus the per-request user_input
+    explanation_data: Mapping
+    # The entry served by /retail-presets
+    summary: Mapping
+    source: str
+
+
+@dataclass(frozen=True)
+class PresetSnapshot:
+    """One consistent load of every preset file"""
+    presets: Mapping
+    default: RetailPreset
+    # /retail-presets body and its strong validator
+    listing: bytes
+    etag: str
+    loaded_at: float
+
+
+def _require(definition: Dict, field: str, kind, where: str):
+    value = definition.get(field)
+    if not isinstance(value, kind) or isinstance(value, bool) or (isinstance(value, str) and not value.strip()):
+        names = kind.__name__ if isinstance(kind, type) else " or ".join(k.__name__ for k in kind)
+        raise PresetError(f"{where}: '{field}' must be a non-empty {names}")
+    return value
+
+
+def _number(rules: Dict, field: str, low: float, high: float, where: str, integer: bool = False) -> float:
+    value = _require(rules, field, int if integer else (int, float), where)
+    if not low <= value <= high:
+        raise PresetError(f"{where}: '{field}' must be between {low} and {high}, got {value}")
+    return value
+
+
+def compile_preset(key: str, definition: Any, source: str) -> RetailPreset:
+    """Validate one preset definition and precompute its derived data"""
+    where = f"{source}: preset '{key}'"
+    if not isinstance(definition, dict):
+        raise PresetError(f"{where} must be a mapping")
+
+    name = _require(definition, "name", str, where)
+    palette = _require(definition, "color_palette", list, where)
+    bad = [color for color in palette if not isinstance(color, str) or not _HEX_COLOR.match(color)]
+    if not palette or bad:
+        raise PresetError(f"{where}: 'color_palette' must be a non-empty list of #RRGGBB colours, got {bad}")
+
+    layout = dict(_require(definition, "layout_rules", dict, where))
+    if layout.get("background_style") not in BACKGROUND_STYLES:
+        raise PresetError(f"{where}: layout_rules.background_style must be one of {', '.join(BACKGROUND_STYLES)}")
+    _number(layout, "max_elements", 1, 20, f"{where} layout_rules", integer=True)
+    _number(layout, "product_visibility", 0.05, 1.25, f"{where} layout_rules")
+    _number(layout, "text_margins", 0, 0.45, f"{where} layout_rules")
+
+    text = dict(_require(definition, "text_rules", dict, where))
+    if text.get("headline_position") not in HEADLINE_POSITIONS:
+        raise PresetError(f"{where}: text_rules.headline_position must be one of {', '.join(HEADLINE_POSITIONS)}")
+    _require(text, "cta_style", str, f"{where} text_rules")
+    _number(text, "max_text_length", 1, 200, f"{where} text_rules", integer=True)
+
+    explanation = _require(definition, "explanation", str, where)
+    color_palette = tuple(color.upper() for color in palette)
+    explanation_data = MappingProxyType({
+        "retail_preset": name,
+        "retail_rules_applied": RETAIL_RULES_APPLIED,
+        "color_choices": color_palette,
+        "layout_density": f"Max {layout['max_elements']} elements",
+        "text_placement": text["headline_position"],
+        "design_rationale": explanation,
+        "compliance_score": "Tesco Brand Compliant",
+    })
+    return RetailPreset(
+        key=key,
+        name=name,
+        base_prompt=_require(definition, "base_prompt", str, where),
+        negative_prompt=_require(definition, "negative_prompt", str, where),
+        color_palette=color_palette,
+        palette_rgb=tuple(hex_to_rgb(color) for color in color_palette),
+        layout_rules=MappingProxyType(layout),
+        text_rules=MappingProxyType(text),
+        explanation=explanation,
+        subhead=definition.get("subhead") or "Available Now",
+        cta_text=definition.get("cta_text") or "Shop Now",
+        explanation_data=explanation_data,
+        summary=MappingProxyType({"name": name, "color_palette": color_palette, "explanation": explanation}),
+        source=source,
+    )
+
+
+def _preset_files(directory: str) -> List[str]:
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        paths.extend(os.path.join(root, name) for name in sorted(files) if name.endswith(PRESET_EXTENSIONS))
+    return paths
+
+
+def _read(path: str) -> Any:
+    with open(path, "rb") as f:
+        raw = f.read()
+    if path.endswith(".json"):
+        try:
+            return json.loads(raw)
+        except ValueError as e:
+            raise PresetError(f"{path}: {str(e)}")
+    if yaml is None:
+        raise PresetError(f"{path}: PyYAML is not installed; use JSON or pip install pyyaml")
+    try:
+        return yaml.safe_load(raw)
+    except yaml.YAMLError as e:
+        raise PresetError(f"{path}: {str(e)}")
+
+
+def load_presets(directory: str, default: str = PRESET_DEFAULT) -> PresetSnapshot:
+    """Load, validate and compile every preset file under `directory`"""
+    paths = _preset_files(directory)
+    if not paths:
+        raise PresetError(f"no preset files ({', '.join(PRESET_EXTENSIONS)}) in {directory}")
+
+    presets: Dict[str, RetailPreset] = {}
+    for path in paths:
+        source = os.path.relpath(path, directory)
+        document = _read(path)
+        if not isinstance(document, dict):
+            raise PresetError(f"{source}: expected a mapping of preset keys to definitions")
+        for key, definition in document.items():
+            key = str(key).lower()
+            if key in presets:
+                raise PresetError(f"{source}: preset '{key}' is already defined in {presets[key].source}")
+            presets[key] = compile_preset(key, definition, source)
+
+    if default not in presets:
+        raise PresetError(f"default preset '{default}' is not defined in {directory}")
+    listing = json.dumps({key: dict(preset.summary) for key, preset in presets.items()},
+                         sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return PresetSnapshot(
+        presets=MappingProxyType(presets),
+        default=presets[default],
+        listing=listing,
+        etag=hashlib.sha256(listing).hexdigest()[:32],
+        loaded_at=time.time(),
+    )
+
+
+class PresetRegistry(Mapping):
+    """Read-only mapping of preset key to RetailPreset that follows the files on disk"""
+
+    def __init__(self, directory: str = PRESET_DIR, default: str = PRESET_DEFAULT,
+                 reload_interval: float = PRESET_RELOAD_INTERVAL):
+        self.directory = directory
+        self.default_key = default
+        self.reload_interval = reload_interval
+        self.reloads = 0
+        self.reload_errors = 0
+        self._lock = threading.Lock()
+        self._fingerprint = self._scan()
+        self._snapshot = load_presets(directory, default)
+        self._checked = time.monotonic()
+        print(f"[Presets] Loaded {len(self._snapshot.presets)} presets from {directory}")
+
+    def _scan(self) -> Tuple:
+        entries = []
+        for path in _preset_files(self.directory):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((path, stat.st_mtime_ns, stat.st_size))
+        return tuple(entries)
+
+    def snapshot(self) -> PresetSnapshot:
+        """The current snapshot, reloading first if the files changed since the last check"""
+        if self.reload_interval >= 0 and time.monotonic() - self._checked >= self.reload_interval:
+            # One thread checks; the rest keep using the current snapshot meanwhile
+            if self._lock.acquire(blocking=False):
+                try:
+                    self._checked = time.monotonic()
+                    self._maybe_reload()
+                finally:
+                    self._lock.release()
+        return self._snapshot
+
+    def _maybe_reload(self):
+        fingerprint = self._scan()
+        if fingerprint == self._fingerprint:
+            return
+        self._fingerprint = fingerprint
+        try:
+            snapshot = load_presets(self.directory, self.default_key)
+        except (PresetError, OSError) as e:
+            self.reload_errors += 1
+            print(f"[Presets] Reload failed, keeping the previous presets: {str(e)}")
+            return
+        self._snapshot = snapshot
+        self.reloads += 1
+        print(f"[Presets] Reloaded {len(snapshot.presets)} presets (etag {snapshot.etag})")
+
+    def stats(self) -> Dict[str, float]:
+        return {"presets": len(self._snapshot.presets), "reloads": self.reloads,
+                "reload_errors": self.reload_errors, "loaded_at": self._snapshot.loaded_at}
+
+    def resolve(self, key: Optional[str]) -> RetailPreset:
+        """Preset by key (case-insensitive), falling back to the default preset"""
+        snapshot = self.snapshot()
+        return snapshot.presets.get((key or "").lower(), snapshot.default)
+
+    def __getitem__(self, key: str) -> RetailPreset:
+        return self.snapshot().presets[key.lower()]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.snapshot().presets)
+
+    def __len__(self) -> int:
+        return len(self.snapshot().presets)
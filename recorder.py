@@ -0,0 +1,123 @@
+"""
+Opt-in traffic recorder for replay load tests.
+
+With REQUEST_RECORD set to a file path, every request is appended to it as
+one JSON line: its time, endpoint, method, path, the replayable form fields,
+a JSON body when small, each upload's size, SHA-256, content type and pixel
+size, the response status and latency. Uploaded bytes themselves are never
+written; `benchmarks/replay.py` stands in an image of the same dimensions
+(or a real file from a corpus named by hash) when it replays the log.
+
+The file is opened in append mode per process, so pre-forked workers can
+share one log; each record is a single write.
+"""
+import hashlib
+import json
+import os
+import random
+import threading
+from typing import Any, Dict, List, Optional
+
+from PIL import Image
+
+REQUEST_RECORD = os.getenv("REQUEST_RECORD", "")
+REQUEST_RECORD_SAMPLE = float(os.getenv("REQUEST_RECORD_SAMPLE", "1"))
+
+# Form fields that shape the work a request does, and are safe to keep
+RECORD_FIELDS = ("prompt", "ratio", "ratios", "retail_preset", "format", "texture_mode",
+                 "output", "remove_background")
+RECORD_MAX_JSON_BYTES = 64 * 1024
+_HASH_CHUNK = 1024 * 1024
+
+
+def describe_upload(field: str, upload) -> Dict[str, Any]:
+    """Size, SHA-256 and image dimensions of an uploaded file, leaving its stream where it was"""
+    stream = upload.stream
+    position = stream.tell()
+    stream.seek(0)
+    digest = hashlib.sha256()
+    size = 0
+    for chunk in iter(lambda: stream.read(_HASH_CHUNK), b""):
+        digest.update(chunk)
+        size += len(chunk)
+    record = {"field": field, "filename": upload.filename or "", "content_type": upload.mimetype,
+              "size": size, "sha256": digest.hexdigest()}
+    try:
+        stream.seek(0)
+        # Only the header is parsed
+        with Image.open(stream) as image:
+            record["width"], record["height"] = image.size
+    except Exception:
+        pass
+    stream.seek(position)
+    return record
+
+
+class RequestRecorder:
+    """Appends one JSON line per sampled request to a shared log file"""
+
+    def __init__(self, path: str = REQUEST_RECORD, sample: float = REQUEST_RECORD_SAMPLE):
+        self.path = path
+        self.sample = sample
+        self.recorded = 0
+        self._fd: Optional[int] = None
+        self._pid = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def wants(self) -> bool:
+        """Decide, once per request, whether it is recorded"""
+        return self.enabled and (self.sample >= 1 or random.random() < self.sample)
+
+    def capture(self, request, read_body: bool = True) -> Dict[str, Any]:
+        """
+        The replayable parts of a Flask request; call before the response is sent.
+
+        Pass read_body=False for requests rejected before their body was read,
+        so recording never parses an upload the server refused.
+        """
+        record: Dict[str, Any] = {
+            "method": request.method,
+            "endpoint": request.url_rule.rule if request.url_rule is not None else "unmatched",
+            "path": request.path,
+            "content_length": request.content_length,
+        }
+        if not read_body:
+            return record
+        record["params"] = {name: request.form[name] for name in RECORD_FIELDS if name in request.form}
+        uploads: List[Dict[str, Any]] = []
+        for field, upload in request.files.items(multi=True):
+            try:
+                uploads.append(describe_upload(field, upload))
+            except (OSError, ValueError):
+                # Closed or unseekable stream; keep what is known
+                uploads.append({"field": field, "filename": upload.filename or ""})
+        if uploads:
+            record["uploads"] = uploads
+        if request.is_json and (request.content_length or 0) <= RECORD_MAX_JSON_BYTES:
+            body = request.get_json(silent=True)
+            if body is not None:
+                record["json"] = body
+        return record
+
+    def write(self, record: Dict[str, Any]):
+        line = (json.dumps(record, separators=(",", ":"), default=str) + "\n").encode("utf-8")
+        with self._lock:
+            try:
+                if self._fd is None or self._pid != os.getpid():
+                    # Reopen after a fork so each worker has its own append descriptor
+                    self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                    self._pid = os.getpid()
+                os.write(self._fd, line)
+                self.recorded += 1
+            except OSError as e:
+                print(f"[Recorder] Could not write {self.path}: {str(e)}")
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None and self._pid == os.getpid():
+                os.close(self._fd)
+            self._fd = None
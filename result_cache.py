@@ -0,0 +1,172 @@
+"""
+Two-tier, content-addressed cache for background removal results.
+
+Results are keyed by the SHA-256 of the uploaded bytes plus the backend that
+produced them. A bounded in-memory LRU sits in front of a size-capped directory
+on disk; both tiers evict least-recently-used entries first.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+RESULT_CACHE_MEMORY_BYTES = int(os.getenv("RESULT_CACHE_MEMORY_BYTES", str(64 * 1024 * 1024)))
+RESULT_CACHE_DISK_BYTES = int(os.getenv("RESULT_CACHE_DISK_BYTES", str(512 * 1024 * 1024)))
+RESULT_CACHE_DIR = os.getenv(
+    "RESULT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "prompt2poster-cache")
+)
+
+
+def cache_key(image_digest: str, backend: str) -> str:
+    """Combine an upload's SHA-256 and the backend name into a filename-safe key"""
+    return hashlib.sha256(f"{backend}\0{image_digest}".encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """Memory + disk LRU of encoded cutouts with hit/miss/eviction counters"""
+
+    def __init__(self, directory: Optional[str] = RESULT_CACHE_DIR,
+                 memory_bytes: int = RESULT_CACHE_MEMORY_BYTES,
+                 disk_bytes: int = RESULT_CACHE_DISK_BYTES):
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_used = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_used = 0
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+        }
+        if self.directory and self.disk_bytes > 0:
+            self._load_disk_index()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.png")
+
+    def _load_disk_index(self):
+        """Rebuild the disk LRU from what previous runs left behind, oldest first"""
+        entries = []
+        if os.path.isdir(self.directory):
+            for root, _, files in os.walk(self.directory):
+                for name in files:
+                    if not name.endswith(".png"):
+                        continue
+                    try:
+                        st = os.stat(os.path.join(root, name))
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, name[:-4], st.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_used += size
+        with self._lock:
+            self._evict_disk()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return cached bytes for `key`, promoting disk hits into memory"""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return data
+            indexed = key in self._disk
+
+        # Other worker processes share the directory, so look even if unindexed
+        if self.directory and self.disk_bytes > 0:
+            try:
+                with open(self._path(key), "rb") as fh:
+                    data = fh.read()
+                os.utime(self._path(key))
+            except OSError:
+                data = None
+
+        with self._lock:
+            if data is None:
+                if indexed:
+                    self._forget_disk(key)
+                self.stats["misses"] += 1
+                return None
+            if key in self._disk:
+                self._disk.move_to_end(key)
+            else:
+                self._disk[key] = len(data)
+                self._disk_used += len(data)
+            self.stats["disk_hits"] += 1
+            self._remember(key, data)
+            self._evict_disk()
+        return data
+
+    def put(self, key: str, data: bytes):
+        """Store `data` in both tiers"""
+        written = False
+        if self.directory and 0 < len(data) <= self.disk_bytes:
+            path = self._path(key)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+                with os.fdopen(fd, "wb") as fh:
+                    fh.write(data)
+                os.replace(tmp_path, path)
+                written = True
+            except OSError as e:
+                print(f"[Result Cache] Disk write failed: {str(e)}")
+
+        with self._lock:
+            self.stats["stores"] += 1
+            self._remember(key, data)
+            if written:
+                self._forget_disk(key)
+                self._disk[key] = len(data)
+                self._disk_used += len(data)
+                self._evict_disk()
+
+    def snapshot(self) -> Dict[str, int]:
+        """Counters plus current tier occupancy"""
+        with self._lock:
+            return dict(
+                self.stats,
+                memory_entries=len(self._memory),
+                memory_bytes=self._memory_used,
+                disk_entries=len(self._disk),
+                disk_bytes=self._disk_used,
+            )
+
+    # The helpers below expect the lock to be held
+
+    def _remember(self, key: str, data: bytes):
+        if len(data) > self.memory_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_used -= len(previous)
+        self._memory[key] = data
+        self._memory_used += len(data)
+        while self._memory_used > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_used -= len(evicted)
+            self.stats["memory_evictions"] += 1
+
+    def _forget_disk(self, key: str):
+        size = self._disk.pop(key, None)
+        if size is not None:
+            self._disk_used -= size
+
+    def _evict_disk(self):
+        while self._disk_used > self.disk_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_used -= size
+            self.stats["disk_evictions"] += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
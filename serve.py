@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Production entry point: a pre-forking server around the app factory.
+
+The master imports the app, warms the texture and font caches, binds the
+listening socket and then forks SERVE_WORKERS workers (one per core by
+default). Workers inherit the warmed caches copy-on-write and share the
+socket, each serving requests on a small thread pool. Dead workers are
+replaced; SIGTERM or Ctrl+C stops accepting, lets in-flight requests and
+queued jobs finish for up to SERVE_GRACE seconds, then exits.
+
+    python serve.py [--workers 4] [--threads 8] [--port 5000]
+
+Any worker can answer for any other: job state and results are shared
+through JOB_STATE_DIR (see jobs.py), and /texture URLs name the preset, ratio
+and profile so a worker that never rendered a texture renders it on demand.
+Metrics, /cache/stats and the in-memory caches stay per worker.
+
+On platforms without fork (Windows) a single threaded worker is used. Any
+WSGI server can also use the factory, e.g. gunicorn "app:create_app(warm=True)".
+"""
+import argparse
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+from metrics import record_startup
+
+SERVE_HOST = os.getenv("SERVE_HOST", "0.0.0.0")
+SERVE_WORKERS = int(os.getenv("SERVE_WORKERS") or os.cpu_count() or 1)
+SERVE_THREADS = int(os.getenv("SERVE_THREADS", "8"))
+SERVE_GRACE = float(os.getenv("SERVE_GRACE", "30"))
+SERVE_BACKLOG = int(os.getenv("SERVE_BACKLOG", "1024"))
+
+
+def _make_server(wsgi_app, sock: socket.socket, threads: int):
+    """A threaded werkzeug server on an already-bound socket, with bounded concurrency"""
+    from werkzeug.serving import ThreadedWSGIServer, WSGIRequestHandler
+
+    class Handler(WSGIRequestHandler):
+        # Requests are already logged as JSON by the app
+        def log_request(self, code="-", size="-"):
+            pass
+
+    class Server(ThreadedWSGIServer):
+        # Join request threads on close instead of killing them mid-response
+        daemon_threads = False
+        block_on_close = True
+
+        def __init__(self):
+            super().__init__(SERVE_HOST, 0, wsgi_app, handler=Handler, fd=sock.fileno())
+            self._slots = threading.BoundedSemaphore(max(1, threads))
+
+        def process_request(self, request, client_address):
+            self._slots.acquire()
+            try:
+                super().process_request(request, client_address)
+            except Exception:
+                self._slots.release()
+                raise
+
+        def process_request_thread(self, request, client_address):
+            try:
+                super().process_request_thread(request, client_address)
+            finally:
+                self._slots.release()
+
+    return Server()
+
+
+def _serve(wsgi_app, sock: socket.socket, threads: int, grace: float, rendition_workers: int, master: int = 0):
+    """Worker body: serve until SIGTERM/SIGINT (or the master dies), then drain and return"""
+    import app as server_module
+
+    # Before this worker starts any thread, so the fork-based pool can't inherit a held lock
+    server_module.start_worker_pools(rendition_workers)
+    server = _make_server(wsgi_app, sock, threads)
+    stopping = threading.Event()
+
+    def stop(_signum, _frame):
+        if not stopping.is_set():
+            stopping.set()
+            # shutdown() blocks until serve_forever returns, so it needs its own thread
+            threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    def watch_master():
+        # A SIGKILLed master can't forward signals; don't outlive it as an orphan
+        while not stopping.wait(1.0):
+            if os.getppid() != master:
+                print(f"[SHUTDOWN] Master {master} is gone, stopping worker {os.getpid()}")
+                stop(None, None)
+
+    if master:
+        threading.Thread(target=watch_master, name="master-watch", daemon=True).start()
+    record_startup("listening")
+    server.serve_forever(poll_interval=0.5)
+
+    server.server_close()
+    server_module.shutdown(grace)
+    print(f"[SHUTDOWN] Worker {os.getpid()} stopped")
+
+
+def _spawn(wsgi_app, sock: socket.socket, threads: int, grace: float, rendition_workers: int) -> int:
+    master = os.getpid()
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            _serve(wsgi_app, sock, threads, grace, rendition_workers, master)
+        except BaseException as e:
+            print(f"[SHUTDOWN] Worker {os.getpid()} crashed: {e!r}")
+            code = 1
+        finally:
+            sys.stdout.flush()
+            os._exit(code)
+    return pid
+
+
+def _supervise(wsgi_app, sock: socket.socket, workers: int, threads: int, grace: float, rendition_workers: int):
+    children = {_spawn(wsgi_app, sock, threads, grace, rendition_workers) for _ in range(workers)}
+    stopping = threading.Event()
+
+    def stop(_signum, _frame):
+        stopping.set()
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    deadline = None
+    while children:
+        if stopping.is_set() and deadline is None:
+            deadline = time.monotonic() + grace + 5
+        if deadline is not None and time.monotonic() > deadline:
+            print(f"[SHUTDOWN] Killing {len(children)} worker(s) that outlived the grace period")
+            for pid in children:
+                os.kill(pid, signal.SIGKILL)
+            deadline = float("inf")
+
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            time.sleep(0.2)
+            continue
+        children.discard(pid)
+        if not stopping.is_set():
+            print(f"[SERVE] Worker {pid} exited with status {status}, starting a replacement")
+            children.add(_spawn(wsgi_app, sock, threads, grace, rendition_workers))
+    print("[SHUTDOWN] All workers stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "5000")))
+    parser.add_argument("--workers", type=int, default=SERVE_WORKERS)
+    parser.add_argument("--threads", type=int, default=SERVE_THREADS)
+    parser.add_argument("--grace", type=float, default=SERVE_GRACE)
+    args = parser.parse_args()
+
+    from app import create_app
+    record_startup("imported")
+    # Rendition pools are started per worker after the fork, not in the master
+    wsgi_app = create_app(warm=True, start_pools=False)
+
+    sock = socket.create_server((SERVE_HOST, args.port), backlog=SERVE_BACKLOG)
+    sock.set_inheritable(True)
+    workers = max(1, args.workers)
+    # Each worker's fan-out pool gets an equal share of the cores
+    rendition_workers = int(os.getenv("RENDITION_WORKERS") or max(1, (os.cpu_count() or 1) // workers))
+    print(f"[STARTUP] Serving on {SERVE_HOST}:{args.port} with {workers} worker(s) x {args.threads} threads")
+
+    if not hasattr(os, "fork") or workers == 1:
+        _serve(wsgi_app, sock, args.threads, args.grace, rendition_workers)
+    else:
+        _supervise(wsgi_app, sock, workers, args.threads, args.grace, rendition_workers)
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Single-flight request coalescing.
+
+Concurrent calls for the same key share one execution: the first caller runs
+the work and every waiter that arrives while it is in flight receives the same
+result or exception. Optionally the leader also takes an exclusive file lock so
+that workers in other processes queue behind it; the work function is expected
+to consult a shared cache first, so a process that waited finds the result
+already stored instead of recomputing it.
+"""
+import os
+import threading
+import zlib
+from typing import Any, Callable, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows has no flock; cross-process coordination is disabled there
+    fcntl = None
+
+SINGLEFLIGHT_LOCK_DIR = os.getenv("SINGLEFLIGHT_LOCK_DIR", "")
+# Keys are hashed into this many lock files so the directory stays bounded
+LOCK_STRIPES = 4096
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesce concurrent calls by key within (and optionally across) processes"""
+
+    def __init__(self, lock_dir: Optional[str] = SINGLEFLIGHT_LOCK_DIR):
+        self.lock_dir = lock_dir if lock_dir and fcntl is not None else None
+        if lock_dir and fcntl is None:
+            print("[Single Flight] File locks unavailable on this platform, coalescing per process only")
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, exist_ok=True)
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self.stats = {"leaders": 0, "shared": 0}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Run `fn` once for all concurrent callers with the same `key`"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.stats["shared"] += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.stats["leaders"] += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._run(key, fn)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def _run(self, key: str, fn: Callable[[], Any]) -> Any:
+        if not self.lock_dir:
+            return fn()
+        stripe = zlib.crc32(key.encode("utf-8")) % LOCK_STRIPES
+        path = os.path.join(self.lock_dir, f"{stripe:04x}.lock")
+        with open(path, "a+") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                return fn()
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
@@ -0,0 +1,210 @@
+"""
+Precompressed, fingerprinted frontend assets.
+
+The single-page frontend (index.html) is loaded once at startup instead of
+being read from disk on every hit. Inline <script> and <style> blocks larger
+than STATIC_INLINE_MIN_BYTES are moved out into content-addressed files
+(`/assets/index.<hash>.js`), which never change under the same URL and are
+served with immutable caching; the HTML that references them is small and
+revalidated by ETag on every load. Every asset is compressed ahead of time
+with gzip and, when the `brotli` package is installed, brotli, and each
+request gets the best encoding its Accept-Encoding allows.
+
+Like the preset registry, the site re-checks the source file's mtime at most
+every STATIC_RELOAD_INTERVAL seconds when it is read (-1 disables), so edits
+show up without a restart. Fingerprinted assets of the previous load stay
+available, so a page fetched just before a reload can still load its script.
+"""
+import gzip
+import hashlib
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # gzip only; pip install brotli for ~15% smaller transfers
+    brotli = None
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _default_frontend_dir() -> str:
+    # Deployed layout has the frontend next to the backend; a checkout keeps index.html at the root
+    for directory in (os.path.join(os.path.dirname(_HERE), "frontend"), _HERE):
+        if os.path.isfile(os.path.join(directory, "index.html")):
+            return directory
+    return _HERE
+
+
+FRONTEND_DIR = os.getenv("FRONTEND_DIR") or _default_frontend_dir()
+STATIC_RELOAD_INTERVAL = float(os.getenv("STATIC_RELOAD_INTERVAL", "2"))
+STATIC_INLINE_MIN_BYTES = int(os.getenv("STATIC_INLINE_MIN_BYTES", "1024"))
+STATIC_MAX_AGE = 365 * 24 * 3600
+STATIC_URL_PREFIX = "/assets/"
+
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+# Preferred order when the client weighs encodings equally
+ENCODINGS = ("br", "gzip", "identity")
+
+_INLINE = re.compile(r"<(script|style)>(.*?)</\1>", re.DOTALL | re.IGNORECASE)
+_EXTENSIONS = {"script": ("js", "text/javascript; charset=utf-8"), "style": ("css", "text/css; charset=utf-8")}
+
+
+@dataclass(frozen=True)
+class StaticAsset:
+    """One asset with every encoding precomputed"""
+    path: str
+    mimetype: str
+    etag: str
+    # encoding name -> body; always has "identity"
+    bodies: Mapping
+    immutable: bool
+
+    def select(self, accept_encodings) -> Tuple[str, bytes]:
+        """Best (encoding, body) for a werkzeug Accept-Encoding header"""
+        offered = [encoding for encoding in ENCODINGS if encoding in self.bodies]
+        encoding = accept_encodings.best_match(offered, default="identity") if accept_encodings else "identity"
+        return encoding, self.bodies.get(encoding, self.bodies["identity"])
+
+
+@dataclass(frozen=True)
+class FrontendBundle:
+    """One load of index.html and the assets split out of it"""
+    index: StaticAsset
+    assets: Mapping
+    source: str
+    loaded_at: float
+
+
+def compress(data: bytes) -> Dict[str, bytes]:
+    """Identity plus every available encoding that actually makes the body smaller"""
+    bodies = {"identity": data}
+    candidates = {"gzip": gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)}
+    if brotli is not None:
+        candidates["br"] = brotli.compress(data, quality=BROTLI_QUALITY)
+    for encoding, body in candidates.items():
+        if len(body) < len(data):
+            bodies[encoding] = body
+    return bodies
+
+
+def make_asset(path: str, data: bytes, mimetype: str, immutable: bool) -> StaticAsset:
+    return StaticAsset(path=path, mimetype=mimetype, etag=hashlib.sha256(data).hexdigest()[:32],
+                       bodies=MappingProxyType(compress(data)), immutable=immutable)
+
+
+def split_inline(html: str, min_bytes: int = STATIC_INLINE_MIN_BYTES) -> Tuple[str, List[Tuple[str, str, bytes]]]:
+    """
+    Move large attribute-less inline <script>/<style> blocks out of `html`.
+
+    Returns the rewritten HTML and (url path, mimetype, content) per block.
+    Blocks keep their position, so scripts still run in document order.
+    """
+    extracted: List[Tuple[str, str, bytes]] = []
+
+    def replace(match):
+        tag, body = match.group(1).lower(), match.group(2)
+        content = body.encode("utf-8")
+        if len(content) < min_bytes:
+            return match.group(0)
+        extension, mimetype = _EXTENSIONS[tag]
+        path = f"{STATIC_URL_PREFIX}index.{hashlib.sha256(content).hexdigest()[:16]}.{extension}"
+        extracted.append((path, mimetype, content))
+        if tag == "script":
+            return f'<script src="{path}"></script>'
+        return f'<link rel="stylesheet" href="{path}">'
+
+    return _INLINE.sub(replace, html), extracted
+
+
+def load_frontend(directory: str, min_bytes: int = STATIC_INLINE_MIN_BYTES) -> FrontendBundle:
+    """Read, split and precompress the frontend in `directory`"""
+    source = os.path.join(directory, "index.html")
+    with open(source, "rb") as f:
+        html = f.read().decode("utf-8")
+    html, extracted = split_inline(html, min_bytes)
+    assets = {path: make_asset(path, content, mimetype, immutable=True) for path, mimetype, content in extracted}
+    index = make_asset("/", html.encode("utf-8"), "text/html; charset=utf-8", immutable=False)
+    return FrontendBundle(index=index, assets=MappingProxyType(assets), source=source, loaded_at=time.time())
+
+
+class StaticSite:
+    """The current frontend bundle, reloaded when index.html changes"""
+
+    def __init__(self, directory: str = FRONTEND_DIR, reload_interval: float = STATIC_RELOAD_INTERVAL,
+                 min_bytes: int = STATIC_INLINE_MIN_BYTES):
+        self.directory = directory
+        self.reload_interval = reload_interval
+        self.min_bytes = min_bytes
+        self.reloads = 0
+        self.reload_errors = 0
+        self._lock = threading.Lock()
+        self._bundle: Optional[FrontendBundle] = None
+        self._retained: Mapping = MappingProxyType({})
+        self._fingerprint = self._scan()
+        self._checked = time.monotonic()
+        self._load()
+
+    def _scan(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(os.path.join(self.directory, "index.html"))
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self) -> bool:
+        """Swap in a fresh bundle; on failure keep the current one and return False"""
+        try:
+            bundle = load_frontend(self.directory, self.min_bytes)
+        except (OSError, UnicodeDecodeError) as e:
+            self.reload_errors += 1
+            print(f"[Static] Could not load the frontend from {self.directory}: {str(e)}")
+            return False
+        previous = self._bundle
+        self._retained = previous.assets if previous is not None else MappingProxyType({})
+        self._bundle = bundle
+        sizes = ", ".join(f"{encoding} {len(body) / 1024:.0f} KiB" for encoding, body in bundle.index.bodies.items())
+        print(f"[Static] Loaded {bundle.source} ({sizes}) with {len(bundle.assets)} fingerprinted assets")
+        return True
+
+    def bundle(self) -> Optional[FrontendBundle]:
+        """The current bundle, reloading first if index.html changed since the last check"""
+        if self.reload_interval >= 0 and time.monotonic() - self._checked >= self.reload_interval:
+            if self._lock.acquire(blocking=False):
+                try:
+                    self._checked = time.monotonic()
+                    fingerprint = self._scan()
+                    if fingerprint != self._fingerprint:
+                        self._fingerprint = fingerprint
+                        if fingerprint is not None and self._load():
+                            self.reloads += 1
+                finally:
+                    self._lock.release()
+        return self._bundle
+
+    def index(self) -> Optional[StaticAsset]:
+        bundle = self.bundle()
+        return bundle.index if bundle is not None else None
+
+    def asset(self, path: str) -> Optional[StaticAsset]:
+        bundle = self.bundle()
+        if bundle is None:
+            return None
+        return bundle.assets.get(path) or self._retained.get(path)
+
+    def stats(self) -> Dict[str, float]:
+        bundle = self._bundle
+        stats = {"assets": 0, "reloads": self.reloads, "reload_errors": self.reload_errors, "loaded_at": 0}
+        if bundle is not None:
+            stats.update(assets=len(bundle.assets), loaded_at=bundle.loaded_at)
+            for asset in (bundle.index,) + tuple(bundle.assets.values()):
+                for encoding, body in asset.bodies.items():
+                    key = f"bytes_{encoding}"
+                    stats[key] = stats.get(key, 0) + len(body)
+        return stats
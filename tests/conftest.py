@@ -0,0 +1,21 @@
+import os
+import sys
+
+# The modules live at the repository root rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from fake_hf import FakeHFConfig, start_fake_hf  # noqa: E402
+
+
+@pytest.fixture
+def fake_hf():
+    """A running stand-in Hugging Face server; yields (config, base_url)"""
+    config = FakeHFConfig(latency=0.0)
+    server, url = start_fake_hf(config)
+    yield config, url
+    server.shutdown()
+    server.server_close()
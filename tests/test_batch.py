@@ -0,0 +1,40 @@
+import io
+import zipfile
+
+import pytest
+
+from batch import ArchiveTooLarge, zip_images
+
+
+def archive(entries) -> io.BytesIO:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in entries:
+            zf.writestr(name, data)
+    buf.seek(0)
+    return buf
+
+
+def test_reads_images_and_skips_other_entries():
+    items = list(zip_images(archive([("a.png", b"one"), ("notes.txt", b"x"), ("__MACOSX/._b.png", b"y"),
+                                     ("dir/.hidden.png", b"z"), ("b.jpg", b"two")])))
+    assert [(name, read()) for name, read in items] == [("a.png", b"one"), ("b.jpg", b"two")]
+
+
+def test_rejects_an_entry_that_inflates_past_the_upload_limit():
+    # ~10 MB of zeros deflates to ~10 KB
+    items = list(zip_images(archive([("bomb.png", bytes(10_000_000)), ("ok.png", b"fine")]),
+                            max_entry_bytes=1_000_000))
+    assert [name for name, _ in items] == ["bomb.png", "ok.png"]
+    with pytest.raises(ArchiveTooLarge):
+        items[0][1]()
+    assert items[1][1]() == b"fine"
+
+
+def test_stops_once_the_archive_inflates_past_the_batch_limit():
+    entries = [(f"{i}.png", bytes(400_000)) for i in range(5)]
+    items = list(zip_images(archive(entries), max_entry_bytes=1_000_000, max_total_bytes=1_000_000))
+    assert [name for name, _ in items] == ["0.png", "1.png", "2.png"]
+    assert len(items[1][1]()) == 400_000
+    with pytest.raises(ArchiveTooLarge):
+        items[2][1]()
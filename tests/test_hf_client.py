@@ -0,0 +1,149 @@
+import email.utils
+import threading
+import time
+
+import pytest
+
+from hf_client import AdaptiveLimiter, CircuitBreaker, HFInferenceClient, UpstreamUnavailable, _retry_after_seconds
+
+
+def client(url, **overrides) -> HFInferenceClient:
+    options = dict(timeout=5, max_retries=2, rate_per_sec=1000, burst=1000, max_concurrency=8,
+                   breaker_failures=100, breaker_cooldown=30, backoff_base=0.01, backoff_cap=0.02)
+    options.update(overrides)
+    return HFInferenceClient("test/model", "token", base_url=url, **options)
+
+
+def test_success_is_a_single_call(fake_hf):
+    config, url = fake_hf
+    response = client(url).remove_background(b"not an image")
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "image/png"
+    assert config.counts["requests"] == 1
+
+
+def test_retryable_status_is_retried_max_retries_times(fake_hf):
+    config, url = fake_hf
+    config.p503 = 1.0
+    response = client(url, max_retries=2).remove_background(b"x")
+    assert response.status_code == 503
+    assert config.counts["requests"] == 3
+
+
+def test_retry_after_is_honoured(fake_hf):
+    config, url = fake_hf
+    config.p429 = 1.0
+    config.retry_after = 0.3
+    # Backoff alone would wait far longer than Retry-After
+    started = time.monotonic()
+    response = client(url, max_retries=1, backoff_base=10, backoff_cap=10).remove_background(b"x")
+    elapsed = time.monotonic() - started
+    assert response.status_code == 429
+    assert config.counts["requests"] == 2
+    assert 0.3 <= elapsed < 2
+
+
+def test_retry_after_past_the_deadline_returns_at_once(fake_hf):
+    config, url = fake_hf
+    config.p429 = 1.0
+    config.retry_after = 5
+    started = time.monotonic()
+    response = client(url, timeout=1, max_retries=3).remove_background(b"x")
+    assert response.status_code == 429
+    assert config.counts["requests"] == 1
+    assert time.monotonic() - started < 1
+
+
+def test_retry_after_accepts_http_dates():
+    assert _retry_after_seconds("2") == 2
+    assert _retry_after_seconds(None) is None
+    assert _retry_after_seconds("soon") is None
+    later = email.utils.formatdate(time.time() + 10, usegmt=True)
+    assert 8 <= _retry_after_seconds(later) <= 10
+
+
+def test_breaker_opens_half_opens_and_closes(fake_hf):
+    config, url = fake_hf
+    config.p503 = 1.0
+    hf = client(url, max_retries=0, breaker_failures=2, breaker_cooldown=0.3)
+    for _ in range(2):
+        assert hf.remove_background(b"x").status_code == 503
+    assert hf.breaker.state == "open"
+
+    # Open: the upstream is not called at all
+    with pytest.raises(UpstreamUnavailable):
+        hf.remove_background(b"x")
+    assert config.counts["requests"] == 2
+
+    time.sleep(0.35)
+    assert hf.breaker.state == "half_open"
+    config.p503 = 0.0
+    assert hf.remove_background(b"x").status_code == 200
+    assert hf.breaker.state == "closed"
+    assert config.counts["requests"] == 3
+
+
+def test_failed_half_open_trial_reopens_the_breaker(fake_hf):
+    config, url = fake_hf
+    config.p503 = 1.0
+    hf = client(url, max_retries=0, breaker_failures=1, breaker_cooldown=0.2)
+    hf.remove_background(b"x")
+    time.sleep(0.25)
+    assert hf.breaker.state == "half_open"
+    assert hf.remove_background(b"x").status_code == 503
+    assert hf.breaker.state == "open"
+
+
+def test_half_open_admits_a_single_trial():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0)
+    breaker.record(False)
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record(True)
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_token_bucket_paces_calls(fake_hf):
+    config, url = fake_hf
+    hf = client(url, rate_per_sec=10, burst=2)
+    started = time.monotonic()
+    for _ in range(5):
+        assert hf.remove_background(b"x").status_code == 200
+    # Two from the burst, then one every 100 ms
+    assert time.monotonic() - started >= 0.25
+
+
+def test_token_bucket_gives_up_at_the_deadline(fake_hf):
+    config, url = fake_hf
+    hf = client(url, rate_per_sec=0.1, burst=1, timeout=0.5)
+    hf.remove_background(b"x")
+    with pytest.raises(UpstreamUnavailable, match="rate limit"):
+        hf.remove_background(b"x")
+    assert config.counts["requests"] == 1
+
+
+def test_concurrency_is_capped(fake_hf):
+    config, url = fake_hf
+    config.latency = 0.1
+    hf = client(url, max_concurrency=2)
+    threads = [threading.Thread(target=hf.remove_background, args=(b"x",)) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert config.counts["ok"] == 6
+    assert config.counts["max_concurrency"] <= 2
+
+
+def test_limiter_halves_on_throttling_and_grows_back():
+    limiter = AdaptiveLimiter(max_limit=8, target_latency=1.0)
+    assert limiter.acquire(time.monotonic() + 1)
+    limiter.release(0.1, throttled=True)
+    assert limiter.limit == 4
+    assert limiter.acquire(time.monotonic() + 1)
+    limiter.release(5.0, throttled=False)
+    assert limiter.limit == 2
+    assert limiter.acquire(time.monotonic() + 1)
+    limiter.release(0.1, throttled=False)
+    assert limiter.limit == 3
@@ -0,0 +1,61 @@
+import threading
+import time
+
+from jobs import JobQueue, SharedJob, raise_if_cancelled
+
+
+def queues(tmp_path):
+    """Two queues over one state directory, standing in for two serve.py workers"""
+    return (JobQueue(workers=1, directory=str(tmp_path), poll_interval=0.01),
+            JobQueue(workers=1, directory=str(tmp_path), poll_interval=0.01))
+
+
+def test_another_worker_sees_status_and_result(tmp_path):
+    owner, other = queues(tmp_path)
+    release = threading.Event()
+    job = owner.submit("test", lambda: (release.wait(5), (b"png bytes", "image/png"))[1])
+
+    shared = other.get(job.id)
+    assert isinstance(shared, SharedJob) and shared.status in ("queued", "running")
+    release.set()
+    while not shared.terminal:
+        other.wait(shared, shared.version, 5)
+    assert shared.status == "done"
+    assert shared.result == (b"png bytes", "image/png")
+    assert other.get(job.id).to_dict()["finished"] == owner.get(job.id).finished
+
+
+def test_cancel_from_another_worker_reaches_the_owner(tmp_path):
+    owner, other = queues(tmp_path)
+    started, stopped = threading.Event(), threading.Event()
+
+    def work():
+        started.set()
+        try:
+            while True:
+                raise_if_cancelled()
+                time.sleep(0.01)
+        finally:
+            stopped.set()
+
+    job = owner.submit("test", work)
+    assert started.wait(5)
+    assert other.cancel(job.id).status == "cancelled"
+    assert stopped.wait(5)
+    assert owner.wait(job, job.version, 1).status == "cancelled"
+    assert other.get(job.id).status == "cancelled"
+
+
+def test_unknown_and_malformed_ids_are_not_found(tmp_path):
+    _, other = queues(tmp_path)
+    assert other.get("0" * 32) is None
+    assert other.get("../" + "0" * 29) is None
+    assert other.cancel("0" * 32) is None
+
+
+def test_without_a_directory_jobs_stay_private(tmp_path):
+    owner = JobQueue(workers=1, directory="")
+    job = owner.submit("test", lambda: (b"x", "image/png"))
+    owner.wait(job, 0, 5)
+    assert owner.get(job.id) is job
+    assert list(tmp_path.iterdir()) == []
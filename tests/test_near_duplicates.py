@@ -0,0 +1,95 @@
+import hashlib
+import io
+
+import pytest
+from PIL import Image, ImageDraw
+
+from near_duplicates import NearDuplicateIndex, fingerprint
+from result_cache import ResultCache, cache_key
+
+
+def packshot(size=(1200, 900)) -> Image.Image:
+    image = Image.new("RGB", size, (248, 248, 248))
+    draw = ImageDraw.Draw(image)
+    w, h = size
+    draw.ellipse([w // 4, h // 8, w * 3 // 4, h * 7 // 8], fill=(190, 40, 50))
+    draw.rectangle([w * 3 // 10, h * 2 // 5, w * 3 // 5, h * 3 // 5], fill=(30, 90, 160))
+    draw.ellipse([w * 2 // 5, h // 5, w // 2, h * 3 // 10], fill=(255, 255, 255))
+    return image
+
+
+def encoded(image: Image.Image, fmt: str = "JPEG", **params) -> bytes:
+    buf = io.BytesIO()
+    image.save(buf, format=fmt, **params)
+    return buf.getvalue()
+
+
+KEY = "ab" * 32
+
+
+def test_lookup_matches_resized_copies_of_the_same_backend_only():
+    index = NearDuplicateIndex(capacity=16)
+    index.add(fingerprint(encoded(packshot(), quality=92)), KEY, (1200, 900), "hf")
+    resized = fingerprint(encoded(packshot().resize((600, 450)), quality=70))
+    match = index.lookup(resized, "hf")
+    assert match is not None and match.key == KEY and match.size == (1200, 900)
+    assert index.lookup(resized, "fallback") is None
+
+
+def test_palette_uploads_are_fingerprinted():
+    palette = fingerprint(encoded(packshot((2400, 1800)).convert("P"), "PNG"))
+    rgb = fingerprint(encoded(packshot((2400, 1800)), quality=92))
+    assert bin(palette.dhash ^ rgb.dhash).count("1") <= 4
+
+
+def test_undecodable_uploads_are_counted():
+    index = NearDuplicateIndex(capacity=16)
+    assert index.fingerprint(b"not an image") is None
+    assert index.snapshot()["fingerprint_errors"] == 1
+
+
+def test_discarded_entries_no_longer_match():
+    index = NearDuplicateIndex(capacity=16)
+    fp = fingerprint(encoded(packshot(), quality=92))
+    index.add(fp, KEY, (1200, 900), "hf")
+    index.discard(KEY)
+    assert index.lookup(fp, "hf") is None
+
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, content: bytes):
+        self.content = content
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    import app as server
+    monkeypatch.setattr(server, "RESULT_CACHE", ResultCache(directory=str(tmp_path)))
+    monkeypatch.setattr(server, "NEAR_DUPLICATES", NearDuplicateIndex(capacity=64))
+    return server
+
+
+def test_reused_cutout_is_cached_under_the_uploads_own_key(server, monkeypatch):
+    monkeypatch.setattr(server, "HF_TOKEN", "")
+    server.remove_background(encoded(packshot(), quality=92))
+    copy = encoded(packshot().resize((900, 675)), quality=75)
+    cutout = server.remove_background(copy)
+    assert server.NEAR_DUPLICATES.snapshot()["matches"] == 1
+    assert Image.open(io.BytesIO(cutout)).size == (900, 675)
+    key = cache_key(hashlib.sha256(copy).hexdigest(), server.FALLBACK_BACKEND)
+    assert server.RESULT_CACHE.get(key) == cutout
+
+
+def test_hugging_face_requests_do_not_reuse_fallback_cutouts(server, monkeypatch):
+    monkeypatch.setattr(server, "HF_TOKEN", "")
+    server.remove_background(encoded(packshot(), quality=92))
+
+    calls = []
+    hf_cutout = encoded(Image.new("RGBA", (900, 675)), "PNG")
+    monkeypatch.setattr(server, "HF_TOKEN", "token")
+    monkeypatch.setattr(server.HF_CLIENT, "remove_background",
+                        lambda image_bytes: calls.append(image_bytes) or FakeResponse(hf_cutout))
+    assert server.remove_background(encoded(packshot().resize((900, 675)), quality=75)) == hf_cutout
+    assert len(calls) == 1
@@ -0,0 +1,44 @@
+import os
+import time
+
+from static_assets import StaticSite
+
+SCRIPT = "var x = 1;" * 200
+
+
+def write(path: str, html: bytes):
+    with open(path, "wb") as f:
+        f.write(html)
+    # Make sure the mtime moves even on coarse-grained filesystems
+    stamp = time.time() + write.bump
+    write.bump += 1
+    os.utime(path, (stamp, stamp))
+
+
+write.bump = 1
+
+
+def test_inline_script_is_fingerprinted_and_old_assets_survive_a_reload(tmp_path):
+    index = tmp_path / "index.html"
+    write(str(index), f"<html><script>{SCRIPT}</script></html>".encode())
+    site = StaticSite(str(tmp_path), reload_interval=0)
+    (old,) = site.bundle().assets
+    assert f'<script src="{old}"></script>'.encode() in site.index().bodies["identity"]
+    assert "gzip" in site.asset(old).bodies
+
+    write(str(index), f"<html><script>{SCRIPT}//v2</script></html>".encode())
+    (new,) = site.bundle().assets
+    assert new != old
+    assert site.asset(old) is not None
+    assert site.stats()["reloads"] == 1
+
+
+def test_failed_reload_keeps_the_bundle_and_is_not_counted(tmp_path):
+    index = tmp_path / "index.html"
+    write(str(index), b"<html>ok</html>")
+    site = StaticSite(str(tmp_path), reload_interval=0)
+    write(str(index), b"\xff\xfe not utf-8")
+    assert site.index().bodies["identity"] == b"<html>ok</html>"
+    stats = site.stats()
+    assert stats["reloads"] == 0
+    assert stats["reload_errors"] == 1
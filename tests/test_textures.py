@@ -0,0 +1,52 @@
+import threading
+
+import numpy as np
+
+from encoders import PROFILES
+from textures import TextureStore, render_background
+
+PALETTE = ("#FFF8F0", "#FFE4CC", "#FF6B35")
+
+
+def test_concurrent_cold_requests_render_and_encode_once():
+    store = TextureStore()
+    barrier = threading.Barrier(8)
+    results = []
+
+    def get():
+        barrier.wait()
+        results.append(store.get("soft_gradient", PALETTE, (1080, 1350)))
+
+    threads = [threading.Thread(target=get) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({texture.digest for texture in results}) == 1
+    assert store.stats["renders"] == 1 and store.stats["encodes"] == 1
+
+
+def test_profiles_share_one_render():
+    store = TextureStore()
+    png = store.get("soft_gradient", PALETTE, (600, 400), PROFILES["png-palette"])
+    webp = store.get("soft_gradient", PALETTE, (600, 400), PROFILES["webp-lossless"])
+    assert png.mimetype == "image/png" and webp.mimetype == "image/webp"
+    assert store.stats["renders"] == 1 and store.stats["encodes"] == 2
+    assert store.lookup(png.digest) is png
+
+
+def test_encoded_bytes_are_capped_without_rerendering():
+    store = TextureStore(max_bytes=1)
+    first = store.get("soft_gradient", PALETTE, (600, 400))
+    store.get("solid", PALETTE, (600, 400))
+    assert len(store) == 1 and store.lookup(first.digest) is None
+    store.get("soft_gradient", PALETTE, (600, 400), PROFILES["webp-lossless"])
+    assert store.stats["renders"] == 2 and store.stats["evictions"] == 2
+
+
+def test_render_background_is_a_full_writable_array():
+    rgba = render_background("subtle_gradient", PALETTE, (30, 20))
+    assert rgba.shape == (20, 30, 4) and rgba.flags.writeable
+    assert (rgba == rgba[:, :1]).all() and (rgba[..., 3] == 255).all()
+    assert tuple(rgba[0, 0, :3]) == (0xFF, 0xF8, 0xF0)
+    assert np.all(np.diff(rgba[:, 0, 2].astype(int)) <= 0)
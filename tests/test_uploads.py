@@ -0,0 +1,36 @@
+import io
+
+import pytest
+from PIL import Image
+
+from uploads import decode_image
+
+
+def encoded(image: Image.Image, fmt: str = "PNG") -> bytes:
+    buf = io.BytesIO()
+    image.save(buf, format=fmt)
+    return buf.getvalue()
+
+
+@pytest.mark.parametrize("mode, fmt", [("P", "PNG"), ("P", "GIF"), ("1", "PNG"), ("I;16", "PNG"),
+                                       ("L", "PNG"), ("RGB", "JPEG")])
+def test_decode_downscales_every_mode(mode, fmt):
+    source = Image.new("RGB", (2400, 1800), (200, 30, 40)).convert(mode)
+    image = decode_image(encoded(source, fmt), 400 * 400)
+    assert image.mode == "RGBA"
+    assert image.width * image.height <= 400 * 400
+    assert image.size == (461, 346)
+
+
+def test_palette_keeps_its_colours_when_reduced():
+    source = Image.new("RGB", (2400, 1800), (255, 0, 0))
+    source.paste((0, 0, 255), (0, 0, 1200, 1800))
+    image = decode_image(encoded(source.convert("P")), 160_000)
+    assert image.getpixel((10, 10)) == (0, 0, 255, 255)
+    assert image.getpixel((image.width - 10, 10)) == (255, 0, 0, 255)
+
+
+def test_small_images_are_not_resized():
+    image = decode_image(encoded(Image.new("P", (300, 200))), 400 * 400)
+    assert image.size == (300, 200)
+    assert image.mode == "RGBA"
@@ -0,0 +1,190 @@
+"""
+Vectorized background renderer and content-addressed texture store for /generate.
+
+Each preset `background_style` is built as a NumPy array in one pass. The
+store keeps every rendered background per (style, palette, size), and on top
+of it an LRU of encodes per encoder profile bounded by TEXTURE_CACHE_BYTES of
+encoded data, so a preset/ratio pair is only ever rendered once per process
+and each profile encodes it once while it stays cached. Concurrent cold
+requests for the same texture share one render and one encode. Encoded
+textures are also indexed by the SHA-256 of their bytes so they can be served
+from /texture/<sha256> with strong validators.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+from encoders import PROFILES, TEXTURE_PROFILE, EncoderProfile, encode
+from metrics import span
+from singleflight import SingleFlight
+
+# Encoded textures kept in memory; rendered backgrounds are one pixel per row and always kept
+TEXTURE_CACHE_BYTES = int(os.getenv("TEXTURE_CACHE_BYTES", str(64 * 1024 * 1024)))
+
+# How far down the palette the gradient travels by the bottom row
+GRADIENT_STRENGTH = {
+    "soft_gradient": 0.3,
+    "subtle_gradient": 0.15,
+}
+
+
+@lru_cache(maxsize=1024)
+def hex_to_rgb(hex_color: str) -> Tuple[int, int, int]:
+    """Parse a #RRGGBB colour into an (r, g, b) tuple"""
+    hex_color = hex_color.lstrip('#')
+    return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
+
+
+def render_rows(style: str, palette: Sequence[str], height: int) -> np.ndarray:
+    """
+    Render the colour of every row of a background as a (height, 4) uint8 RGBA array.
+
+    Gradients run top to bottom from the first palette colour towards the
+    second; unknown styles and single-colour palettes render solid. Every
+    style is uniform along a row.
+    """
+    top = np.array(hex_to_rgb(palette[0]), dtype=np.float64)
+    strength = GRADIENT_STRENGTH.get(style)
+
+    if strength is None or len(palette) < 2:
+        column = np.broadcast_to(top, (height, 3))
+    else:
+        bottom = np.array(hex_to_rgb(palette[1]), dtype=np.float64)
+        ratios = np.arange(height, dtype=np.float64)[:, None] / height
+        column = top + (bottom - top) * ratios * strength
+
+    rows = np.empty((height, 4), dtype=np.uint8)
+    rows[:, :3] = np.trunc(column).astype(np.uint8)
+    rows[:, 3] = 255
+    return rows
+
+
+def render_background(style: str, palette: Sequence[str], size: Tuple[int, int]) -> np.ndarray:
+    """Render a background as an (height, width, 4) uint8 RGBA array"""
+    width, height = size
+    return np.ascontiguousarray(_widen(render_rows(style, palette, height), width))
+
+
+def _widen(rows: np.ndarray, width: int) -> np.ndarray:
+    # A read-only view: each row repeated `width` times without copying
+    return np.broadcast_to(rows[:, None, :], (rows.shape[0], width, 4))
+
+
+@dataclass(frozen=True)
+class Texture:
+    """An encoded background, addressed by the SHA-256 of its bytes"""
+    digest: str
+    data: bytes
+    mimetype: str = "image/png"
+    # Name of the encoder profile, so another process can encode it again
+    profile: str = TEXTURE_PROFILE
+
+
+def encode_texture(image: Image.Image, profile: EncoderProfile = PROFILES[TEXTURE_PROFILE]) -> Texture:
+    """Encode a background image with an encoder profile and fingerprint it"""
+    data, mimetype = encode(image, profile)
+    return Texture(digest=hashlib.sha256(data).hexdigest(), data=data, mimetype=mimetype, profile=profile.name)
+
+
+class TextureStore:
+    """
+    Thread-safe texture cache, looked up by render key or by digest.
+
+    Rendered backgrounds are kept per (style, palette, size) without a bound:
+    they cost 4 bytes per row and the keys come from the presets and ratios.
+    Encodes are kept per profile in an LRU of at most `max_bytes` encoded bytes.
+    """
+
+    def __init__(self, max_bytes: int = TEXTURE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._rendered: Dict[tuple, np.ndarray] = {}
+        self._by_key: "OrderedDict[tuple, Texture]" = OrderedDict()
+        self._by_digest: Dict[str, Texture] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._flight = SingleFlight(lock_dir=None)
+        self.stats: Dict[str, int] = {"renders": 0, "encodes": 0, "evictions": 0}
+
+    def get(self, style: str, palette: Sequence[str], size: Tuple[int, int],
+            profile: EncoderProfile = PROFILES[TEXTURE_PROFILE]) -> Texture:
+        """Return the texture for a style/palette/size/profile, rendering and encoding it on first use"""
+        key = (style, tuple(palette), tuple(size), profile.name)
+        with self._lock:
+            texture = self._by_key.get(key)
+            if texture is not None:
+                self._by_key.move_to_end(key)
+                return texture
+        return self._flight.do(f"encode:{key!r}", lambda: self._encode(key, profile))
+
+    def _encode(self, key: tuple, profile: EncoderProfile) -> Texture:
+        with self._lock:
+            # A leader that finished just before this call was led may have stored it
+            texture = self._by_key.get(key)
+            if texture is not None:
+                return texture
+        style, palette, size = key[:3]
+        rendered = self._render(style, palette, size)
+        with span("encode"):
+            texture = encode_texture(Image.fromarray(rendered, "RGBA"), profile)
+
+        with self._lock:
+            self.stats["encodes"] += 1
+            self._by_key[key] = texture
+            self._by_digest[texture.digest] = texture
+            self._bytes += len(texture.data)
+            while self._bytes > self.max_bytes and len(self._by_key) > 1:
+                _, evicted = self._by_key.popitem(last=False)
+                self._bytes -= len(evicted.data)
+                self.stats["evictions"] += 1
+                if all(t.digest != evicted.digest for t in self._by_key.values()):
+                    self._by_digest.pop(evicted.digest, None)
+        return texture
+
+    def _render(self, style: str, palette: tuple, size: tuple) -> np.ndarray:
+        """The rendered background for a style/palette/size, shared by every profile"""
+        key = (style, palette, size)
+        with self._lock:
+            rendered = self._rendered.get(key)
+        if rendered is not None:
+            return rendered
+        return self._flight.do(f"render:{key!r}", lambda: self._render_once(key))
+
+    def _render_once(self, key: tuple) -> np.ndarray:
+        with self._lock:
+            rendered = self._rendered.get(key)
+            if rendered is not None:
+                return rendered
+        style, palette, (width, height) = key
+        with span("gradient"):
+            rendered = _widen(render_rows(style, palette, height), width)
+        with self._lock:
+            self.stats["renders"] += 1
+            self._rendered[key] = rendered
+        return rendered
+
+    def peek(self, style: str, palette: Sequence[str], size: Tuple[int, int],
+             profile: EncoderProfile = PROFILES[TEXTURE_PROFILE]) -> Optional[Texture]:
+        """The cached texture for a style/palette/size/profile, without rendering it"""
+        key = (style, tuple(palette), tuple(size), profile.name)
+        with self._lock:
+            return self._by_key.get(key)
+
+    def lookup(self, digest: str) -> Optional[Texture]:
+        """Return a previously rendered texture by its SHA-256 digest"""
+        with self._lock:
+            return self._by_digest.get(digest)
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.stats, textures=len(self._by_key), bytes=self._bytes, rendered=len(self._rendered))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._by_key)
@@ -0,0 +1,167 @@
+"""
+Upload ingestion and decoding with bounded memory.
+
+Request bodies are spooled to temp files once they outgrow a small in-memory
+threshold, and large spools are handed to the pipeline as a memory map rather
+than read into a second copy. A process-wide byte budget caps how much upload
+data is in flight at once, on top of the per-request limits Flask enforces.
+
+Large uploads are decoded straight to a capped resolution: JPEGs use
+Pillow's draft mode so libjpeg performs the DCT-domain downscale (1/2, 1/4
+or 1/8) while decoding, and anything still above the pixel cap is reduced
+before it is converted to RGBA. Posters top out at 2480x3508, so decoding a
+48 MP phone photo at full size buys nothing but memory.
+"""
+import io
+import math
+import mmap
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from io import BytesIO
+from typing import IO, Dict, Iterator, Optional, Tuple, Union
+
+from PIL import Image
+
+UPLOAD_MAX_PIXELS = int(os.getenv("UPLOAD_MAX_PIXELS", "12000000"))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(32 * 1024 * 1024)))
+UPLOAD_MAX_BATCH_BYTES = int(os.getenv("UPLOAD_MAX_BATCH_BYTES", str(512 * 1024 * 1024)))
+UPLOAD_INFLIGHT_BYTES = int(os.getenv("UPLOAD_INFLIGHT_BYTES", str(1024 * 1024 * 1024)))
+UPLOAD_SPOOL_BYTES = int(os.getenv("UPLOAD_SPOOL_BYTES", str(1024 * 1024)))
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+
+class ByteBudget:
+    """Non-blocking counter of bytes in flight across all requests"""
+
+    def __init__(self, capacity: int = UPLOAD_INFLIGHT_BYTES):
+        self.capacity = capacity
+        self.in_use = 0
+        self._lock = threading.Lock()
+        self.stats = {"granted": 0, "rejected": 0}
+
+    def acquire(self, size: int) -> bool:
+        """Reserve `size` bytes, or return False if that would exceed the budget"""
+        with self._lock:
+            if self.capacity > 0 and self.in_use + size > self.capacity:
+                self.stats["rejected"] += 1
+                return False
+            self.in_use += size
+            self.stats["granted"] += 1
+            return True
+
+    def release(self, size: int):
+        with self._lock:
+            self.in_use = max(0, self.in_use - size)
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.stats, in_use=self.in_use, capacity=self.capacity)
+
+
+def spooled_stream_factory(total_content_length: Optional[int], content_type: Optional[str],
+                           filename: Optional[str] = None,
+                           content_length: Optional[int] = None) -> IO[bytes]:
+    """Werkzeug file stream factory: memory up to UPLOAD_SPOOL_BYTES, then a temp file"""
+    return tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_BYTES)
+
+
+@contextmanager
+def upload_buffer(stream: IO[bytes]) -> Iterator[Buffer]:
+    """
+    Expose an uploaded file's contents without copying large spools.
+
+    Small uploads are read into bytes; uploads spooled to disk are memory
+    mapped and yielded as a memoryview, valid only inside the `with` block.
+    """
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    if size <= UPLOAD_SPOOL_BYTES or size == 0:
+        yield stream.read()
+        return
+
+    mapped = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapped)
+    try:
+        yield view
+    finally:
+        try:
+            view.release()
+            mapped.close()
+        except BufferError:
+            # A slice of the view is still referenced somewhere; the GC will unmap it
+            pass
+
+
+class _BufferReader(io.RawIOBase):
+    """Seekable, read-only file over a buffer, without copying it"""
+
+    def __init__(self, buffer: Buffer):
+        self._view = memoryview(buffer).cast("B")
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        chunk = self._view[self._pos:self._pos + len(target)]
+        target[:len(chunk)] = chunk
+        self._pos += len(chunk)
+        return len(chunk)
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        base = {os.SEEK_SET: 0, os.SEEK_CUR: self._pos, os.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def close(self):
+        self._view.release()
+        super().close()
+
+
+# Modes Image.reduce() supports that also convert cleanly to RGBA afterwards
+REDUCIBLE_MODES = ("L", "LA", "RGB", "RGBA")
+
+
+def capped_size(size: Tuple[int, int], max_pixels: int) -> Tuple[int, int]:
+    """Largest size with the same aspect ratio and at most `max_pixels` pixels"""
+    width, height = size
+    if max_pixels <= 0 or width * height <= max_pixels:
+        return size
+    scale = math.sqrt(max_pixels / (width * height))
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def decode_image(source: Union[Buffer, IO[bytes]], max_pixels: int = UPLOAD_MAX_PIXELS) -> Image.Image:
+    """Decode an upload as RGBA with at most `max_pixels` pixels"""
+    if isinstance(source, (bytes, bytearray)):
+        source = BytesIO(source)
+    elif isinstance(source, memoryview):
+        source = io.BufferedReader(_BufferReader(source))
+    image = Image.open(source)
+    target = capped_size(image.size, max_pixels)
+
+    if target != image.size:
+        if image.format == "JPEG":
+            # Let libjpeg decode at the smallest 1/n scale that still covers the target
+            image.draft("RGB", target)
+        if image.size != target:
+            if image.mode not in REDUCIBLE_MODES:
+                # reduce() rejects palette, 1-bit and 16-bit images
+                image = image.convert("RGBA")
+            factor = min(image.width // target[0], image.height // target[1])
+            if factor >= 2:
+                image = image.reduce(factor)
+            if image.width * image.height > max_pixels:
+                image = image.resize(capped_size(image.size, max_pixels), Image.LANCZOS)
+
+    return image if image.mode == "RGBA" else image.convert("RGBA")